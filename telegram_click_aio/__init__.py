@@ -20,6 +20,7 @@
 
 import logging
 
+from aiogram.enums.parse_mode import ParseMode
 from aiogram.types import Message
 
 from telegram_click_aio.const import *
@@ -44,36 +45,136 @@ class CommandTarget:
     ANY = UNSPECIFIED | SELF | OTHER
 
 
-async def generate_command_list(message: Message) -> str:
+class Scope:
     """
-    :return: a Markdown styled text description of all available commands
+    Values used to specify how invocations of a command are grouped,
+    f.ex. when limiting concurrency. Values can be combined using logical operators.
     """
+    # all invocations share the same group
+    GLOBAL = 0
+    # invocations are grouped by chat
+    CHAT = 1 << 0
+    # invocations are grouped by user
+    USER = 1 << 1
+    # invocations are grouped by command
+    COMMAND = 1 << 2
+
+
+async def generate_command_list(message: Message, parse_mode: str or None = ParseMode.MARKDOWN,
+                                registry=None) -> str:
+    """
+    :param message: the message that requested the command list
+    :param parse_mode: the telegram parse mode to format the list for, None for plain text
+    :param registry: the CommandRegistry to list commands of, defaults to DEFAULT_REGISTRY
+    :return: a text description of all available commands
+    """
+    from telegram_click_aio.help import get_help_renderer
+    from telegram_click_aio.registry import get_registry
 
-    async def permission_filter(x):
-        return x[KEY_PERMISSIONS] is None or await x[KEY_PERMISSIONS].evaluate(message)
-
-    async def hidden_filter(x):
-        return not x[KEY_HIDDEN] if isinstance(x[KEY_HIDDEN], bool) else not x[KEY_HIDDEN](
-            message) if callable(x[KEY_HIDDEN]) else True
+    registry = get_registry(registry)
 
-    commands_with_permission = []
     commands_not_hidden = []
-    result = []
-    for x in COMMAND_LIST:
-        if await permission_filter(x):
-            commands_with_permission.append(x)
-            if await hidden_filter(x):
-                commands_not_hidden.append(x)
+    for x in registry.sorted_commands():
+        if await _is_visible(x, message):
+            commands_not_hidden.append(x)
 
-    sorted_commands = sorted(commands_not_hidden, key=lambda x: (x[KEY_NAMES][0].lower(), len(x[KEY_ARGUMENTS])))
-    help_messages = list(map(lambda x: x[KEY_HELP_MESSAGE], sorted_commands))
+    help_messages = list(map(lambda x: x[KEY_HELP_MESSAGE].for_parse_mode(parse_mode), commands_not_hidden))
 
-    if len(COMMAND_LIST) <= 0:
-        return "This bot does not have any commands."
+    if len(registry) <= 0:
+        return get_help_renderer(parse_mode).escape("This bot does not have any commands.")
 
     if len(commands_not_hidden) <= 0:
-        return "You do not have permission to use commands."
+        return get_help_renderer(parse_mode).escape("You do not have permission to use commands.")
 
     return "\n\n".join([
         *help_messages
     ])
+
+
+# Telegram's maximum message length
+MAX_MESSAGE_LENGTH = 4096
+
+
+class CommandListPage:
+    """
+    A single page of the command list
+    """
+
+    def __init__(self, text: str, page: int, page_count: int):
+        """
+        :param text: the text of this page
+        :param page: the index of this page
+        :param page_count: the total number of pages
+        """
+        self.text = text
+        self.page = page
+        self.page_count = page_count
+
+    @property
+    def has_previous(self) -> bool:
+        return self.page > 0
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.page_count - 1
+
+
+async def generate_command_list_page(message: Message, page: int = 0,
+                                     parse_mode: str or None = ParseMode.MARKDOWN,
+                                     max_length: int = MAX_MESSAGE_LENGTH,
+                                     registry=None) -> CommandListPage:
+    """
+    Generates a single page of the list of available commands.
+    Page boundaries are determined by the size of the rendered help messages,
+    so no page exceeds the given maximum length (unless a single help message does).
+    Only the help messages of the requested page are joined.
+    :param message: the message that requested the command list
+    :param page: the index of the page, out of range values are clamped
+    :param parse_mode: the telegram parse mode to format the list for, None for plain text
+    :param max_length: the maximum length of a page
+    :param registry: the CommandRegistry to list commands of, defaults to DEFAULT_REGISTRY
+    :return: the requested page
+    """
+    from telegram_click_aio.help import get_help_renderer
+    from telegram_click_aio.registry import get_registry
+
+    registry = get_registry(registry)
+
+    if len(registry) <= 0:
+        return CommandListPage(get_help_renderer(parse_mode).escape("This bot does not have any commands."), 0, 1)
+
+    sorted_commands = registry.sorted_commands()
+
+    # the set of visible commands (as a bitmask) identifies the page layout
+    signature = 0
+    for idx, x in enumerate(sorted_commands):
+        if await _is_visible(x, message):
+            signature |= 1 << idx
+
+    if signature == 0:
+        return CommandListPage(
+            get_help_renderer(parse_mode).escape("You do not have permission to use commands."), 0, 1)
+
+    pages = registry.page_index(signature, parse_mode, max_length)
+
+    page = max(0, min(page, len(pages) - 1))
+    text = "\n\n".join(map(lambda x: sorted_commands[x][KEY_HELP_MESSAGE].for_parse_mode(parse_mode), pages[page]))
+    return CommandListPage(text, page, len(pages))
+
+
+async def _is_visible(command: dict, message: Message) -> bool:
+    """
+    Checks if a command should be listed for the given message
+    :param command: the command
+    :param message: the message that requested the command list
+    :return: True if visible, False otherwise
+    """
+    if command[KEY_PERMISSIONS] is not None and not await command[KEY_PERMISSIONS].evaluate(message):
+        return False
+
+    hidden = command[KEY_HIDDEN]
+    if isinstance(hidden, bool):
+        return not hidden
+    if callable(hidden):
+        return not hidden(message)
+    return True
@@ -19,8 +19,10 @@
 #  SOFTWARE.
 
 import logging
+from array import array
 
-from telegram_click_aio.const import ARG_VALUE_SEPARATOR_CHAR
+from telegram_click_aio.const import ARG_VALUE_SEPARATOR_CHAR, NARGS_ANY, NARGS_AT_LEAST_ONE
+from telegram_click_aio.document import DocumentStream, DEFAULT_MAX_DOCUMENT_SIZE, DEFAULT_CHUNK_SIZE
 from telegram_click_aio.util import find_duplicates
 
 LOGGER = logging.getLogger(__name__)
@@ -30,9 +32,12 @@ class Argument:
     """
     Command argument description
     """
+    # whether the value is taken from an attachment of the message instead of its text
+    attachment = False
 
     def __init__(self, name: str or [str], description: str, example: str, type: type = str, converter: callable = None,
-                 flag: bool = False, optional: bool = False, default: any = None, validator: callable = None):
+                 flag: bool = False, optional: bool = False, default: any = None, validator: callable = None,
+                 nargs: int or str = None):
         """
         Creates a command argument object
         :param name: the name (or names) of the argument
@@ -44,6 +49,9 @@ class Argument:
         :param optional: specifies if this argument is optional
         :param default: an optional default value
         :param validator: a validator function
+        :param nargs: turns this argument into a list argument, taking any number ("*"), at least one ("+")
+                      or exactly the given number of values. Lists of int and float values are converted into
+                      compact array('q') and array('d') containers. The validator is called once with all values.
         """
         for c in name:
             if c.isspace():
@@ -57,12 +65,13 @@ class Argument:
         self.flag = flag
         self.type = bool if flag else type
         if converter is None:
+            # converters are shared, so identical arguments of different commands compare equal
             if self.type is str:
-                self.converter = lambda x: x
+                self.converter = self._string_converter
             elif self.type is bool:
                 self.converter = self._boolean_converter
             elif self.type is int:
-                self.converter = lambda x: int(x)
+                self.converter = int
             elif self.type is float:
                 self.converter = self._float_converter
             else:
@@ -73,27 +82,137 @@ class Argument:
         self.default = default
         self.validator = validator
 
+        if nargs is not None:
+            if flag:
+                raise ValueError("Flags can not take multiple values!")
+            if nargs not in [NARGS_ANY, NARGS_AT_LEAST_ONE] and (not isinstance(nargs, int) or nargs < 1):
+                raise ValueError("nargs must be '*', '+' or a positive number: {}".format(nargs))
+        self.nargs = nargs
+
+        # type code of the array used to store list values, None for a plain list
+        self._array_type = None
+        if self.converter is int:
+            self._array_type = "q"
+        elif self.converter is self._float_converter:
+            self._array_type = "d"
+
     @property
     def name(self) -> str:
         return self.names[0]
 
+    @property
+    def type_name(self) -> str:
+        """
+        :return: the name of the value type shown in help messages
+        """
+        return self.type.__name__.upper()
+
+    @property
+    def is_list(self) -> bool:
+        """
+        :return: True if this argument takes multiple values
+        """
+        return self.nargs is not None
+
+    @property
+    def max_values(self) -> int or None:
+        """
+        :return: the maximum number of values of a list argument, None if there is no limit
+        """
+        return self.nargs if isinstance(self.nargs, int) else None
+
+    def _fingerprint(self) -> tuple:
+        """
+        :return: a tuple of everything that affects the behaviour of this argument,
+                 used to share compiled commands between identical definitions
+        """
+        return (type(self), tuple(self.names), self.description, self.example, self.type, self.flag, self.optional,
+                self.default, self.converter, self.validator, self.nargs)
+
     def parse_arg_value(self, arg: str or None) -> any:
         """
         Tries to parse the given value
         :param arg: the string value
         :return: the parsed value
+        :raises ValueError: if the value is missing or invalid
+        """
+        parsed, error = self.try_parse_arg_value(arg)
+        if error is not None:
+            raise ValueError(error)
+        return parsed
+
+    def try_parse_arg_value(self, arg: str or None) -> (any, str or None):
+        """
+        Tries to parse the given value, returning errors instead of raising them
+        :param arg: the string value
+        :return: (the parsed value, None) on success, (None, error message) otherwise
         """
         if arg is None:
             if self.optional:
-                return self.default
+                return self.default, None
             else:
-                raise ValueError("Missing required argument: '{}'".format(self.names[0]))
+                return None, "Missing required argument: '{}'".format(self.names[0])
 
-        parsed = self.converter(arg)
+        try:
+            parsed = self.converter(arg)
+        except ValueError as ex:
+            return None, str(ex) or "Invalid value for argument '{}': '{}'".format(self.names[0], arg)
         if self.validator is not None:
             if not self.validator(parsed):
-                raise ValueError("Invalid value for argument '{}': '{}'".format(self.names[0], arg))
-        return parsed
+                return None, "Invalid value for argument '{}': '{}'".format(self.names[0], arg)
+        return parsed, None
+
+    def try_parse_arg_values(self, args: [str]) -> (any, str or None, int or None):
+        """
+        Parses all values of a list argument in one pass
+        :param args: the string values
+        :return: (the parsed values, None, None) on success,
+                 (None, error message, index of the invalid value or None) otherwise
+        """
+        if len(args) <= 0:
+            if self.optional:
+                return self.default, None, None
+            if self.nargs != NARGS_ANY:
+                return None, "Missing required argument: '{}'".format(self.names[0]), None
+        if isinstance(self.nargs, int) and len(args) != self.nargs:
+            return None, "Expected {} values for argument '{}' but found {}".format(
+                self.nargs, self.names[0], len(args)), None
+
+        try:
+            if self._array_type is None:
+                parsed = list(map(self.converter, args))
+            else:
+                parsed = array(self._array_type, map(self.converter, args))
+        except (ValueError, OverflowError):
+            # the batch conversion failed, look for the culprit
+            for idx, arg in enumerate(args):
+                try:
+                    value = self.converter(arg)
+                    if self._array_type is not None:
+                        # values exceeding the range of the array type
+                        array(self._array_type, [value])
+                except (ValueError, OverflowError) as ex:
+                    return None, str(ex) or "Invalid value for argument '{}': '{}'".format(self.names[0], arg), idx
+            raise
+
+        if self.validator is not None:
+            if not self.validator(parsed):
+                return None, "Invalid values for argument '{}': {}".format(self.names[0], " ".join(args)), None
+        return parsed, None, None
+
+    def to_list_value(self, values: list) -> any:
+        """
+        Wraps already converted values of a list argument in the container used by the parser
+        :param values: converted values
+        :return: array or list
+        """
+        if self._array_type is None:
+            return list(values)
+        return array(self._array_type, values)
+
+    @staticmethod
+    def _string_converter(value: str) -> str:
+        return value
 
     @staticmethod
     def _boolean_converter(value: str) -> bool:
@@ -174,3 +293,42 @@ class Selection(Argument):
 
         super().__init__(name, description, example=allowed_values[0], type=type, converter=converter,
                          optional=optional, default=default, validator=validator)
+
+
+class DocumentArgument(Argument):
+    """
+    Command argument resolved from the document attached to the command message.
+    The handler receives a DocumentStream to read the document contents in chunks.
+    """
+    attachment = True
+
+    def __init__(self, name: str or [str], description: str, optional: bool = False,
+                 max_size: int = DEFAULT_MAX_DOCUMENT_SIZE, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Constructor
+        :param name: the name of the argument
+        :param description: a short description of the argument
+        :param optional: specifies if this argument is optional, the value is None if no document is attached
+        :param max_size: the maximum size of the document in bytes
+        :param chunk_size: the size of chunks to read
+        """
+        super().__init__(name, description, example="", type=DocumentStream, converter=DocumentStream,
+                         optional=optional)
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+
+    @property
+    def type_name(self) -> str:
+        return "DOCUMENT"
+
+    def _fingerprint(self) -> tuple:
+        return super()._fingerprint() + (self.max_size, self.chunk_size)
+
+    def open(self, bot, document) -> DocumentStream:
+        """
+        Creates a stream for the given document
+        :param bot: the bot to download the document with
+        :param document: the attached document
+        :return: the stream
+        """
+        return DocumentStream(bot, document, max_size=self.max_size, chunk_size=self.chunk_size)
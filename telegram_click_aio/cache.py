@@ -0,0 +1,427 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+from collections import OrderedDict
+
+from aiogram import Bot
+from aiogram.types import ChatMemberUpdated
+
+from telegram_click_aio.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+LOGGER = logging.getLogger(__name__)
+
+# seconds to remember the identity of a bot
+BOT_IDENTITY_TTL = 3600.0
+# seconds to remember the last known membership status, used as a fallback if lookups fail
+LAST_KNOWN_CHAT_MEMBER_TTL = 86400.0
+
+
+class CacheBackend:
+    """
+    Key value store for state that should be shared between commands, f.ex.
+    chat member lookups of permission checks, bot identities and throttle buckets.
+    Values have to be picklable, so they can be stored by backends shared between processes.
+    """
+
+    @abstractmethod
+    def get(self, key: str, default: any = None) -> any:
+        """
+        :param key: key
+        :param default: value to return if the key is missing or expired
+        :return: the stored value
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def set(self, key: str, value: any, ttl: float = None):
+        """
+        Stores a value
+        :param key: key
+        :param value: value
+        :param ttl: seconds after which the value expires, None to keep it until it is evicted
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Removes a value
+        :param key: key
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def update(self, key: str, func: callable, ttl: float = None) -> any:
+        """
+        Atomically replaces a value with the result of a function
+        :param key: key
+        :param func: function taking the current value (None if missing) and returning the new value
+        :param ttl: seconds after which the new value expires
+        :return: the new value
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def clear(self):
+        """
+        Removes all values
+        """
+        raise NotImplementedError()
+
+    async def get_async(self, key: str, default: any = None) -> any:
+        """
+        Like get(), for use in coroutines. Backends doing blocking I/O override this
+        to keep the event loop responsive.
+        """
+        return self.get(key, default)
+
+    async def set_async(self, key: str, value: any, ttl: float = None):
+        """
+        Like set(), for use in coroutines
+        """
+        self.set(key, value, ttl)
+
+    async def update_async(self, key: str, func: callable, ttl: float = None) -> any:
+        """
+        Like update(), for use in coroutines
+        """
+        return self.update(key, func, ttl)
+
+    async def delete_async(self, key: str):
+        """
+        Like delete(), for use in coroutines
+        """
+        self.delete(key)
+
+
+class LruCache(CacheBackend):
+    """
+    In-process cache with a fixed maximum number of entries
+    """
+
+    def __init__(self, max_size: int = 100000):
+        """
+        Creates an instance
+        :param max_size: the maximum number of entries, least recently used entries are dropped first
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        # key -> (value, expiry time)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: any = None) -> any:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return default
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: any, ttl: float = None):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def update(self, key: str, func: callable, ttl: float = None) -> any:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            current = None
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                current = entry[0]
+            value = func(current)
+            self._put(key, value, ttl)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _put(self, key: str, value: any, ttl: float or None):
+        self._entries[key] = (value, None if ttl is None else time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCache(CacheBackend):
+    """
+    Cache stored in a local SQLite database in WAL mode,
+    which can be shared by multiple processes on the same machine.
+    Note: Values are pickled, so the database file must only be writable by trusted processes.
+    Note: The synchronous methods block the calling thread, f.ex. while another process holds the write lock
+    (up to timeout seconds). The *_async methods, which are used by command processing,
+    run them on the default executor of the event loop instead.
+    """
+
+    # number of writes between removals of expired entries
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        """
+        Creates an instance
+        :param path: path of the database file
+        :param timeout: seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._writes = 0
+
+    def get(self, key: str, default: any = None) -> any:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, time.time())).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key: str, value: any, ttl: float = None):
+        with self._lock:
+            connection = self._connect()
+            self._put(connection, key, value, ttl)
+            self._purge_if_necessary(connection)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def update(self, key: str, func: callable, ttl: float = None) -> any:
+        with self._lock:
+            connection = self._connect()
+            # take the write lock before reading, so no other process can interleave
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                    (key, time.time())).fetchone()
+                value = func(None if row is None else pickle.loads(row[0]))
+                self._put(connection, key, value, ttl)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            self._purge_if_necessary(connection)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM cache")
+
+    async def get_async(self, key: str, default: any = None) -> any:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key, default)
+
+    async def set_async(self, key: str, value: any, ttl: float = None):
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, value, ttl)
+
+    async def update_async(self, key: str, func: callable, ttl: float = None) -> any:
+        return await asyncio.get_running_loop().run_in_executor(None, self.update, key, func, ttl)
+
+    async def delete_async(self, key: str):
+        await asyncio.get_running_loop().run_in_executor(None, self.delete, key)
+
+    def close(self):
+        """
+        Closes the database connection of this process
+        """
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM cache WHERE expires IS NULL OR expires > ?", (time.time(),)).fetchone()[0]
+
+    def __getstate__(self):
+        # connections can not be shared with other processes
+        state = dict(self.__dict__)
+        state["_lock"] = None
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # a forked process must not use the connection of its parent
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _put(connection: sqlite3.Connection, key: str, value: any, ttl: float or None):
+        connection.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                           (key, pickle.dumps(value), None if ttl is None else time.time() + ttl))
+
+    def _purge_if_necessary(self, connection: sqlite3.Connection):
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            connection.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+
+
+# cache used by permission checks and bot identity lookups
+_CACHE = LruCache()
+
+
+def get_cache() -> CacheBackend:
+    """
+    :return: the cache backend used by permission checks and bot identity lookups
+    """
+    return _CACHE
+
+
+def set_cache(cache: CacheBackend):
+    """
+    Sets the cache backend used by permission checks and bot identity lookups.
+    Use a backend shared between processes (f.ex. SqliteCache) when running multiple worker processes.
+    :param cache: the cache backend
+    """
+    global _CACHE
+    _CACHE = cache
+
+
+async def get_bot_username(bot: Bot) -> str:
+    """
+    :param bot: the bot
+    :return: the username of the bot
+    """
+    key = "bot:{}:username".format(bot.id)
+    cache = get_cache()
+    username = await cache.get_async(key)
+    if username is None:
+        me = await bot.get_me()
+        username = me.username
+        await cache.set_async(key, username, BOT_IDENTITY_TTL)
+    return username
+
+
+async def get_chat_member_status(bot: Bot, chat_id: int, user_id: int, timeout: float = None,
+                                 circuit_breaker: CircuitBreaker = None, ttl: float = None) -> str:
+    """
+    :param bot: the bot
+    :param chat_id: chat id
+    :param user_id: user id
+    :param timeout: the maximum number of seconds to wait for the Bot API, None to wait indefinitely
+    :param circuit_breaker: a circuit breaker to stop issuing lookups after repeated failures
+    :param ttl: the number of seconds a looked up status may be reused, None to always look it up
+    :return: the status of the user in the chat, f.ex. "creator" or "administrator"
+    """
+    key = "bot:{}:member:{}:{}".format(bot.id, chat_id, user_id)
+    cache = get_cache()
+    status = None if ttl is None else await cache.get_async(key)
+    if status is None:
+        if circuit_breaker is not None and not circuit_breaker.allow():
+            raise CircuitOpenError("Chat member lookups are suspended after repeated failures")
+        try:
+            if timeout is None:
+                member = await bot.get_chat_member(chat_id, user_id)
+            else:
+                member = await asyncio.wait_for(bot.get_chat_member(chat_id, user_id), timeout)
+        except Exception:
+            if circuit_breaker is not None:
+                circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            # f.ex. cancelled by a command timeout, this says nothing about the health of the Bot API
+            if circuit_breaker is not None:
+                circuit_breaker.record_cancelled()
+            raise
+        if circuit_breaker is not None:
+            circuit_breaker.record_success()
+
+        status = getattr(member.status, "value", member.status)
+        if ttl is not None:
+            await cache.set_async(key, status, ttl)
+        await cache.set_async(_last_known_key(key), status, LAST_KNOWN_CHAT_MEMBER_TTL)
+    return status
+
+
+async def set_chat_member_status(bot_id: int, chat_id: int, user_id: int, status: any):
+    """
+    Updates the last known status of a user in a chat, f.ex. when a chat_member update is received,
+    and drops the reusable status, so the next lookup fetches the new one
+    :param bot_id: bot id
+    :param chat_id: chat id
+    :param user_id: user id
+    :param status: the new status of the user in the chat
+    """
+    key = "bot:{}:member:{}:{}".format(bot_id, chat_id, user_id)
+    status = getattr(status, "value", status)
+    cache = get_cache()
+    # the reusable status is stored with the ttl of the permission that looked it up, which is unknown here
+    await cache.delete_async(key)
+    await cache.set_async(_last_known_key(key), status, LAST_KNOWN_CHAT_MEMBER_TTL)
+
+
+async def on_chat_member_updated(update: ChatMemberUpdated):
+    """
+    Handler for chat_member updates, register it with your dispatcher to update cached member statuses
+    as soon as a membership changes:
+    dispatcher.chat_member.register(on_chat_member_updated)
+    Note: chat_member updates have to be requested explicitly using allowed_updates.
+    :param update: the update
+    """
+    new_member = update.new_chat_member
+    await set_chat_member_status(update.bot.id, update.chat.id, new_member.user.id, new_member.status)
+
+
+async def get_last_known_chat_member_status(bot: Bot, chat_id: int, user_id: int) -> str or None:
+    """
+    :param bot: the bot
+    :param chat_id: chat id
+    :param user_id: user id
+    :return: the most recently looked up status of the user in the chat, even if it may be outdated,
+             None if it is unknown
+    """
+    return await get_cache().get_async(_last_known_key("bot:{}:member:{}:{}".format(bot.id, chat_id, user_id)))
+
+
+def _last_known_key(key: str) -> str:
+    return key + ":last"
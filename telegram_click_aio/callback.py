@@ -0,0 +1,280 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import base64
+import logging
+import struct
+import weakref
+import zlib
+
+from aiogram.types import CallbackQuery, Message
+
+from telegram_click_aio.parser import ArgumentSpec
+
+LOGGER = logging.getLogger(__name__)
+
+CALLBACK_DATA_VERSION = 1
+# Telegram's maximum length of callback data in bytes
+MAX_CALLBACK_DATA_LENGTH = 64
+CALLBACK_DATA_SEPARATOR = ":"
+
+_FLOAT = struct.Struct("<d")
+
+# ArgumentSpec -> CallbackDataCodec
+_CODECS = weakref.WeakKeyDictionary()
+
+
+class CallbackDataCodec:
+    """
+    Encodes argument values of a command into compact callback data for inline keyboard buttons,
+    and decodes them without going through the text tokenizer.
+
+    Binary layout (before base64url encoding):
+    version (1 byte), schema fingerprint (1 byte), presence bitmap (1 bit per argument),
+    followed by the values of all present (non-flag) arguments in argument order.
+    Values of list arguments are prefixed with their number.
+    """
+
+    def __init__(self, spec: ArgumentSpec):
+        """
+        Creates a codec for the given arguments
+        :param spec: the compiled arguments of a command
+        """
+        self.arguments = spec.arguments
+        schema = ";".join(map(lambda x: "{}:{}:{}".format(x.name, x.type.__name__, x.flag)
+                                         + ("" if x.nargs is None else ":{}".format(x.nargs)), self.arguments))
+        # detects buttons that have been created for an older version of the command
+        self.fingerprint = zlib.crc32(schema.encode("utf-8")) & 0xFF
+        self._bitmap_length = (len(self.arguments) + 7) // 8
+
+    def encode(self, values: dict) -> bytes:
+        """
+        Encodes the given argument values
+        :param values: map of (argument name, in python param naming convention -> value)
+        :return: binary payload
+        """
+        bitmap = 0
+        body = bytearray()
+        for idx, arg in enumerate(self.arguments):
+            value = values.get(_python_name(arg.name), None)
+            if arg.flag:
+                if value:
+                    bitmap |= 1 << idx
+                continue
+            if value is None:
+                if not arg.optional:
+                    raise ValueError("Missing required argument: '{}'".format(arg.name))
+                continue
+
+            bitmap |= 1 << idx
+            if arg.is_list:
+                _write_varint(body, len(value))
+                for item in value:
+                    _write_value(body, arg, item)
+            else:
+                _write_value(body, arg, value)
+
+        return bytes([CALLBACK_DATA_VERSION, self.fingerprint]) + bitmap.to_bytes(self._bitmap_length, "little") + body
+
+    def decode(self, payload: bytes) -> dict:
+        """
+        Decodes argument values
+        :param payload: binary payload created by encode()
+        :return: map of (argument name -> value)
+        """
+        header_length = 2 + self._bitmap_length
+        if len(payload) < header_length or payload[0] != CALLBACK_DATA_VERSION:
+            raise ValueError("Unsupported callback data")
+        if payload[1] != self.fingerprint:
+            raise ValueError("Outdated callback data, the command has changed")
+
+        bitmap = int.from_bytes(payload[2:header_length], "little")
+        position = header_length
+
+        parsed_args = {}
+        for idx, arg in enumerate(self.arguments):
+            present = bitmap & (1 << idx)
+            if arg.flag:
+                parsed_args[arg.name] = bool(present)
+                continue
+            if not present:
+                parsed_args[arg.name] = arg.parse_arg_value(None)
+                continue
+
+            try:
+                if arg.is_list:
+                    count, position = _read_varint(payload, position)
+                    items = []
+                    for _ in range(count):
+                        item, position = _read_value(payload, position, arg)
+                        items.append(item)
+                    value = arg.to_list_value(items)
+                else:
+                    value, position = _read_value(payload, position, arg)
+            except (IndexError, struct.error):
+                raise ValueError("Truncated callback data")
+
+            if arg.validator is not None and not arg.validator(value):
+                raise ValueError("Invalid value for argument '{}': '{}'".format(arg.name, value))
+            parsed_args[arg.name] = value
+
+        return parsed_args
+
+
+def _write_value(body: bytearray, arg, value: any):
+    """
+    Appends a single value of the given argument
+    """
+    if arg.type is bool:
+        body.append(1 if value else 0)
+    elif arg.type is int:
+        _write_varint(body, _zigzag(int(value)))
+    elif arg.type is float:
+        body.extend(_FLOAT.pack(float(value)))
+    else:
+        text = str(value).encode("utf-8")
+        _write_varint(body, len(text))
+        body.extend(text)
+
+
+def _read_value(payload: bytes, position: int, arg) -> (any, int):
+    """
+    Reads a single value of the given argument
+    :return: (value, position after the value)
+    """
+    if arg.type is bool:
+        return payload[position] != 0, position + 1
+    if arg.type is int:
+        value, position = _read_varint(payload, position)
+        return _unzigzag(value), position
+    if arg.type is float:
+        return _FLOAT.unpack_from(payload, position)[0], position + _FLOAT.size
+
+    length, position = _read_varint(payload, position)
+    if position + length > len(payload):
+        raise IndexError()
+    value = payload[position:position + length].decode("utf-8")
+    if arg.type is not str:
+        value = arg.converter(value)
+    return value, position + length
+
+
+def get_callback_data_codec(spec: ArgumentSpec) -> CallbackDataCodec:
+    """
+    :param spec: the compiled arguments of a command
+    :return: the (cached) codec for the given arguments
+    """
+    codec = _CODECS.get(spec, None)
+    if codec is None:
+        codec = CallbackDataCodec(spec)
+        _CODECS[spec] = codec
+    return codec
+
+
+def encode_callback_data(command_name: str, registry=None, **values) -> str:
+    """
+    Encodes a command invocation as callback data for an inline keyboard button
+    :param command_name: the name of the command
+    :param registry: the CommandRegistry of the command, defaults to DEFAULT_REGISTRY
+    :param values: argument values, using the python param naming convention (snake-case)
+    :return: callback data
+    """
+    from telegram_click_aio.const import KEY_ARGUMENT_SPEC
+    from telegram_click_aio.registry import get_registry
+
+    command = get_registry(registry).get(command_name)
+    if command is None:
+        raise ValueError("Unknown command: {}".format(command_name))
+
+    payload = get_callback_data_codec(command[KEY_ARGUMENT_SPEC]).encode(values)
+    data = command_name + CALLBACK_DATA_SEPARATOR + base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+    if len(data.encode("utf-8")) > MAX_CALLBACK_DATA_LENGTH:
+        raise ValueError("Callback data exceeds {} bytes: {}".format(MAX_CALLBACK_DATA_LENGTH, data))
+    return data
+
+
+def decode_callback_data(spec: ArgumentSpec, data: str) -> (str, dict):
+    """
+    Decodes callback data created using encode_callback_data()
+    :param spec: the compiled arguments of the command
+    :param data: callback data
+    :return: (command name, map of (argument name -> value))
+    """
+    if data is None or CALLBACK_DATA_SEPARATOR not in data:
+        raise ValueError("Unsupported callback data")
+
+    command_name, encoded = data.split(CALLBACK_DATA_SEPARATOR, 1)
+    try:
+        payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    except ValueError:
+        raise ValueError("Unsupported callback data")
+    return command_name, get_callback_data_codec(spec).decode(payload)
+
+
+def get_callback_command_name(data: str or None) -> str or None:
+    """
+    :param data: callback data
+    :return: the name of the command the callback data belongs to, None if it is not a command invocation
+    """
+    if data is None or CALLBACK_DATA_SEPARATOR not in data:
+        return None
+    return data.split(CALLBACK_DATA_SEPARATOR, 1)[0]
+
+
+def get_callback_query_message(query: CallbackQuery) -> Message or None:
+    """
+    Creates the message used for permission checks and error replies of a callback query.
+    This is the message the inline keyboard is attached to, with the user that pressed the button as sender.
+    :param query: the callback query
+    :return: message, or None if the message is not accessible
+    """
+    if not isinstance(query.message, Message):
+        return None
+    return query.message.model_copy(update={"from_user": query.from_user})
+
+
+def _python_name(name: str) -> str:
+    return name.lower().replace("-", "_")
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _write_varint(buffer: bytearray, value: int):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(payload: bytes, position: int) -> (int, int):
+    result = 0
+    shift = 0
+    while True:
+        byte = payload[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
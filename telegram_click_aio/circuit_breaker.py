@@ -0,0 +1,123 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import logging
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CircuitState:
+    """
+    States of a CircuitBreaker
+    """
+    # calls are allowed
+    CLOSED = "closed"
+    # calls are rejected right away
+    OPEN = "open"
+    # a single probe call is allowed to find out whether the service has recovered
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a service whose circuit breaker is open
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service after repeated failures, and probes it again after a while.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = None):
+        """
+        Creates an instance
+        :param failure_threshold: the number of consecutive failures that open the circuit
+        :param reset_timeout: seconds to wait before probing the service again
+        :param name: a name used in log messages
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        if reset_timeout <= 0:
+            raise ValueError("reset_timeout must be positive")
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.failures = 0
+        # number of calls that have been rejected because the circuit was open
+        self.rejected = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """
+        :return: the current state, one of CircuitState
+        """
+        if self._opened_at is None:
+            return CircuitState.CLOSED
+        if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def allow(self) -> bool:
+        """
+        Checks whether a call may be made. A caller that is allowed to call has to report the outcome
+        using record_success() or record_failure().
+        :return: True if the call may be made, False if it should be rejected
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN:
+            # let a single probe through
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        """
+        Reports a successful call, closing the circuit
+        """
+        if self._opened_at is not None:
+            LOGGER.info("Circuit {} closed".format(self.name))
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        """
+        Reports a failed call, opening the circuit after too many consecutive failures
+        """
+        self.failures += 1
+        if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+            LOGGER.warning("Circuit {} opened after {} consecutive failures".format(self.name, self.failures))
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def record_cancelled(self):
+        """
+        Reports a call that has been aborted before its outcome was known, f.ex. because it was cancelled.
+        A pending probe may be retried right away.
+        """
+        self._probing = False
@@ -0,0 +1,165 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import logging
+import sys
+from collections import deque
+
+from telegram_click_aio import Scope
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Slot:
+    """
+    Concurrency state of a single scope key
+    """
+    __slots__ = ["in_flight", "waiters"]
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiters = deque()
+
+
+class ConcurrencyLimiter:
+    """
+    Limits the number of concurrent invocations of a command.
+    Invocations exceeding the limit wait in a bounded FIFO queue,
+    invocations exceeding the queue limit are rejected right away.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int = 0, scope: int or callable = Scope.GLOBAL):
+        """
+        Creates an instance
+        :param max_concurrency: the maximum number of concurrent invocations per scope key
+        :param max_queue: the maximum number of invocations waiting for a free slot per scope key
+        :param scope: a combination of Scope values, or a function that returns a key for a message
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.scope = scope
+        # only keys with running or waiting invocations are kept
+        self._slots = {}
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def in_flight_for(self, key: any) -> int:
+        """
+        :param key: scope key
+        :return: the number of running invocations for the given key
+        """
+        slot = self._slots.get(key, None)
+        return 0 if slot is None else slot.in_flight
+
+    def queued_for(self, key: any) -> int:
+        """
+        :param key: scope key
+        :return: the number of waiting invocations for the given key
+        """
+        slot = self._slots.get(key, None)
+        return 0 if slot is None else len(slot.waiters)
+
+    async def acquire(self, key: any) -> bool:
+        """
+        Waits for a free slot
+        :param key: scope key
+        :return: True if a slot was acquired, False if the invocation was rejected
+        """
+        slot = self._slots.get(key, None)
+        if slot is None:
+            slot = _Slot()
+            self._slots[key] = slot
+
+        if slot.in_flight < self.max_concurrency:
+            slot.in_flight += 1
+            self.in_flight += 1
+            return True
+
+        if len(slot.waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        slot.waiters.append(future)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # the slot has already been handed over to us
+                self.release(key)
+            else:
+                if future in slot.waiters:
+                    slot.waiters.remove(future)
+                    self.queued -= 1
+                self._discard_if_idle(key, slot)
+            raise
+        return True
+
+    def release(self, key: any):
+        """
+        Frees a slot previously acquired using acquire()
+        :param key: scope key
+        """
+        slot = self._slots[key]
+        while len(slot.waiters) > 0:
+            future = slot.waiters.popleft()
+            self.queued -= 1
+            if not future.done():
+                # hand the slot over to the next waiting invocation
+                future.set_result(None)
+                return
+
+        slot.in_flight -= 1
+        self.in_flight -= 1
+        self._discard_if_idle(key, slot)
+
+    def _discard_if_idle(self, key: any, slot: _Slot):
+        if slot.in_flight <= 0 and len(slot.waiters) <= 0 and self._slots.get(key, None) is slot:
+            del self._slots[key]
+
+
+class LaneScheduler(ConcurrencyLimiter):
+    """
+    Runs invocations with the same scope key (lane) one after another, in the order they arrived,
+    while invocations of different lanes run in parallel.
+    Only lanes with running or waiting invocations are kept in memory.
+    """
+
+    def __init__(self, scope: int or callable = Scope.CHAT, max_queue: int = None):
+        """
+        Creates an instance
+        :param scope: a combination of Scope values, or a function that returns a key for a message
+        :param max_queue: the maximum number of invocations waiting in a single lane, None for no limit
+        """
+        super().__init__(1, sys.maxsize if max_queue is None else max_queue, scope)
+
+    @property
+    def lanes(self) -> int:
+        """
+        :return: the number of lanes with running or waiting invocations
+        """
+        return len(self._slots)
@@ -26,9 +26,17 @@ ARG_VALUE_SEPARATOR_CHAR = "="
 
 QUOTE_CHARS = ['"', '\'']
 
+# nargs of list arguments taking any number of values, or at least one value
+NARGS_ANY = "*"
+NARGS_AT_LEAST_ONE = "+"
+
 KEY_NAMES = "names"
 KEY_DESCRIPTION = "description"
 KEY_ARGUMENTS = "arguments"
+KEY_ARGUMENT_SPEC = "argument_spec"
 KEY_HELP_MESSAGE = "help_message"
 KEY_PERMISSIONS = "permissions"
 KEY_HIDDEN = "hidden"
+KEY_CONCURRENCY_LIMITER = "concurrency_limiter"
+KEY_TIMEOUT = "timeout"
+KEY_TIMEOUT_COUNT = "timeout_count"
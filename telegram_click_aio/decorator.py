@@ -19,52 +19,126 @@
 #  SOFTWARE.
 import asyncio
 import functools
+import inspect
 import logging
+from concurrent.futures import Executor
 from typing import List
 
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
 
-from telegram_click_aio import CommandTarget
+from telegram_click_aio import CommandTarget, Scope, tracing
 from telegram_click_aio.argument import Argument
+from telegram_click_aio.cache import get_bot_username
+from telegram_click_aio.callback import decode_callback_data, get_callback_query_message, get_callback_command_name
+from telegram_click_aio.concurrency import ConcurrencyLimiter, LaneScheduler
 from telegram_click_aio.const import *
+from telegram_click_aio.denial import DenialCache
+from telegram_click_aio.duplicate import DuplicateFilter
 from telegram_click_aio.error_handler import ErrorHandler, DEFAULT_ERROR_HANDLER
-from telegram_click_aio.help import generate_help_message
-from telegram_click_aio.parser import parse_telegram_command, split_command_from_args, split_command_from_target
-from telegram_click_aio.permission.base import Permission
-from telegram_click_aio.util import find_first, find_duplicates
+from telegram_click_aio.executor import CommandExecutor, get_command_executor, register_sync_handler
+from telegram_click_aio.parser import parse_telegram_command_result, split_command_from_args, \
+    split_command_from_target, ArgumentSpec, ArgumentParseError, ParseError, ParseErrorCode
+from telegram_click_aio.permission.base import Permission, evaluate_checked_permission
+from telegram_click_aio.profiling import CommandProfiler, ProfileSample, get_profiler
+from telegram_click_aio.registry import CommandRegistry, get_registry, compile_command
+from telegram_click_aio.throttle import Throttle
+from telegram_click_aio.util import find_first, find_duplicates, get_scope_key, get_message_text
 
 LOGGER = logging.getLogger(__name__)
 
 
-async def _check_permissions(message: Message, permissions: Permission) -> bool:
+def _resolve_attachments(message: Message, spec: ArgumentSpec, parsed_args: dict) -> ArgumentParseError or None:
+    """
+    Adds the values of all attachment arguments to the parsed arguments
+    :param message: the command message
+    :param spec: the compiled arguments of the command
+    :param parsed_args: parsed arguments of the command text
+    :return: an error if an attachment is missing or invalid, None otherwise
+    """
+    errors = []
+    for arg in spec.attachments:
+        if message.document is None:
+            if arg.optional:
+                parsed_args[arg.name] = None
+            else:
+                errors.append(ParseError(ParseErrorCode.MISSING_ARGUMENT,
+                                         "Missing required document: '{}'".format(arg.name), arg.name))
+            continue
+        try:
+            parsed_args[arg.name] = arg.open(message.bot, message.document)
+        except ValueError as ex:
+            errors.append(ParseError(ParseErrorCode.INVALID_VALUE, str(ex), arg.name))
+    return ArgumentParseError(errors) if len(errors) > 0 else None
+
+
+async def _check_permissions(message: Message, permissions: Permission) -> (bool, bool):
     """
     Checks if a message passes permission tests
     :param message: message
     :param permissions: command permissions
-    :return: True if authorized, False otherwise
+    :return: a tuple of True if authorized, False otherwise,
+             and whether the result has actually been checked instead of decided by a lookup fallback
     """
     if permissions is not None:
-        return await permissions.evaluate(message)
+        return await evaluate_checked_permission(permissions, message)
     else:
-        return True
+        return True, True
 
 
-async def check_command_name_clashes(names: List[str]):
+async def _answer_callback_query(query: CallbackQuery):
     """
-    Checks if a command name has been used multiple times and raises an exception if so
-    :param names: command names added in this decorator call
+    Answers a callback query, ignoring errors (f.ex. if it has already been answered)
+    :param query: the callback query
     """
-    from telegram_click_aio import COMMAND_LIST
+    try:
+        await query.answer()
+    except Exception as ex:
+        LOGGER.debug("Error answering callback query {}: {!r}".format(query.id, ex))
 
-    t = []
-    t.extend(map(lambda x: x["names"], COMMAND_LIST))
-    t.extend([names])
-    t = functools.reduce(list.__add__, t)
 
-    duplicates = find_duplicates(t)
-    if len(duplicates) > 0:
-        clashing = ", ".join(duplicates.keys())
-        raise ValueError("Command names must be unique! Clashing names: {}".format(clashing))
+class _DeadlineExceeded(Exception):
+    """
+    Raised when a command handler did not finish within its timeout
+    """
+    pass
+
+
+async def _wait_for(coro, timeout: float) -> any:
+    """
+    Awaits a coroutine and cancels it when the timeout expires.
+    Unlike asyncio.wait_for() this allows to tell an expired timeout apart
+    from a TimeoutError raised by the coroutine itself.
+    :param coro: the coroutine
+    :param timeout: timeout in seconds
+    :return: the result of the coroutine
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        done, _ = await asyncio.wait([task], timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception:
+        LOGGER.exception("Error while cancelling command handler")
+    raise _DeadlineExceeded()
+
+
+async def check_command_name_clashes(names: List[str], registry: CommandRegistry = None):
+    """
+    Checks if a command name has been used multiple times and raises an exception if so
+    :param names: command names added in this decorator call
+    :param registry: the registry the command is added to, defaults to DEFAULT_REGISTRY
+    """
+    get_registry(registry).check_name_clashes(names)
 
 
 async def check_argument_name_clashes(arguments: List[Argument]):
@@ -98,9 +172,22 @@ def command(name: str or [str], description: str = None,
             hidden: bool or callable = None,
             permissions: Permission = None,
             command_target: bytes = CommandTarget.UNSPECIFIED | CommandTarget.SELF,
-            error_handler: ErrorHandler = None):
+            error_handler: ErrorHandler = None,
+            executor: Executor or CommandExecutor = None,
+            max_concurrency: int = None,
+            max_queue: int = 0,
+            concurrency_scope: int or callable = Scope.GLOBAL,
+            throttle: Throttle = None,
+            deduplicate: bool or DuplicateFilter = False,
+            registry: CommandRegistry = None,
+            lane: int or callable or LaneScheduler = None,
+            timeout: float = None,
+            profiler: CommandProfiler = None,
+            denial_cache: DenialCache = None):
     """
-    Decorator to turn a command handler function into a full fledged, shell like command
+    Decorator to turn a command handler function into a full fledged, shell like command.
+    The decorated function can also handle callback queries of inline keyboard buttons
+    created using telegram_click_aio.callback.encode_callback_data()
     :param name: Name of the command
     :param description: a short description of the command
     :param arguments: list of command argument description objects
@@ -108,8 +195,31 @@ def command(name: str or [str], description: str = None,
     :param permissions: required permissions to run this command
     :param command_target: command targets to accept
     :param error_handler: a customized error handler
+    :param executor: an executor to run a synchronous command handler on,
+                     permission checks and argument parsing still happen on the event loop
+    :param max_concurrency: the maximum number of concurrent invocations of this command (per scope)
+    :param max_queue: the maximum number of invocations waiting for one of the max_concurrency slots (per scope),
+                      further invocations are rejected
+    :param concurrency_scope: a combination of Scope values, or a function that returns a key for a message,
+                              used to group invocations for max_concurrency and max_queue
+    :param throttle: a rate limit that is applied before checking permissions and parsing arguments,
+                     the same instance can be shared by multiple commands
+    :param deduplicate: whether to ignore messages that have already been processed by this command,
+                        or a DuplicateFilter, which can be shared by multiple commands
+    :param registry: the registry to add this command to, defaults to DEFAULT_REGISTRY
+    :param lane: a combination of Scope values, a function that returns a key for a message, or a LaneScheduler,
+                 invocations with the same key run one after another in arrival order,
+                 a LaneScheduler can be shared by multiple commands
+    :param timeout: seconds after which the command handler is cancelled, the number of timeouts
+                    is recorded in the command entry of the registry
+                    (note: handlers running on an executor can not be interrupted)
+    :param profiler: a profiler for sampled invocations of this command,
+                     defaults to the one set using telegram_click_aio.profiling.set_profiler()
+    :param denial_cache: remembers denied permission checks, repeated attempts within its ttl are dropped
+                         before checking permissions again (without calling the error handler),
+                         the same instance can be shared by multiple commands
     """
-    from telegram_click_aio import COMMAND_LIST
+    registry = get_registry(registry)
 
     name = [name] if not isinstance(name, list) else name
     if arguments is None:
@@ -120,94 +230,279 @@ def command(name: str or [str], description: str = None,
 
     loop = asyncio.get_event_loop()
 
-    loop.run_until_complete(check_command_name_clashes(name))
+    loop.run_until_complete(check_command_name_clashes(name, registry))
     loop.run_until_complete(check_argument_name_clashes(arguments))
     loop.run_until_complete(check_optional_argument_after_other(name, arguments))
 
-    help_message = loop.run_until_complete(generate_help_message(name, description, arguments))
-
-    COMMAND_LIST.append(
-        {
-            KEY_NAMES: name,
-            KEY_DESCRIPTION: description,
-            KEY_ARGUMENTS: arguments,
-            KEY_HELP_MESSAGE: help_message,
-            KEY_PERMISSIONS: permissions,
-            KEY_HIDDEN: hidden
-        }
-    )
+    help_message, argument_spec = compile_command(name, description, arguments)
+
+    duplicate_filter = None
+    if isinstance(deduplicate, DuplicateFilter):
+        duplicate_filter = deduplicate
+    elif deduplicate:
+        duplicate_filter = DuplicateFilter()
+
+    limiter = None
+    if max_concurrency is not None:
+        limiter = ConcurrencyLimiter(max_concurrency, max_queue, concurrency_scope)
+
+    if timeout is not None and timeout <= 0:
+        raise ValueError("timeout must be positive")
+
+    lanes = None
+    if isinstance(lane, LaneScheduler):
+        lanes = lane
+    elif lane is not None:
+        lanes = LaneScheduler(lane)
+
+    command_entry = {
+        KEY_NAMES: name,
+        KEY_DESCRIPTION: description,
+        KEY_ARGUMENTS: arguments,
+        KEY_ARGUMENT_SPEC: argument_spec,
+        KEY_HELP_MESSAGE: help_message,
+        KEY_PERMISSIONS: permissions,
+        KEY_HIDDEN: hidden,
+        KEY_CONCURRENCY_LIMITER: limiter,
+        KEY_TIMEOUT: timeout,
+        KEY_TIMEOUT_COUNT: 0
+    }
+    registry.add(command_entry)
 
     error_handlers = [DEFAULT_ERROR_HANDLER]
     if error_handler is not None:
         error_handlers.insert(0, error_handler)
 
+    if executor is not None:
+        executor = get_command_executor(executor)
+
     def callback_decorator(func: callable):
         """
         Callback decorator function
         :param func: the function to wrap
         :return: wrapper function
         """
+        with_reply = False
+        if executor is not None:
+            if inspect.iscoroutinefunction(func):
+                raise ValueError("Only synchronous command handlers can be run on an executor: {}".format(
+                    func.__qualname__))
+            register_sync_handler(func)
+            # only pass a WorkerReply to handlers that ask for it
+            parameters = inspect.signature(func).parameters
+            with_reply = "reply" in parameters or any(
+                map(lambda x: x.kind == inspect.Parameter.VAR_KEYWORD, parameters.values()))
+
+        async def invoke(message: Message, args: tuple, kwargs: dict):
+            # execute wrapped function
+            with tracing.span("handler"):
+                if executor is not None:
+                    return await executor.run(func, message, args, kwargs, with_reply)
+                return await func(*args, **kwargs)
+
+        async def execute(message: Message, args: tuple, kwargs: dict):
+            if timeout is None:
+                return await invoke(message, args, kwargs)
 
-        @functools.wraps(func)
-        async def wrapped(*args, **kwargs):
-            # find function arguments
-            message = find_first(args, Message)
+            try:
+                return await _wait_for(invoke(message, args, kwargs), timeout)
+            except _DeadlineExceeded:
+                command_entry[KEY_TIMEOUT_COUNT] += 1
+                LOGGER.warning("Command /{} timed out after {} seconds in chat {} for user {}".format(
+                    name[0], timeout, message.chat.id, message.from_user.id))
+                with tracing.span("error_handler", event="timeout"):
+                    for handler in error_handlers:
+                        if await handler.on_timeout(message, timeout):
+                            break
 
+        async def process(message: Message, query: CallbackQuery or None, args: tuple, kwargs: dict,
+                          sample: ProfileSample or None):
+            # check permissions, parse arguments and execute wrapped function
             # get bot, chat and message info
             bot = message.bot
-            me = await bot.get_me()
-            bot_username = me.username
             chat_id = message.chat.id
 
             try:
-                if not await _check_permissions(message, permissions):
+                with tracing.span("permissions"):
+                    allowed, checked = await _check_permissions(message, permissions)
+                if not allowed:
                     # permission denied
                     LOGGER.debug("Permission denied in chat {} for user {} for message: {}".format(
                         chat_id, message.from_user.id, message))
 
-                    for handler in error_handlers:
-                        if await handler.on_permission_error(message, permissions):
-                            break
-
-                    # don't process command
-                    return
+                    # a fallback decision must not keep denying once lookups work again
+                    if denial_cache is not None and checked:
+                        await denial_cache.add(message, name[0])
 
-                # parse and check command target
-                cmd, _ = split_command_from_args(message.text)
-                _, target = split_command_from_target(bot_username, cmd)
-                # check if we are allowed to process the given command target
-                if not await filter_command_target(target, bot_username, command_target):
-                    LOGGER.debug("Ignoring command for unspecified target {} in chat {} for user {}: {}".format(
-                        target, chat_id, message.from_user.id, message))
+                    with tracing.span("error_handler", event="permission_error"):
+                        for handler in error_handlers:
+                            if await handler.on_permission_error(message, permissions):
+                                break
 
                     # don't process command
                     return
 
-                try:
-                    # parse command and arguments
-                    cmd, parsed_args = parse_telegram_command(bot_username, message.text, arguments)
-                except ValueError as ex:
-                    # error during argument parsing
-                    logging.exception("Error parsing command arguments")
-
-                    for handler in error_handlers:
-                        if await handler.on_validation_error(message, ex, help_message):
-                            break
+                if query is None:
+                    bot_username = await get_bot_username(bot)
+
+                    # parse and check command target
+                    cmd, _ = split_command_from_args(get_message_text(message))
+                    _, target = split_command_from_target(bot_username, cmd)
+                    # check if we are allowed to process the given command target
+                    if not await filter_command_target(target, bot_username, command_target):
+                        LOGGER.debug("Ignoring command for unspecified target {} in chat {} for user {}: {}".format(
+                            target, chat_id, message.from_user.id, message))
+
+                        # don't process command
+                        return
+
+                error = None
+                with tracing.span("parse") as parse_span:
+                    if query is None:
+                        # parse command and arguments, invalid input is reported without raising
+                        cmd, result = parse_telegram_command_result(bot_username, get_message_text(message),
+                                                                     argument_spec)
+                        parsed_args = result.values
+                        error = result.to_exception()
+                        if error is not None:
+                            parse_span.set_attribute("errors", list(map(lambda x: x.code, result.errors)))
+                    else:
+                        # decode arguments of an inline keyboard button
+                        try:
+                            cmd, parsed_args = decode_callback_data(argument_spec, query.data)
+                        except ValueError as ex:
+                            error = ex
+                if error is None and len(argument_spec.attachments) > 0:
+                    error = _resolve_attachments(message, argument_spec, parsed_args)
+                if error is not None:
+                    # invalid user input is expected, so don't pay for a stack trace
+                    if LOGGER.isEnabledFor(logging.DEBUG):
+                        LOGGER.debug("Invalid command arguments in chat {} for user {}: {}".format(
+                            chat_id, message.from_user.id, error))
+
+                    with tracing.span("error_handler", event="validation_error"):
+                        for handler in error_handlers:
+                            if await handler.on_validation_error(message, error, help_message):
+                                break
 
                     return
 
                 # convert argument names to python param naming convention (snake-case)
                 kw_function_args = dict(
                     map(lambda x: (x[0].lower().replace("-", "_"), x[1]), list(parsed_args.items())))
-                # execute wrapped function
-                return await func(*args, **{**kw_function_args, **kwargs})
+                if sample is not None:
+                    sample.arguments = kw_function_args
+
+                if limiter is None:
+                    return await execute(message, args, {**kw_function_args, **kwargs})
+
+                limiter_key = get_scope_key(limiter.scope, message, name[0])
+                if not await limiter.acquire(limiter_key):
+                    LOGGER.debug("Rejecting command due to concurrency limit in chat {} for user {}: {}".format(
+                        chat_id, message.from_user.id, message))
+                    with tracing.span("error_handler", event="overload"):
+                        for handler in error_handlers:
+                            if await handler.on_overload(message, limiter):
+                                break
+                    return
+                try:
+                    return await execute(message, args, {**kw_function_args, **kwargs})
+                finally:
+                    limiter.release(limiter_key)
             except Exception as ex:
                 # error while executing wrapped function
                 logging.exception("Error in callback")
-                for handler in error_handlers:
-                    if await handler.on_execution_error(message, ex):
-                        break
+                with tracing.span("error_handler", event="execution_error"):
+                    for handler in error_handlers:
+                        if await handler.on_execution_error(message, ex):
+                            break
+
+        async def profile(message: Message, query: CallbackQuery or None, args: tuple, kwargs: dict):
+            # profile a sampled fraction of invocations
+            current_profiler = profiler if profiler is not None else get_profiler()
+            sample = None if current_profiler is None else current_profiler.begin()
+            if sample is None:
+                return await process(message, query, args, kwargs, None)
+
+            try:
+                return await process(message, query, args, kwargs, sample)
+            finally:
+                current_profiler.end(sample, name[0])
+
+        async def dispatch(command_span: tracing.Span, args: tuple, kwargs: dict):
+            # find function arguments
+            message = find_first(args, Message)
+            if message is not None:
+                return await handle(command_span, message, None, args, kwargs)
+
+            # inline keyboard button press
+            query = find_first(args, CallbackQuery)
+            if get_callback_command_name(query.data) not in name:
+                LOGGER.debug("Ignoring callback query of another command: {}".format(query))
+                return
+            try:
+                message = get_callback_query_message(query)
+                if message is None:
+                    LOGGER.debug("Ignoring callback query without accessible message: {}".format(query))
+                    return
+                # the handler receives the message the button is attached to, instead of the query
+                args = tuple(map(lambda x: message if x is query else x, args))
+                return await handle(command_span, message, query, args, kwargs)
+            finally:
+                # stop the loading indicator of the button, no matter how the command ended
+                await _answer_callback_query(query)
+
+        async def handle(command_span: tracing.Span, message: Message, query: CallbackQuery or None, args: tuple,
+                         kwargs: dict):
+            command_span.set_attribute("chat_id", message.chat.id)
+
+            if duplicate_filter is not None and duplicate_filter.is_duplicate(query or message):
+                LOGGER.debug("Ignoring duplicate message in chat {}: {}".format(message.chat.id, message))
+                return
+
+            if denial_cache is not None and await denial_cache.is_denied(message, name[0]):
+                LOGGER.debug("Dropping recently denied command in chat {} for user {}: {}".format(
+                    message.chat.id, message.from_user.id, message))
+                return
+
+            if throttle is not None:
+                throttle_result = await throttle.consume(get_scope_key(throttle.scope, message, name[0]))
+                if not throttle_result.allowed:
+                    LOGGER.debug("Throttling command in chat {} for user {}: {}".format(
+                        message.chat.id, message.from_user.id, message))
+                    with tracing.span("error_handler", event="throttled"):
+                        for handler in error_handlers:
+                            if await handler.on_throttled(message, throttle, throttle_result):
+                                break
+                    return
+
+            if lanes is None:
+                return await profile(message, query, args, kwargs)
+
+            # wait for previous invocations of the same lane
+            lane_key = get_scope_key(lanes.scope, message, name[0])
+            if not await lanes.acquire(lane_key):
+                LOGGER.debug("Rejecting command due to full lane in chat {} for user {}: {}".format(
+                    message.chat.id, message.from_user.id, message))
+                with tracing.span("error_handler", event="overload"):
+                    for handler in error_handlers:
+                        if await handler.on_overload(message, lanes):
+                            break
+                return
+            try:
+                return await profile(message, query, args, kwargs)
+            finally:
+                lanes.release(lane_key)
+
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            with tracing.span("command", command=name[0]) as command_span:
+                return await dispatch(command_span, args, kwargs)
 
+        wrapped.concurrency_limiter = limiter
+        wrapped.lane_scheduler = lanes
+        wrapped.duplicate_filter = duplicate_filter
+        wrapped.denial_cache = denial_cache
         return wrapped
 
     return callback_decorator
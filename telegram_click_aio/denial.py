@@ -0,0 +1,102 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import logging
+import time
+
+from aiogram.types import Message, ChatMemberUpdated
+
+from telegram_click_aio.cache import CacheBackend, LruCache, on_chat_member_updated
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DenialCache:
+    """
+    Remembers denied permission checks for a short time, so repeated attempts of unauthorized users
+    can be rejected right away, without evaluating permissions (and calling the Bot API) again.
+    Denials are keyed by (bot, chat, user, command). All denials of a chat are invalidated
+    when a membership of that chat changes, see on_chat_member_updated().
+    """
+
+    def __init__(self, ttl: float = 30.0, max_keys: int = 100000, cache: CacheBackend = None):
+        """
+        Creates an instance
+        :param ttl: the number of seconds a denial is remembered
+        :param max_keys: the maximum number of denials to remember, if no cache backend is given
+        :param cache: a cache backend to store denials in instead, f.ex. to share them between processes
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+
+        self.ttl = ttl
+        self.cache = cache if cache is not None else LruCache(max_keys)
+        # number of attempts rejected using a remembered denial
+        self.hits = 0
+
+    async def is_denied(self, message: Message, command_name: str) -> bool:
+        """
+        :param message: the command message
+        :param command_name: the name of the command
+        :return: True if the command has recently been denied for the user in the chat
+        """
+        if await self.cache.get_async(await self._key(message, command_name), False):
+            self.hits += 1
+            return True
+        return False
+
+    async def add(self, message: Message, command_name: str):
+        """
+        Remembers a denied permission check
+        :param message: the command message
+        :param command_name: the name of the command
+        """
+        await self.cache.set_async(await self._key(message, command_name), True, self.ttl)
+
+    async def invalidate(self, bot_id: int, chat_id: int):
+        """
+        Forgets all denials of the given chat
+        :param bot_id: bot id
+        :param chat_id: chat id
+        """
+        # entries of older generations are never read again and simply expire.
+        # if the generation itself is evicted, old entries may be found again, but only until they expire
+        await self.cache.set_async(self._generation_key(bot_id, chat_id), time.time_ns())
+
+    async def on_chat_member_updated(self, update: ChatMemberUpdated):
+        """
+        Handler for chat_member updates, register it with your dispatcher to invalidate denials
+        (and update cached member statuses) as soon as a membership changes:
+        dispatcher.chat_member.register(denial_cache.on_chat_member_updated)
+        Note: chat_member updates have to be requested explicitly using allowed_updates.
+        :param update: the update
+        """
+        await on_chat_member_updated(update)
+        await self.invalidate(update.bot.id, update.chat.id)
+
+    async def _key(self, message: Message, command_name: str) -> str:
+        bot_id = message.bot.id
+        chat_id = message.chat.id
+        user_id = message.from_user.id if message.from_user is not None else None
+        generation = await self.cache.get_async(self._generation_key(bot_id, chat_id), 0)
+        return "denied:{}:{}:{}:{}:{}".format(bot_id, chat_id, generation, user_id, command_name)
+
+    @staticmethod
+    def _generation_key(bot_id: int, chat_id: int) -> str:
+        return "denied:{}:{}:generation".format(bot_id, chat_id)
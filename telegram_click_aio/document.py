@@ -0,0 +1,146 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import logging
+import mmap
+import tempfile
+
+from aiogram.types import Document
+
+LOGGER = logging.getLogger(__name__)
+
+# the maximum size of files that can be downloaded using the public Bot API
+DEFAULT_MAX_DOCUMENT_SIZE = 20 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class DocumentTooLargeError(ValueError):
+    """
+    Raised when a document exceeds the size limit of its argument
+    """
+    pass
+
+
+class DocumentStream:
+    """
+    Gives a command handler access to the contents of an attached document,
+    without loading the whole file into memory.
+    The contents can be read only once.
+    """
+
+    def __init__(self, bot, document: Document, max_size: int = DEFAULT_MAX_DOCUMENT_SIZE,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, timeout: int = 30):
+        """
+        Creates an instance
+        :param bot: the bot to download the document with
+        :param document: the attached document
+        :param max_size: the maximum number of bytes to read
+        :param chunk_size: the size of chunks to read
+        :param timeout: download timeout in seconds
+        """
+        self.bot = bot
+        self.file_id = document.file_id
+        self.file_name = document.file_name
+        self.mime_type = document.mime_type
+        # as reported by telegram, may be None
+        self.file_size = document.file_size
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.bytes_read = 0
+        self._consumed = False
+
+        if self.file_size is not None and self.file_size > max_size:
+            raise DocumentTooLargeError("Document '{}' exceeds the size limit of {} bytes".format(
+                self.file_name, max_size))
+
+    def __aiter__(self):
+        return self.iter_chunks()
+
+    async def iter_chunks(self):
+        """
+        Downloads the document chunk by chunk
+        :return: async iterator over byte chunks
+        """
+        if self._consumed:
+            raise RuntimeError("Document '{}' has already been read".format(self.file_name))
+        self._consumed = True
+
+        file = await self.bot.get_file(self.file_id)
+        api = self.bot.session.api
+        if api.is_local:
+            # a local Bot API server stores files on the same machine
+            chunks = _read_local_file(api.wrap_local_file.to_local(file.file_path), self.chunk_size)
+        else:
+            chunks = self.bot.session.stream_content(url=api.file_url(self.bot.token, file.file_path),
+                                                     timeout=self.timeout, chunk_size=self.chunk_size,
+                                                     raise_for_status=True)
+
+        try:
+            async for chunk in chunks:
+                self.bytes_read += len(chunk)
+                if self.bytes_read > self.max_size:
+                    # file_size may be missing or wrong, so the limit is enforced while reading too
+                    raise DocumentTooLargeError("Document '{}' exceeds the size limit of {} bytes".format(
+                        self.file_name, self.max_size))
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def read(self) -> bytes:
+        """
+        Reads the whole document into memory, only use this for small size limits
+        :return: the document contents
+        """
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    async def to_mmap(self) -> mmap.mmap:
+        """
+        Downloads the document into an anonymous temporary file and maps it into memory.
+        The temporary file is removed as soon as the returned mmap is closed.
+        :return: read only memory map of the document contents
+        """
+        with tempfile.TemporaryFile() as f:
+            loop = asyncio.get_running_loop()
+            async for chunk in self.iter_chunks():
+                await loop.run_in_executor(None, f.write, chunk)
+            await loop.run_in_executor(None, f.flush)
+            if self.bytes_read <= 0:
+                raise ValueError("Document '{}' is empty".format(self.file_name))
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+async def _read_local_file(path, chunk_size: int):
+    """
+    Reads a file in chunks without blocking the event loop
+    :param path: the file path
+    :param chunk_size: the size of chunks to read
+    :return: async iterator over byte chunks
+    """
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, open, path, "rb")
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
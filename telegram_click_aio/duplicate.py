@@ -0,0 +1,93 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.types import Message, CallbackQuery
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DuplicateFilter:
+    """
+    Detects messages that are delivered more than once, f.ex. due to webhook retries
+    or a restart while polling. Messages are identified by (chat id, message id, edit date),
+    so edits of a message are still processed. Only messages seen within the given time window
+    are remembered, up to a fixed maximum, so memory usage is constant.
+    """
+
+    def __init__(self, window: float = 300.0, max_size: int = 10000):
+        """
+        Creates an instance
+        :param window: the number of seconds a message is remembered
+        :param max_size: the maximum number of messages to remember
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.window = window
+        self.max_size = max_size
+        # key -> time first seen, in insertion (and therefore time) order
+        self._seen = OrderedDict()
+        self.suppressed = 0
+
+    @staticmethod
+    def get_key(message: Message or CallbackQuery) -> tuple:
+        """
+        :param message: the message (or callback query)
+        :return: the key used to identify the given message
+        """
+        if isinstance(message, CallbackQuery):
+            return message.id,
+        return message.chat.id, message.message_id, message.edit_date
+
+    def is_duplicate(self, message: Message or CallbackQuery, now: float = None) -> bool:
+        """
+        Checks if the given message has been seen before and remembers it otherwise
+        :param message: the message (or callback query) to check
+        :param now: the current time in seconds (monotonic), only useful for testing
+        :return: True if the message is a duplicate, False otherwise
+        """
+        if now is None:
+            now = time.monotonic()
+
+        # forget messages that are older than the window
+        expired = now - self.window
+        while len(self._seen) > 0:
+            oldest_key = next(iter(self._seen))
+            if self._seen[oldest_key] > expired:
+                break
+            del self._seen[oldest_key]
+
+        key = self.get_key(message)
+        if key in self._seen:
+            self.suppressed += 1
+            return True
+
+        self._seen[key] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def __len__(self):
+        return len(self._seen)
@@ -1,7 +1,11 @@
 from aiogram.types import Message
 from aiogram.enums.parse_mode import ParseMode
+from emoji import emojize
 
+from telegram_click_aio.concurrency import ConcurrencyLimiter
+from telegram_click_aio.help import get_help_renderer, RenderedHelp
 from telegram_click_aio.permission.base import Permission
+from telegram_click_aio.throttle import Throttle, ThrottleResult
 from telegram_click_aio.util import send_message
 
 
@@ -41,18 +45,78 @@ class ErrorHandler:
         """
         return False
 
+    async def on_overload(self, message: Message, limiter: ConcurrencyLimiter) -> bool:
+        """
+        This method is called when a command is rejected, because the maximum number
+        of concurrent and queued invocations has been reached
+        :param message: Message
+        :param limiter: the ConcurrencyLimiter that rejected the command
+        :return: true if the error was handled, false otherwise
+        """
+        return False
+
+    async def on_throttled(self, message: Message, throttle: Throttle, result: ThrottleResult) -> bool:
+        """
+        This method is called when a command is dropped, because the user (or chat)
+        exceeded the rate limit of the command. This happens before permissions are checked
+        and arguments are parsed.
+        :param message: Message
+        :param throttle: the Throttle that dropped the command
+        :param result: the result of the throttle check, use "first_in_window" to only answer once
+        :return: true if the error was handled, false otherwise
+        """
+        return False
+
+    async def on_timeout(self, message: Message, timeout: float) -> bool:
+        """
+        This method is called when the execution of a command has been cancelled,
+        because it did not finish within its timeout
+        :param message: Message
+        :param timeout: the timeout of the command in seconds
+        :return: true if the error was handled, false otherwise
+        """
+        return False
+
 
 class DefaultErrorHandler(ErrorHandler):
     DEFAULT_PERMISSION_DENIED_MESSAGE = ":stop_sign: You do not have permission to use this command."
+    DEFAULT_EXECUTION_ERROR_MESSAGE = ":boom: There was an error executing your command :worried:"
+    DEFAULT_OVERLOAD_MESSAGE = ":hourglass: This command is busy right now, please try again later."
+    DEFAULT_THROTTLED_MESSAGE = ":snail: You are sending commands too fast, please wait {} seconds."
+    DEFAULT_TIMEOUT_MESSAGE = ":alarm_clock: Your command took too long and has been cancelled."
 
-    def __init__(self, silent_denial: bool = True, print_error: bool = False):
+    def __init__(self, silent_denial: bool = True, print_error: bool = False, silent_throttle: bool = False,
+                 parse_mode: str or None = ParseMode.MARKDOWN):
         """
         Creates an instance
         :param silent_denial: Whether to silently ignore commands from users without permission
         :param print_error: Whether to print a stacktrace on execution errors
+        :param silent_throttle: Whether to silently ignore throttled commands,
+                                otherwise only the first throttled command of a rate limit window is answered
+        :param parse_mode: the telegram parse mode to send messages with, None for plain text
         """
         self.silent_denial = silent_denial
         self.print_error = print_error
+        self.silent_throttle = silent_throttle
+        self.parse_mode = parse_mode
+
+        self._renderer = get_help_renderer(parse_mode)
+        # static texts are escaped only once
+        self._permission_denied_text = self._escape(self.DEFAULT_PERMISSION_DENIED_MESSAGE)
+        self._execution_error_text = self._escape(self.DEFAULT_EXECUTION_ERROR_MESSAGE)
+        self._overload_text = self._escape(self.DEFAULT_OVERLOAD_MESSAGE)
+        self._timeout_text = self._escape(self.DEFAULT_TIMEOUT_MESSAGE)
+        self._validation_error_prefix = self._escape(":exclamation: ")
+        self._execution_error_prefix = self._escape(":boom: ")
+
+    def _escape(self, text: str) -> str:
+        """
+        Escapes text (which may contain emoji aliases) for the configured parse mode
+        :param text: the original text
+        :return: the escaped text
+        """
+        # emoji aliases must be replaced before escaping, since they may contain special characters
+        return self._renderer.escape(emojize(text, language='alias'))
 
     async def on_permission_error(self, message: Message, permissions: Permission) -> bool:
         bot = message.bot
@@ -60,9 +124,8 @@ class DefaultErrorHandler(ErrorHandler):
 
         if not self.silent_denial:
             # send 'permission denied' message
-            text = self.DEFAULT_PERMISSION_DENIED_MESSAGE
-            await send_message(bot, chat_id=chat_id, message=text,
-                               parse_mode=ParseMode.MARKDOWN,
+            await send_message(bot, chat_id=chat_id, message=self._permission_denied_text,
+                               parse_mode=self.parse_mode,
                                reply_to=message.message_id)
 
         return True
@@ -72,14 +135,17 @@ class DefaultErrorHandler(ErrorHandler):
         bot = message.bot
         chat_id = message.chat.id
 
+        if isinstance(help_message, RenderedHelp):
+            help_message = help_message.for_parse_mode(self.parse_mode)
+
         denied_text = "\n".join([
-            ":exclamation: `{}`".format(str(exception)),
+            self._validation_error_prefix + self._renderer.code(str(exception)),
             "",
             help_message
         ])
         await send_message(bot, chat_id=chat_id,
                            message=denied_text,
-                           parse_mode=ParseMode.MARKDOWN,
+                           parse_mode=self.parse_mode,
                            reply_to=message.message_id)
         return True
 
@@ -91,12 +157,44 @@ class DefaultErrorHandler(ErrorHandler):
             import traceback
             exception_text = "\n".join(list(map(lambda x: "{}:{}\n\t{}".format(x.filename, x.lineno, x.line),
                                                 traceback.extract_tb(exception.__traceback__))))
-            denied_text = ":boom: `{}`".format(exception_text)
+            denied_text = self._execution_error_prefix + self._renderer.code(exception_text)
         else:
-            denied_text = ":boom: There was an error executing your command :worried:"
+            denied_text = self._execution_error_text
         await send_message(bot, chat_id=chat_id,
                            message=denied_text,
-                           parse_mode=ParseMode.MARKDOWN,
+                           parse_mode=self.parse_mode,
+                           reply_to=message.message_id)
+        return True
+
+    async def on_overload(self, message: Message, limiter: ConcurrencyLimiter) -> bool:
+        bot = message.bot
+        chat_id = message.chat.id
+
+        await send_message(bot, chat_id=chat_id,
+                           message=self._overload_text,
+                           parse_mode=self.parse_mode,
+                           reply_to=message.message_id)
+        return True
+
+    async def on_throttled(self, message: Message, throttle: Throttle, result: ThrottleResult) -> bool:
+        bot = message.bot
+        chat_id = message.chat.id
+
+        if not self.silent_throttle and result.first_in_window:
+            text = self._escape(self.DEFAULT_THROTTLED_MESSAGE.format(max(1, round(result.retry_after))))
+            await send_message(bot, chat_id=chat_id, message=text,
+                               parse_mode=self.parse_mode,
+                               reply_to=message.message_id)
+
+        return True
+
+    async def on_timeout(self, message: Message, timeout: float) -> bool:
+        bot = message.bot
+        chat_id = message.chat.id
+
+        await send_message(bot, chat_id=chat_id,
+                           message=self._timeout_text,
+                           parse_mode=self.parse_mode,
                            reply_to=message.message_id)
         return True
 
@@ -0,0 +1,246 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import functools
+import importlib
+import logging
+import threading
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+from aiogram.types import Message, TelegramObject
+
+from telegram_click_aio.util import send_message
+
+LOGGER = logging.getLogger(__name__)
+
+# synchronous handler functions that may be run by a CommandExecutor, by "module:qualname"
+# this allows worker processes to look up a handler, even though its module level name
+# is occupied by the async wrapper created by the @command decorator
+SYNC_HANDLERS = {}
+
+# CommandExecutor instances created for plain concurrent.futures executors
+_EXECUTOR_WRAPPERS = weakref.WeakKeyDictionary()
+
+
+class WorkerReply:
+    """
+    Allows a command handler running inside of an executor to send messages to the chat
+    the command was issued in.
+
+    When running in a thread, messages are sent immediately using the event loop of the bot.
+    When running in a separate process, messages are collected and sent in order
+    as soon as the handler has finished.
+    """
+
+    def __init__(self, message: Message, loop: asyncio.AbstractEventLoop or None = None):
+        """
+        Creates an instance
+        :param message: the message that triggered the command
+        :param loop: the event loop of the bot, None if replies should be buffered
+        """
+        self.chat_id = message.chat.id
+        self.message_id = message.message_id
+        self.outbox = []
+        self._bot = message.bot
+        self._loop = loop
+
+    def __getstate__(self):
+        # neither the bot nor the event loop can be passed to another process
+        state = dict(self.__dict__)
+        state["_bot"] = None
+        state["_loop"] = None
+        return state
+
+    def send(self, text: str, parse_mode: str = None, reply: bool = True):
+        """
+        Sends a text message to the chat of the command message
+        :param text: the message to send (may contain emoji aliases)
+        :param parse_mode: specify whether to parse the text as markdown or HTML
+        :param reply: whether to reply to the command message
+        """
+        reply_to = self.message_id if reply else None
+        if self._loop is None:
+            self.outbox.append((text, parse_mode, reply_to))
+            return
+
+        future = asyncio.run_coroutine_threadsafe(
+            send_message(self._bot, chat_id=self.chat_id, message=text, parse_mode=parse_mode, reply_to=reply_to),
+            self._loop)
+        future.result()
+
+    async def flush(self, bot):
+        """
+        Sends all buffered messages
+        :param bot: the bot to send the messages with
+        """
+        outbox, self.outbox = self.outbox, []
+        for text, parse_mode, reply_to in outbox:
+            await send_message(bot, chat_id=self.chat_id, message=text, parse_mode=parse_mode, reply_to=reply_to)
+
+
+class CommandExecutor:
+    """
+    Runs synchronous command handlers on a concurrent.futures executor,
+    keeping the event loop free for other chats.
+    """
+
+    def __init__(self, executor: Executor = None, max_workers: int = None):
+        """
+        Creates an instance
+        :param executor: the executor to use, defaults to a new ThreadPoolExecutor
+        :param max_workers: the maximum number of workers when no executor is given
+        """
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="telegram-click")
+        self.executor = executor
+        self.max_workers = getattr(executor, "_max_workers", max_workers) or 1
+        self.is_process_pool = isinstance(executor, ProcessPoolExecutor)
+        # number of submitted handler calls that have not yet finished
+        self.pending = 0
+        # pending is decremented by the worker threads of the executor
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> int:
+        """
+        :return: the number of handler calls currently occupying a worker
+        """
+        return min(self.pending, self.max_workers)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        :return: the number of handler calls waiting for a free worker
+        """
+        return max(0, self.pending - self.max_workers)
+
+    async def run(self, func: callable, message: Message, args: tuple, kwargs: dict, with_reply: bool = False) -> any:
+        """
+        Runs a synchronous command handler on the executor
+        :param func: the (registered) synchronous handler
+        :param message: the message that triggered the command
+        :param args: positional handler arguments
+        :param kwargs: keyword handler arguments
+        :param with_reply: whether to pass a WorkerReply as the "reply" keyword argument
+        :return: the result of the handler
+        """
+        loop = asyncio.get_running_loop()
+
+        reply = None
+        if with_reply:
+            reply = WorkerReply(message, loop=None if self.is_process_pool else loop)
+
+        if self.is_process_pool:
+            # the bot instance is bound to this process and can not be pickled
+            args = tuple(map(_detach, args))
+            call = functools.partial(_run_registered, _handler_key(func), args, kwargs, reply)
+        else:
+            call = functools.partial(_run, func, args, kwargs, reply)
+
+        with self._lock:
+            self.pending += 1
+        future = self.executor.submit(call)
+        # a handler keeps occupying its worker when the awaiting command is cancelled (f.ex. by a timeout),
+        # so only count it as finished once the executor is done with it
+        future.add_done_callback(self._on_done)
+        result, outbox = await asyncio.wrap_future(future, loop=loop)
+
+        if reply is not None and len(outbox) > 0:
+            reply.outbox = outbox
+            await reply.flush(message.bot)
+
+        return result
+
+    def _on_done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shuts down the underlying executor
+        :param wait: whether to wait for running handlers to finish
+        """
+        self.executor.shutdown(wait=wait)
+
+
+def get_command_executor(executor: Executor or CommandExecutor) -> CommandExecutor:
+    """
+    Returns the CommandExecutor for the given executor, creating one if necessary.
+    Passing the same executor multiple times results in the same CommandExecutor,
+    so its queue depth covers all commands using it.
+    :param executor: a concurrent.futures executor or a CommandExecutor
+    :return: CommandExecutor
+    """
+    if isinstance(executor, CommandExecutor):
+        return executor
+
+    result = _EXECUTOR_WRAPPERS.get(executor, None)
+    if result is None:
+        result = CommandExecutor(executor)
+        _EXECUTOR_WRAPPERS[executor] = result
+    return result
+
+
+def register_sync_handler(func: callable):
+    """
+    Registers a synchronous handler, so it can be found by worker processes
+    :param func: the handler function
+    """
+    SYNC_HANDLERS[_handler_key(func)] = func
+
+
+def _detach(value: any) -> any:
+    """
+    Creates a copy of a telegram object (and all of its nested objects) that is not bound to a bot
+    :param value: any value
+    :return: the detached copy for telegram objects, the value itself otherwise
+    """
+    if isinstance(value, TelegramObject):
+        return type(value).model_validate(value.model_dump())
+    return value
+
+
+def _handler_key(func: callable) -> str:
+    return "{}:{}".format(func.__module__, func.__qualname__)
+
+
+def _run(func: callable, args: tuple, kwargs: dict, reply: WorkerReply or None) -> (any, list):
+    """
+    Executes a handler inside of a worker
+    :return: (handler result, buffered messages)
+    """
+    if reply is not None:
+        kwargs = {**kwargs, "reply": reply}
+    result = func(*args, **kwargs)
+    return result, [] if reply is None else reply.outbox
+
+
+def _run_registered(key: str, args: tuple, kwargs: dict, reply: WorkerReply or None) -> (any, list):
+    """
+    Executes a registered handler inside of a worker process
+    :return: (handler result, buffered messages)
+    """
+    func = SYNC_HANDLERS.get(key, None)
+    if func is None:
+        # importing the module runs the @command decorator, which registers the handler
+        importlib.import_module(key.split(":", 1)[0])
+        func = SYNC_HANDLERS[key]
+    return _run(func, args, kwargs, reply)
@@ -17,54 +17,302 @@
 #  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
+import html
+from types import MappingProxyType
 from typing import List
 
+from aiogram.enums.parse_mode import ParseMode
+
 from telegram_click_aio.argument import Argument
 from telegram_click_aio.const import ARG_NAMING_PREFIXES
 from telegram_click_aio.util import escape_for_markdown
 
 
-async def generate_help_message(names: [str], description: str, args: List[Argument]) -> str:
+class HelpRenderer:
     """
-    Generates a command usage description
-    :param names: names of the command
-    :param description: command description
-    :param args: command argument list
-    :return: help message
+    Renders command help messages for a specific telegram parse mode.
+    Extend this class and register an instance using register_help_renderer()
+    to support additional formats.
+    """
+    # the telegram parse mode of rendered text
+    parse_mode = None
+
+    # hints appended to the synopsis
+    FLAGS_HINT = "[FLAGS]"
+    ARGS_HINT = "[ARGS]"
+
+    def escape(self, text: str or None) -> str:
+        """
+        Escapes text to use as plain text
+        :param text: the original text
+        :return: the escaped text
+        """
+        return str(text)
+
+    def code(self, text: str) -> str:
+        """
+        Formats (unescaped) text as inline code
+        :param text: the original text
+        :return: formatted text
+        """
+        return str(text)
+
+    def render_help(self, names: [str], description: str, args: List[Argument]) -> str:
+        """
+        Renders a command usage description
+        :param names: names of the command
+        :param description: command description
+        :param args: command argument list
+        :return: help message
+        """
+        flags = list(filter(lambda x: x.flag, args))
+        flags = sorted(flags, key=lambda x: x.name)
+        arguments = list(filter(lambda x: not x.flag, args))
+
+        lines = [
+            self.render_synopsis(names, args),
+            "  " + self.render_description(description)
+        ]
+        if len(flags) > 0:
+            lines.extend([
+                "Flags:",
+                self.render_arguments(flags)
+            ])
+
+        if len(arguments) > 0:
+            lines.extend([
+                "Arguments:",
+                self.render_arguments(arguments)
+            ])
+
+        if len(arguments) > 0 or len(flags) > 0:
+            lines.extend([
+                "Example:",
+                "  " + self.render_example(names, arguments, flags)
+            ])
+
+        return "\n".join(lines)
+
+    def render_synopsis(self, names: [str], args: List[Argument]) -> str:
+        """
+        Renders the synopsis for a command
+        :param names: command names
+        :param args: arguments
+        :return: synopsis
+        """
+        command_names = list(map(lambda x: "/{}".format(self.escape(x)), names))
+        synopsis = command_names[0]
+        # append command name aliases in round brackets
+        if len(command_names) > 1:
+            synopsis += " {}".format(self.escape("(")) + ", ".join(command_names[1:]) + self.escape(")")
+        # add hints about flags and arguments
+        if len(args) > 0:
+            if any(map(lambda x: x.flag, args)):
+                synopsis += " " + self.escape(self.FLAGS_HINT)
+            if any(map(lambda x: not x.flag, args)):
+                synopsis += " " + self.escape(self.ARGS_HINT)
+
+        return synopsis
+
+    def render_description(self, description: str) -> str:
+        """
+        Renders the description of a command
+        :param description: the command description
+        :return: rendered description
+        """
+        return self.escape(description)
+
+    def render_arguments(self, args: List[Argument]) -> str:
+        """
+        Renders the description of all given arguments
+        :param args: arguments
+        :return: description
+        """
+        return "\n".join(map(self.render_argument, args))
+
+    def render_argument(self, arg: Argument) -> str:
+        """
+        Renders the usage text for an argument
+        :param arg: the argument
+        :return: usage text line
+        """
+        arg_prefix = next(iter(ARG_NAMING_PREFIXES))
+        arg_names = list(map(lambda x: self.code("{}{}".format(arg_prefix, x)), arg.names))
+
+        message = "  " + ", ".join(arg_names)
+        if not arg.flag:
+            message += "\t\t" + self.code(self.render_type(arg))
+        message += "\t\t" + self.escape(arg.description)
+
+        if arg.optional and not arg.flag:
+            message += "\t" + self.escape("(") + self.render_default(arg.default) + self.escape(")")
+        return message
+
+    def render_type(self, arg: Argument) -> str:
+        """
+        Renders the (unescaped) type of an argument value
+        :param arg: the argument
+        :return: f.ex. "INT", "INT..." for any number of values or "INT[2]" for a fixed number of values
+        """
+        name = arg.type_name
+        if arg.nargs is None:
+            return name
+        if arg.max_values is not None:
+            return "{}[{}]".format(name, arg.max_values)
+        return name + "..."
+
+    def render_default(self, default: any) -> str:
+        """
+        Renders the default value of an argument
+        :param default: the default value
+        :return: rendered value
+        """
+        return self.code(str(default))
+
+    def render_example(self, names: List[str], arguments: List[Argument], flags: List[Argument]) -> str:
+        """
+        Renders an example call of a command
+        :param names: possible command names
+        :param arguments: command arguments (without flags)
+        :param flags: command flags
+        :return: example call
+        """
+        arg_prefix = next(iter(ARG_NAMING_PREFIXES))
+        # attachments can't be part of the command text
+        argument_examples = list(map(lambda x: "{}".format(x.example), filter(lambda x: not x.attachment, arguments)))
+        flag_examples = list(map(lambda x: "{}{}".format(arg_prefix, x.name), flags))
+        return self.code("/{} {}".format(names[0], " ".join(flag_examples + argument_examples)).strip())
+
+
+class PlainTextRenderer(HelpRenderer):
+    """
+    Renders help messages as plain text
+    """
+    parse_mode = None
+
+
+class MarkdownRenderer(HelpRenderer):
+    """
+    Renders help messages using the legacy telegram Markdown syntax
+    """
+    parse_mode = ParseMode.MARKDOWN
+
+    FLAGS_HINT = "[[FLAGS]]"
+    ARGS_HINT = "[[ARGS]]"
+
+    def escape(self, text: str or None) -> str:
+        return escape_for_markdown(text)
+
+    def code(self, text: str) -> str:
+        return "`{}`".format(text)
+
+    def render_description(self, description: str) -> str:
+        # the command description may contain markdown
+        return description
+
+    def render_default(self, default: any) -> str:
+        return self.code(escape_for_markdown(default))
+
+
+class MarkdownV2Renderer(HelpRenderer):
+    """
+    Renders help messages using the telegram MarkdownV2 syntax
     """
-    synopsis = await generate_synopsis(names, args)
+    parse_mode = ParseMode.MARKDOWN_V2
 
-    flags = list(filter(lambda x: x.flag, args))
-    flags = sorted(flags, key=lambda x: x.name)
-    arguments = list(filter(lambda x: not x.flag, args))
+    SPECIAL_CHARS = "\\_*[]()~`>#+-=|{}.!"
 
-    flags_description = await generate_arguments_description(flags)
-    arguments_description = await generate_arguments_description(arguments)
+    def escape(self, text: str or None) -> str:
+        return "".join(map(lambda x: "\\" + x if x in self.SPECIAL_CHARS else x, str(text)))
 
-    lines = [
-        synopsis,
-        "  " + description
-    ]
-    if len(flags) > 0:
-        lines.extend([
-            "Flags:",
-            flags_description
-        ])
+    def code(self, text: str) -> str:
+        return "`{}`".format(str(text).replace("\\", "\\\\").replace("`", "\\`"))
 
-    if len(arguments) > 0:
-        lines.extend([
-            "Arguments:",
-            arguments_description
-        ])
 
-    if len(arguments) > 0 or len(flags) > 0:
-        example = await generate_command_example(names, arguments, flags)
-        lines.extend([
-            "Example:",
-            "  " + example
-        ])
+class HtmlRenderer(HelpRenderer):
+    """
+    Renders help messages using the telegram HTML syntax
+    """
+    parse_mode = ParseMode.HTML
+
+    def escape(self, text: str or None) -> str:
+        return html.escape(str(text), quote=False)
+
+    def code(self, text: str) -> str:
+        return "<code>{}</code>".format(self.escape(text))
+
+
+# parse mode -> renderer, all commands are rendered using each of these when registered
+HELP_RENDERERS = {}
+
+
+def register_help_renderer(renderer: HelpRenderer):
+    """
+    Registers a renderer for its parse mode.
+    Note: Only commands registered after this call are rendered using the given renderer.
+    :param renderer: the renderer
+    """
+    HELP_RENDERERS[renderer.parse_mode] = renderer
+
+
+def get_help_renderer(parse_mode: str or None) -> HelpRenderer:
+    """
+    :param parse_mode: telegram parse mode, None for plain text
+    :return: the renderer for the given parse mode
+    """
+    renderer = HELP_RENDERERS.get(parse_mode, None)
+    if renderer is None:
+        raise ValueError("No help renderer registered for parse mode: {}".format(parse_mode))
+    return renderer
+
+
+for _renderer in [PlainTextRenderer(), MarkdownRenderer(), MarkdownV2Renderer(), HtmlRenderer()]:
+    register_help_renderer(_renderer)
+
+
+class RenderedHelp(str):
+    """
+    A help message, rendered once for every registered parse mode.
+    The str value of this object is the (legacy) Markdown rendering.
+    """
+
+    def __new__(cls, renderings: dict):
+        obj = super().__new__(cls, renderings[ParseMode.MARKDOWN])
+        obj._renderings = MappingProxyType(dict(renderings))
+        return obj
 
-    return "\n".join(lines)
+    def for_parse_mode(self, parse_mode: str or None) -> str:
+        """
+        :param parse_mode: telegram parse mode, None for plain text
+        :return: the help message rendered for the given parse mode
+        """
+        text = self._renderings.get(parse_mode, None)
+        if text is None:
+            raise ValueError("Help message has not been rendered for parse mode: {}".format(parse_mode))
+        return text
+
+
+def render_help_message(names: [str], description: str, args: List[Argument]) -> RenderedHelp:
+    """
+    Renders a command usage description using all registered renderers
+    :param names: names of the command
+    :param description: command description
+    :param args: command argument list
+    :return: help message
+    """
+    return RenderedHelp(dict(map(lambda x: (x.parse_mode, x.render_help(names, description, args)),
+                                 HELP_RENDERERS.values())))
+
+
+async def generate_help_message(names: [str], description: str, args: List[Argument]) -> str:
+    """
+    Generates a command usage description
+    :param names: names of the command
+    :param description: command description
+    :param args: command argument list
+    :return: help message
+    """
+    return HELP_RENDERERS[ParseMode.MARKDOWN].render_help(names, description, args)
 
 
 async def generate_synopsis(names: [str], args: List[Argument]) -> str:
@@ -74,19 +322,7 @@ async def generate_synopsis(names: [str], args: List[Argument]) -> str:
     :param args: arguments
     :return:
     """
-    command_names = list(map(lambda x: "/{}".format(escape_for_markdown(x)), names))
-    synopsis = command_names[0]
-    # append command name aliases in round brackets
-    if len(command_names) > 1:
-        synopsis += " ({})".format(", ".join(command_names[1:]))
-    # add hints about flags and arguments
-    if len(args) > 0:
-        if any(map(lambda x: x.flag, args)):
-            synopsis += " [[FLAGS]]"
-        if any(map(lambda x: not x.flag, args)):
-            synopsis += " [[ARGS]]"
-
-    return synopsis
+    return HELP_RENDERERS[ParseMode.MARKDOWN].render_synopsis(names, args)
 
 
 async def generate_arguments_description(args: List[Argument]) -> str:
@@ -95,8 +331,7 @@ async def generate_arguments_description(args: List[Argument]) -> str:
     :param args: arguments
     :return: description
     """
-    argument_lines = [await generate_argument_description(x) for x in args]
-    return "\n".join(argument_lines)
+    return HELP_RENDERERS[ParseMode.MARKDOWN].render_arguments(args)
 
 
 async def generate_argument_description(arg: Argument) -> str:
@@ -105,17 +340,7 @@ async def generate_argument_description(arg: Argument) -> str:
     :param arg: the argument
     :return: usage text line
     """
-    arg_prefix = next(iter(ARG_NAMING_PREFIXES))
-    arg_names = list(map(lambda x: "`{}{}`".format(arg_prefix, x), arg.names))
-
-    message = "  " + ", ".join(arg_names)
-    if not arg.flag:
-        message += "\t\t`{}`".format(arg.type.__name__.upper())
-    message += "\t\t" + escape_for_markdown(arg.description)
-
-    if arg.optional and not arg.flag:
-        message += "\t(`{}`)".format(escape_for_markdown(arg.default))
-    return message
+    return HELP_RENDERERS[ParseMode.MARKDOWN].render_argument(arg)
 
 
 async def generate_command_example(names: List[str], arguments: List[Argument], flags: List[Argument]) -> str:
@@ -126,7 +351,4 @@ async def generate_command_example(names: List[str], arguments: List[Argument],
     :param flags: command flags
     :return: example call
     """
-    arg_prefix = next(iter(ARG_NAMING_PREFIXES))
-    argument_examples = list(map(lambda x: "{}".format(x.example), arguments))
-    flag_examples = list(map(lambda x: "{}{}".format(arg_prefix, x.name), flags))
-    return "`/{} {}`".format(names[0], " ".join(flag_examples + argument_examples)).strip()
+    return HELP_RENDERERS[ParseMode.MARKDOWN].render_example(names, arguments, flags)
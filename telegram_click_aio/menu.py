@@ -0,0 +1,166 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+
+from aiogram import Bot
+from aiogram.types import BotCommand, BotCommandScope, BotCommandScopeDefault, BotCommandScopeAllPrivateChats, \
+    BotCommandScopeAllGroupChats, BotCommandScopeAllChatAdministrators
+
+from telegram_click_aio.const import KEY_NAMES, KEY_DESCRIPTION, KEY_PERMISSIONS, KEY_HIDDEN
+from telegram_click_aio.permission import PRIVATE_CHAT, GROUP_CHAT, NORMAL_GROUP_CHAT, SUPER_GROUP_CHAT, \
+    GROUP_ADMIN, GROUP_CREATOR, ANYBODY
+
+LOGGER = logging.getLogger(__name__)
+
+# commands accepted by the telegram command menu
+BOT_COMMAND_PATTERN = re.compile(r"^[a-z0-9_]{1,32}$")
+MAX_BOT_COMMAND_DESCRIPTION_LENGTH = 256
+
+# scope key -> payload hash, used when no state file is given
+_MENU_STATE = {}
+
+
+def commands_with_permissions(*permissions) -> callable:
+    """
+    Creates a filter for commands that are not hidden and either require no permission
+    or exactly one of the given permission objects
+    :param permissions: the accepted permission objects
+    :return: filter function
+    """
+
+    def command_filter(command: dict) -> bool:
+        # callables are evaluated per message, so they can not be used for the menu
+        if command[KEY_HIDDEN] is True or callable(command[KEY_HIDDEN]):
+            return False
+        permission = command[KEY_PERMISSIONS]
+        return permission is None or permission is ANYBODY or any(map(lambda x: permission is x, permissions))
+
+    return command_filter
+
+
+# scope -> filter of commands to show in the menu of this scope
+DEFAULT_MENU_SCOPES = {
+    BotCommandScopeDefault(): commands_with_permissions(),
+    BotCommandScopeAllPrivateChats(): commands_with_permissions(PRIVATE_CHAT),
+    BotCommandScopeAllGroupChats(): commands_with_permissions(GROUP_CHAT, NORMAL_GROUP_CHAT, SUPER_GROUP_CHAT),
+    BotCommandScopeAllChatAdministrators(): commands_with_permissions(
+        GROUP_CHAT, NORMAL_GROUP_CHAT, SUPER_GROUP_CHAT, GROUP_ADMIN, GROUP_CREATOR),
+}
+
+
+def generate_bot_commands(commands: list, command_filter: callable) -> [BotCommand]:
+    """
+    Generates the command menu entries for the given commands
+    :param commands: registered commands
+    :param command_filter: function deciding which commands to include
+    :return: list of menu entries, sorted by name
+    """
+    result = []
+    for command in filter(command_filter, commands):
+        name = command[KEY_NAMES][0]
+        if BOT_COMMAND_PATTERN.match(name) is None:
+            LOGGER.debug("Command name is not supported by the telegram command menu: {}".format(name))
+            continue
+        description = (command[KEY_DESCRIPTION] or name).strip()[:MAX_BOT_COMMAND_DESCRIPTION_LENGTH]
+        result.append(BotCommand(command=name, description=description))
+    return sorted(result, key=lambda x: x.command)
+
+
+async def sync_command_menu(bot: Bot, scopes: dict = None, language_code: str = None,
+                            state_file: str = None, registry=None) -> [BotCommandScope]:
+    """
+    Updates the telegram command menu of the bot, based on all registered commands.
+    A hash of the menu of each scope is remembered and the telegram API is only called
+    for scopes whose menu has changed since the last sync.
+    :param bot: the bot
+    :param scopes: map of (scope -> command filter), defaults to DEFAULT_MENU_SCOPES
+    :param language_code: the language code of the menu
+    :param state_file: path of a file to remember menu hashes across restarts, if None hashes are kept in memory
+    :param registry: the CommandRegistry of the bot, defaults to DEFAULT_REGISTRY
+    :return: the scopes that have been updated
+    """
+    from telegram_click_aio.registry import get_registry
+
+    registry = get_registry(registry)
+
+    if scopes is None:
+        scopes = DEFAULT_MENU_SCOPES
+
+    state = _read_menu_state(state_file)
+
+    updated = []
+    for scope, command_filter in scopes.items():
+        bot_commands = generate_bot_commands(registry.commands, command_filter)
+
+        scope_data = scope.model_dump(mode="json", exclude_none=True)
+        key = json.dumps([bot.id, scope_data, language_code], sort_keys=True)
+        payload = json.dumps([key, list(map(lambda x: [x.command, x.description], bot_commands))], sort_keys=True)
+        payload_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+        if state.get(key, None) == payload_hash:
+            continue
+
+        if len(bot_commands) > 0:
+            await bot.set_my_commands(commands=bot_commands, scope=scope, language_code=language_code)
+        else:
+            await bot.delete_my_commands(scope=scope, language_code=language_code)
+        LOGGER.debug("Updated command menu for scope {}".format(scope_data))
+
+        state[key] = payload_hash
+        updated.append(scope)
+
+    if len(updated) > 0:
+        _write_menu_state(state_file, state)
+
+    return updated
+
+
+def _read_menu_state(state_file: str or None) -> dict:
+    if state_file is None:
+        return dict(_MENU_STATE)
+
+    try:
+        with open(state_file, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_menu_state(state_file: str or None, state: dict):
+    if state_file is None:
+        _MENU_STATE.clear()
+        _MENU_STATE.update(state)
+        return
+
+    # replace the file atomically, so concurrent restarts never read a partial file
+    directory = os.path.dirname(os.path.abspath(state_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".menu-state-")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(state, file, sort_keys=True)
+        os.replace(tmp_path, state_file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
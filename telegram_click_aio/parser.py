@@ -21,31 +21,229 @@ import logging
 from collections import OrderedDict
 from typing import List
 
+from telegram_click_aio import tracing
 from telegram_click_aio.argument import Argument
 from telegram_click_aio.const import *
 
 LOGGER = logging.getLogger(__name__)
 
 
-def parse_command_args(arguments: str or None, expected_args: List[Argument]) -> dict:
+class ArgumentSpec:
+    """
+    Lookup structures for the arguments of a command, compiled once when the command is registered
+    """
+
+    def __init__(self, arguments: List[Argument]):
+        """
+        Compiles the given arguments
+        :param arguments: the arguments of a command
+        """
+        # arguments given in the command text
+        self.arguments = tuple(filter(lambda x: not x.attachment, arguments))
+        # arguments resolved from attachments of the command message
+        self.attachments = tuple(filter(lambda x: x.attachment, arguments))
+
+        # map argument.name -> argument
+        self.name_map = OrderedDict()
+        for argument in self.arguments:
+            for name in argument.names:
+                self.name_map[name] = argument
+
+        # map prefix of a long argument name -> arguments with a long name starting with it
+        prefix_map = {}
+        for argument in self.arguments:
+            for name in filter(lambda x: len(x) > 1, argument.names):
+                for end in range(1, len(name)):
+                    candidates = prefix_map.setdefault(name[:end], [])
+                    if argument not in candidates:
+                        candidates.append(argument)
+        self.prefix_map = dict(map(lambda x: (x[0], tuple(x[1])), prefix_map.items()))
+
+    def resolve_prefix(self, arg_key: str, prefix: str) -> (Argument or None, str or None):
+        """
+        Finds the argument whose long name starts with the given prefix
+        :param arg_key: the argument key as given by the user (used for error messages)
+        :param prefix: the argument name prefix
+        :return: a tuple of the argument (None if no long name, or more than one, starts with the prefix)
+                 and an error message if the prefix is ambiguous
+        """
+        candidates = self.prefix_map.get(prefix, ())
+        if len(candidates) > 1:
+            # use the same naming prefix as the user
+            arg_prefix = next(filter(lambda x: arg_key.startswith(x), LONG_ARG_KEY_PREFIXES), "")
+            names = map(lambda x: arg_prefix + next(filter(lambda y: y.startswith(prefix), x.names)), candidates)
+            return None, "Ambiguous argument '{}', could be: {}".format(arg_key, ", ".join(names))
+        if len(candidates) == 1:
+            return candidates[0], None
+        return None, None
+
+
+class ParseErrorCode:
+    """
+    Kinds of errors found while parsing command arguments
+    """
+    # a quote has not been closed
+    UNCLOSED_QUOTE = "unclosed_quote"
+    # an argument key does not match any argument
+    UNKNOWN_ARGUMENT = "unknown_argument"
+    # an argument key is a prefix of multiple arguments
+    AMBIGUOUS_ARGUMENT = "ambiguous_argument"
+    # a value has been given for a flag
+    UNEXPECTED_FLAG_VALUE = "unexpected_flag_value"
+    # an argument key is not followed by a value
+    MISSING_VALUE = "missing_value"
+    # a value could not be converted, or was rejected by the validator
+    INVALID_VALUE = "invalid_value"
+    # a required argument has not been given
+    MISSING_ARGUMENT = "missing_argument"
+
+
+class ParseError:
+    """
+    A single error found while parsing command arguments
+    """
+    __slots__ = ["code", "message", "argument", "span"]
+
+    def __init__(self, code: str, message: str, argument: str = None, span: (int, int) = None):
+        """
+        :param code: the kind of error, one of ParseErrorCode
+        :param message: a human readable description
+        :param argument: the name of the affected argument, if known
+        :param span: (start, end) indexes of the offending part of the parsed text, None if it is missing entirely
+        """
+        self.code = code
+        self.message = message
+        self.argument = argument
+        self.span = span
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return "<ParseError {} {} {}>".format(self.code, self.argument, self.span)
+
+
+class ArgumentParseError(ValueError):
+    """
+    Describes invalid command arguments, holding all errors that have been found
+    """
+
+    def __init__(self, errors: [ParseError]):
+        super().__init__(str(errors[0]))
+        self.errors = errors
+
+
+class ParseResult:
+    """
+    The outcome of parsing command arguments, errors are collected instead of being raised
+    """
+    __slots__ = ["values", "errors"]
+
+    def __init__(self, values: dict = None, errors: [ParseError] = None):
+        """
+        :param values: dictionary { argument-name -> value } of successfully parsed arguments
+        :param errors: errors found while parsing
+        """
+        self.values = {} if values is None else values
+        self.errors = [] if errors is None else errors
+
+    @property
+    def ok(self) -> bool:
+        return len(self.errors) <= 0
+
+    def to_exception(self) -> ArgumentParseError or None:
+        """
+        :return: an exception describing all errors, None if there are none
+        """
+        if self.ok:
+            return None
+        return ArgumentParseError(self.errors)
+
+    def raise_for_errors(self):
+        """
+        Raises an ArgumentParseError (a ValueError) describing the first error, if there is any
+        """
+        if not self.ok:
+            raise self.to_exception()
+
+
+def parse_command_args(arguments: str or None, expected_args: List[Argument] or ArgumentSpec) -> dict:
     """
     Parses the given argument text
     :param arguments: the argument text
-    :param expected_args: a list of expected arguments
+    :param expected_args: a list of expected arguments, or their compiled ArgumentSpec
     :return: dictionary { argument-name -> value }
     """
-    if arguments is None:
-        arguments = ""
+    result = parse_arguments(arguments, expected_args)
+    result.raise_for_errors()
+    return result.values
 
-    tokens = split_into_tokens(arguments)
 
-    # map argument.name -> argument
-    arg_name_map = OrderedDict()
-    for expected_arg in expected_args:
-        for name in expected_arg.names:
-            arg_name_map[name] = expected_arg
+def parse_arguments(arguments: str or None, expected_args: List[Argument] or ArgumentSpec,
+                    offset: int = 0) -> ParseResult:
+    """
+    Parses the given argument text without raising exceptions for invalid input
+    :param arguments: the argument text
+    :param expected_args: a list of expected arguments, or their compiled ArgumentSpec
+    :param offset: added to all error spans, f.ex. the position of the argument text in the message
+    :return: the parsed values and all errors that have been found
+    """
+    if arguments is None:
+        arguments = ""
 
-    parsed_args = {}
+    spec = expected_args if isinstance(expected_args, ArgumentSpec) else ArgumentSpec(expected_args)
+    result = ParseResult()
+
+    tokens, spans, error = tokenize(arguments)
+    if error is not None:
+        error.span = (error.span[0] + offset, error.span[1] + offset)
+        result.errors.append(error)
+        return result
+
+    # errors and value conversions in the order they have been found,
+    # values are converted (in a span of their own) once all tokens have been assigned to arguments
+    steps = []
+
+    def error(code: str, message: str, argument: str or None, idx: int or None, last_idx: int = None) -> ParseError:
+        span = None
+        if idx is not None:
+            end = spans[idx if last_idx is None else last_idx][1]
+            span = (spans[idx][0] + offset, end + offset)
+        return ParseError(code, message, argument, span)
+
+    def fail(code: str, message: str, argument: str or None, idx: int or None, last_idx: int = None):
+        steps.append(error(code, message, argument, idx, last_idx))
+
+    def set_value(arg: Argument, value: str or None, idx: int or None):
+        def convert() -> ParseError or None:
+            parsed, message = arg.try_parse_arg_value(value)
+            if message is None:
+                parsed_args[arg.name] = parsed
+                return None
+            code = ParseErrorCode.MISSING_ARGUMENT if value is None else ParseErrorCode.INVALID_VALUE
+            return error(code, message, arg.name, idx)
+
+        steps.append(convert)
+
+    def set_values(arg: Argument, values: [str], value_idx: [int], key_idx: int or None):
+        def convert() -> ParseError or None:
+            parsed, message, invalid = arg.try_parse_arg_values(values)
+            if message is None:
+                parsed_args[arg.name] = parsed
+                return None
+            if invalid is not None:
+                return error(ParseErrorCode.INVALID_VALUE, message, arg.name, value_idx[invalid])
+            if len(value_idx) > 0:
+                return error(ParseErrorCode.INVALID_VALUE, message, arg.name,
+                             value_idx[0] if key_idx is None else key_idx, value_idx[-1])
+            return error(ParseErrorCode.MISSING_ARGUMENT, message, arg.name, key_idx)
+
+        steps.append(convert)
+
+    # map argument.name -> argument, for arguments that have not been processed yet
+    arg_name_map = OrderedDict(spec.name_map)
+
+    parsed_args = result.values
 
     named_arg_idx = []
     for idx, arg_key in enumerate(tokens):
@@ -72,7 +270,9 @@ def parse_command_args(arguments: str or None, expected_args: List[Argument]) ->
 
             if all_flags:
                 if value is not None:
-                    raise ValueError("Unexpected flag value: {}".format(arg_key))
+                    fail(ParseErrorCode.UNEXPECTED_FLAG_VALUE, "Unexpected flag value: {}".format(arg_key),
+                         None, idx)
+                    continue
 
                 # process characters as flags
                 for char in arg_name:
@@ -84,14 +284,50 @@ def parse_command_args(arguments: str or None, expected_args: List[Argument]) ->
                     for name in arg.names:
                         arg_name_map.pop(name)
                 continue
-            else:
-                # otherwise raise an error
-                raise ValueError("Unknown argument '{}'".format(arg_key))
-        arg = arg_name_map[arg_name]
 
+            # check if this is a unique prefix of a long argument name
+            arg = None
+            if arg_name not in spec.name_map and starts_with_naming_prefix(arg_key, abbreviated=False):
+                arg, ambiguity = spec.resolve_prefix(arg_key, arg_name)
+                if ambiguity is not None:
+                    fail(ParseErrorCode.AMBIGUOUS_ARGUMENT, ambiguity, None, idx)
+                    continue
+            if arg is None or arg.name not in arg_name_map:
+                # otherwise report an error
+                fail(ParseErrorCode.UNKNOWN_ARGUMENT, "Unknown argument '{}'".format(arg_key), None, idx)
+                continue
+        else:
+            arg = arg_name_map[arg_name]
+
+        for name in arg.names:
+            arg_name_map.pop(name)
+
+        if arg.is_list:
+            # a value given using the separator is the first one,
+            # followed by all values up to the next argument key
+            values = [] if value is None else [unquote(value)]
+            value_idx = [] if value is None else [idx]
+            next_idx = idx + 1
+            while next_idx < len(tokens) and not is_argument_key(tokens[next_idx]) \
+                    and (arg.max_values is None or len(values) < arg.max_values):
+                values.append(unquote(tokens[next_idx]))
+                value_idx.append(next_idx)
+                used_idx.append(next_idx)
+                next_idx += 1
+            if len(values) <= 0 and arg.nargs != NARGS_ANY:
+                fail(ParseErrorCode.MISSING_VALUE, "Expected argument value for '{}' but found {}".format(
+                    arg_key, "EOL" if next_idx >= len(tokens) else "named argument '{}'".format(tokens[next_idx])),
+                     arg.name, idx)
+                continue
+            set_values(arg, values, value_idx, idx)
+            continue
+
+        value_idx = idx
         if arg.flag:
             if value is not None:
-                raise ValueError("Unexpected flag value: {}".format(arg_key))
+                fail(ParseErrorCode.UNEXPECTED_FLAG_VALUE, "Unexpected flag value: {}".format(arg_key),
+                     arg.name, idx)
+                continue
             # if a flag is present, we assume the value "true"
             value = arg.parse_arg_value("True")
         else:
@@ -99,47 +335,73 @@ def parse_command_args(arguments: str or None, expected_args: List[Argument]) ->
                 next_idx = idx + 1
                 value = tokens[next_idx] if next_idx < len(tokens) else None
                 used_idx.append(next_idx)
+                value_idx = next_idx
 
             if value is None:
-                raise ValueError(
-                    "Expected argument value for '{}' but found EOL".format(arg_key))
+                fail(ParseErrorCode.MISSING_VALUE, "Expected argument value for '{}' but found EOL".format(arg_key),
+                     arg.name, idx)
+                continue
             if is_argument_key(value):
-                raise ValueError(
-                    "Expected argument value for '{}' but found named argument '{}'".format(arg_key, value))
+                fail(ParseErrorCode.MISSING_VALUE,
+                     "Expected argument value for '{}' but found named argument '{}'".format(arg_key, value),
+                     arg.name, idx)
+                continue
 
         if is_quoted(value):
             value = value[1:-1]
 
-        parsed_args[arg.name] = arg.parse_arg_value(value)
-        for name in arg.names:
-            arg_name_map.pop(name)
+        set_value(arg, value, value_idx)
 
     # then process positional arguments
-    remaining_idx = list(set(list(range(len(tokens)))) - set(used_idx))
-    for idx in sorted(remaining_idx):
+    remaining_idx = sorted(set(range(len(tokens))) - set(used_idx))
+    position = 0
+    while position < len(remaining_idx):
         if len(arg_name_map) <= 0:
             # ignore excess arguments
             break
 
-        arg_key = tokens[idx]
-        if is_quoted(arg_key):
-            arg_key = arg_key[1:-1]
-        arg = list(arg_name_map.values())[0]
+        idx = remaining_idx[position]
+        arg = next(iter(arg_name_map.values()))
         # ignore flags here, to prevent accidentally setting a flag value
         if arg.flag:
+            position += 1
             continue
-        parsed_args[arg.name] = arg.parse_arg_value(arg_key)
         for name in arg.names:
             arg_name_map.pop(name)
 
+        if not arg.is_list:
+            set_value(arg, unquote(tokens[idx]), idx)
+            position += 1
+            continue
+
+        count = arg.max_values
+        if count is None:
+            # leave one value for each of the following required arguments
+            following = set(filter(lambda x: not (x.flag or x.optional or x.is_list), arg_name_map.values()))
+            count = max(0, len(remaining_idx) - position - len(following))
+        value_idx = remaining_idx[position:position + count]
+        set_values(arg, list(map(lambda x: unquote(tokens[x]), value_idx)), value_idx, None)
+        position += count
+
     # and then handle missing args
     while len(arg_name_map) > 0:
         name, arg = arg_name_map.popitem()
-        parsed_args[arg.name] = arg.parse_arg_value(None)
         for name in list(filter(lambda x: x != name, arg.names)):
             arg_name_map.pop(name)
+        if arg.is_list:
+            set_values(arg, [], [], None)
+        else:
+            set_value(arg, None, None)
 
-    return parsed_args
+    # run converters and validators
+    with tracing.span("convert"):
+        for step in steps:
+            if not isinstance(step, ParseError):
+                step = step()
+            if step is not None:
+                result.errors.append(step)
+
+    return result
 
 
 def split_into_tokens(text: str) -> List[str]:
@@ -150,18 +412,31 @@ def split_into_tokens(text: str) -> List[str]:
     :param text: the text to tokenize
     :return: a lists of tokens
     """
-    text = text.strip()
+    tokens, _, error = tokenize(text)
+    if error is not None:
+        raise ValueError(error.message)
+    return tokens
+
 
+def tokenize(text: str) -> (List[str], List[tuple], ParseError or None):
+    """
+    Splits the given text into tokens, like split_into_tokens(), and determines their position
+    :param text: the text to tokenize
+    :return: (tokens, (start, end) index of each token in the given text, error or None)
+    """
     tokens = []
-    if len(text) <= 0:
-        return tokens
+    spans = []
 
     escape_flag = False
     start_quote_char = None
     in_quote = False
 
     current_token = ""
-    for idx, character in enumerate(text):
+    start = None
+    # spans refer to the original text, including leading whitespace
+    offset = len(text) - len(text.lstrip())
+    text = text.strip()
+    for idx, character in enumerate(text, offset):
         if in_quote and escape_flag:
             current_token = current_token + character
             escape_flag = False
@@ -178,9 +453,13 @@ def split_into_tokens(text: str) -> List[str]:
                 # or we can simply ignore it
                 if len(current_token) > 0:
                     tokens.append(current_token)
+                    spans.append((start, idx))
                     current_token = ""
                 continue
 
+        if len(current_token) <= 0:
+            start = idx
+
         if character in QUOTE_CHARS:
             if in_quote:
                 if character == start_quote_char:
@@ -189,6 +468,7 @@ def split_into_tokens(text: str) -> List[str]:
                     current_token = current_token + character
                     if len(current_token) > 0:
                         tokens.append(current_token)
+                        spans.append((start, idx + 1))
                     current_token = ""
                     continue
             else:
@@ -199,12 +479,16 @@ def split_into_tokens(text: str) -> List[str]:
         current_token = current_token + character
 
     if in_quote:
-        raise ValueError("Missing closing quotation character: {}".format(start_quote_char))
+        error = ParseError(ParseErrorCode.UNCLOSED_QUOTE,
+                           "Missing closing quotation character: {}".format(start_quote_char),
+                           span=(start, offset + len(text)))
+        return tokens, spans, error
 
     if len(current_token) > 0:
         tokens.append(current_token)
+        spans.append((start, offset + len(text)))
 
-    return tokens
+    return tokens, spans, None
 
 
 def split_command_from_args(text: str or None) -> (str or None, str or None):
@@ -240,18 +524,31 @@ def split_command_from_target(bot_username: str, command: str or None) -> (str,
     return command, target
 
 
-def parse_telegram_command(bot_username: str, text: str, expected_args: []) -> (str, str, [str]):
+def parse_telegram_command(bot_username: str, text: str, expected_args: [] or ArgumentSpec) -> (str, str, [str]):
     """
     Parses the given message to a command and its arguments
     :param bot_username: the username of the current bot
     :param text: the text to parse
-    :param expected_args: expected arguments
+    :param expected_args: expected arguments, or their compiled ArgumentSpec
     :return: the target bot username, command, and its argument list
     """
+    command, result = parse_telegram_command_result(bot_username, text, expected_args)
+    result.raise_for_errors()
+    return command, result.values
+
+
+def parse_telegram_command_result(bot_username: str, text: str, expected_args: [] or ArgumentSpec) -> (str, ParseResult):
+    """
+    Parses the given message to a command and its arguments without raising exceptions for invalid arguments
+    :param bot_username: the username of the current bot
+    :param text: the text to parse
+    :param expected_args: expected arguments, or their compiled ArgumentSpec
+    :return: the command, and the result of parsing its arguments (error spans refer to the given text)
+    """
     command, args = split_command_from_args(text)
+    offset = len(text) - len(args) if args is not None else 0
     command, _ = split_command_from_target(bot_username, command)
-    parsed_args = parse_command_args(args, expected_args)
-    return command[1:], parsed_args
+    return command[1:], parse_arguments(args, expected_args, offset)
 
 
 def is_argument_key(text: str, abbreviated: bool or None = None) -> bool:
@@ -274,6 +571,17 @@ def is_argument_key(text: str, abbreviated: bool or None = None) -> bool:
     )
 
 
+def unquote(text: str) -> str:
+    """
+    Removes the quotation characters of a quoted token
+    :param text: the token
+    :return: the token without quotation characters
+    """
+    if is_quoted(text):
+        return text[1:-1]
+    return text
+
+
 def is_quoted(text: str or any) -> bool:
     """
     Checks if the given text is quoted.
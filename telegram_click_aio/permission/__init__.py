@@ -19,7 +19,9 @@
 #  SOFTWARE.
 
 from telegram_click_aio.permission.chat import _PrivateChat, _GroupChat, _SuperGroupChat
-from telegram_click_aio.permission.user import _GroupCreator, _GroupAdmin, _UserId, _UserName, _Nobody, _Anybody
+from telegram_click_aio.circuit_breaker import CircuitBreaker
+from telegram_click_aio.permission.user import _GroupCreator, _GroupAdmin, _UserId, _UserName, _Nobody, _Anybody, \
+    _UserIdAllowlist, PermissionFallback
 
 PRIVATE_CHAT = _PrivateChat()
 NORMAL_GROUP_CHAT = _GroupChat()
@@ -30,5 +32,32 @@ ANYBODY = _Anybody()
 NOBODY = _Nobody()
 USER_ID = _UserId
 USER_NAME = _UserName
+USER_ID_ALLOWLIST = _UserIdAllowlist
 GROUP_CREATOR = (_GroupCreator() & GROUP_CHAT)
 GROUP_ADMIN = (_GroupAdmin() & GROUP_CHAT)
+
+
+def group_creator(timeout: float = None, fallback: str = PermissionFallback.DENY,
+                  circuit_breaker: CircuitBreaker = None, cache_ttl: float = None):
+    """
+    Like GROUP_CREATOR, but with a bounded wait for the chat member lookup and optional caching of its result
+    :param timeout: the maximum number of seconds to wait for the member lookup, None to wait indefinitely
+    :param fallback: the decision if the lookup fails or times out, one of PermissionFallback
+    :param circuit_breaker: a circuit breaker to stop issuing lookups after repeated failures
+    :param cache_ttl: the number of seconds a looked up member status may be reused, None to look it up every time
+    :return: the permission
+    """
+    return GROUP_CHAT & _GroupCreator(timeout, fallback, circuit_breaker, cache_ttl)
+
+
+def group_admin(timeout: float = None, fallback: str = PermissionFallback.DENY,
+                circuit_breaker: CircuitBreaker = None, cache_ttl: float = None):
+    """
+    Like GROUP_ADMIN, but with a bounded wait for the chat member lookup and optional caching of its result
+    :param timeout: the maximum number of seconds to wait for the member lookup, None to wait indefinitely
+    :param fallback: the decision if the lookup fails or times out, one of PermissionFallback
+    :param circuit_breaker: a circuit breaker to stop issuing lookups after repeated failures
+    :param cache_ttl: the number of seconds a looked up member status may be reused, None to look it up every time
+    :return: the permission
+    """
+    return GROUP_CHAT & _GroupAdmin(timeout, fallback, circuit_breaker, cache_ttl)
@@ -17,15 +17,42 @@
 #  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
+import contextvars
+import copy
 import operator
+import time
 from abc import abstractmethod
-from functools import reduce
 from typing import Dict
 
 from aiogram.types import Message
 
+from telegram_click_aio import Scope, tracing
+from telegram_click_aio.util import get_scope_key
+
+
+# set while evaluating a permission, if a result has been decided by a fallback instead of an actual check
+_FALLBACK_USED = contextvars.ContextVar("telegram_click_aio_permission_fallback", default=False)
+
+
+def report_fallback():
+    """
+    Reports that the result of the permission currently being evaluated has not actually been checked
+    (f.ex. because a Bot API lookup failed), so it must not be reused for other messages
+    """
+    _FALLBACK_USED.set(True)
+
+
+def is_fallback_reported() -> bool:
+    """
+    :return: True if report_fallback() has been called in the current context
+    """
+    return _FALLBACK_USED.get()
+
 
 class Permission:
+    # the parts of a message the result of evaluate() depends on, a combination of Scope values,
+    # None if the result can not be reused for other messages
+    cache_scope = None
 
     async def __call__(self, message: Message) -> bool:
         return await self.evaluate(message)
@@ -48,6 +75,16 @@ class Permission:
     def __repr__(self):
         return "<{}>".format(self.__class__.__name__)
 
+    def cache_key(self, message: Message) -> tuple or None:
+        """
+        Determines the key of the group of messages that share the same evaluation result
+        :param message: the message
+        :return: hashable key based on cache_scope, None if the result can not be reused
+        """
+        if self.cache_scope is None:
+            return None
+        return get_scope_key(self.cache_scope, message)
+
     @abstractmethod
     async def evaluate(self, message: Message) -> bool:
         """
@@ -58,6 +95,43 @@ class Permission:
         raise NotImplementedError()
 
 
+async def evaluate_permission(permission: Permission, message: Message) -> bool:
+    """
+    Evaluates a permission, within a span of its own if tracing is enabled
+    :param permission: the permission
+    :param message: the message
+    :return: True if the permission is granted, False otherwise
+    """
+    if tracing.get_tracer() is None:
+        return await permission.evaluate(message)
+
+    with tracing.span("permission", permission=str(permission)) as s:
+        result = await permission.evaluate(message)
+        s.set_attribute("granted", bool(result))
+        return result
+
+
+async def evaluate_checked_permission(permission: Permission, message: Message) -> (bool, bool):
+    """
+    Evaluates a permission and tells whether its result has actually been checked
+    :param permission: the permission
+    :param message: the message
+    :return: a tuple of the result and False if it has been decided by a fallback (see report_fallback()),
+             True otherwise
+    """
+    token = _FALLBACK_USED.set(False)
+    try:
+        result = bool(await evaluate_permission(permission, message))
+        checked = not is_fallback_reported()
+    finally:
+        _FALLBACK_USED.reset(token)
+
+    if not checked:
+        # let enclosing evaluations know as well
+        report_fallback()
+    return result, checked
+
+
 class InvertedPermission(Permission):
     """
     Represents a permission that has been inverted.
@@ -69,8 +143,12 @@ class InvertedPermission(Permission):
         """
         self.original_permission = original_permission
 
+    @property
+    def cache_scope(self) -> int or None:
+        return self.original_permission.cache_scope
+
     async def evaluate(self, message: Message) -> bool:
-        return not bool(await self.original_permission(message))
+        return not bool(await evaluate_permission(self.original_permission, message))
 
     def __str__(self):
         return "(not {})".format(self.original_permission.__str__())
@@ -79,9 +157,59 @@ class InvertedPermission(Permission):
         return "<not {}>".format(self.original_permission.__repr__())
 
 
+class PermissionStats:
+    """
+    Observed cost and selectivity of a permission, used to order the children of an adaptive MergedPermission
+    """
+    __slots__ = ["evaluations", "granted", "total_time"]
+
+    def __init__(self):
+        self.evaluations = 0
+        self.granted = 0
+        # seconds spent evaluating the permission
+        self.total_time = 0.0
+
+    def record(self, granted: bool, duration: float):
+        """
+        Records a single evaluation
+        :param granted: the evaluation result
+        :param duration: the time the evaluation took in seconds
+        """
+        self.evaluations += 1
+        if granted:
+            self.granted += 1
+        self.total_time += duration
+
+    @property
+    def pass_rate(self) -> float:
+        """
+        :return: the estimated probability of the permission being granted
+        """
+        # add-one smoothing, so permissions that have (almost) never been evaluated are not ruled out
+        return (self.granted + 1) / (self.evaluations + 2)
+
+    @property
+    def mean_latency(self) -> float:
+        """
+        :return: the average evaluation time in seconds, 0 if there have not been any evaluations yet
+        """
+        if self.evaluations <= 0:
+            return 0.0
+        return self.total_time / self.evaluations
+
+    def to_dict(self) -> dict:
+        return {
+            "evaluations": self.evaluations,
+            "granted": self.granted,
+            "pass_rate": self.pass_rate,
+            "mean_latency": self.mean_latency,
+        }
+
+
 class MergedPermission(Permission):
     """
     Represents a permission consisting of two other permissions.
+    Evaluation stops as soon as the result is known, f.ex. at the first granted permission for "or".
     """
 
     def __init__(self, permissions: list, op: operator):
@@ -96,13 +224,80 @@ class MergedPermission(Permission):
         if self.op not in [operator.and_, operator.or_]:
             raise ValueError("Only operator.and_, operator.or_ are supported")
 
+        # adaptive mode, see adaptive()
+        self.reorder_interval = None
+        # permission -> PermissionStats
+        self.stats = {}
+        self._evaluations_since_reorder = 0
+
+    @property
+    def cache_scope(self) -> int or None:
+        """
+        :return: the union of the scopes of all merged permissions, None if any of them can not be reused
+        """
+        scope = Scope.GLOBAL
+        for permission in self.permissions:
+            if permission.cache_scope is None:
+                return None
+            scope |= permission.cache_scope
+        return scope
+
     async def evaluate(self, message: Message) -> bool:
         """
-        Evaluates all given permissions and combines their result using the given operator
-        :return: reduced evaluation result
+        Evaluates the given permissions until the result is known
+        :return: combined evaluation result
+        """
+        # the result that ends the evaluation early
+        decisive = self.op is operator.or_
+        if self.reorder_interval is None:
+            for permission in self.permissions:
+                if bool(await evaluate_permission(permission, message)) == decisive:
+                    return decisive
+            return not decisive
+
+        # the order may be changed by a concurrent evaluation, so keep using this snapshot
+        permissions = self.permissions
+        result = not decisive
+        for permission in permissions:
+            start = time.perf_counter()
+            granted = bool(await evaluate_permission(permission, message))
+            self.stats[permission].record(granted, time.perf_counter() - start)
+            if granted == decisive:
+                result = decisive
+                break
+
+        self._evaluations_since_reorder += 1
+        if self._evaluations_since_reorder >= self.reorder_interval:
+            self._evaluations_since_reorder = 0
+            self.reorder()
+        return result
+
+    def reorder(self):
+        """
+        Orders the permissions by their expected cost per decisive result, based on the observed statistics:
+        cheap permissions that are likely to end the evaluation come first.
+        Permissions that have not been evaluated yet keep their position, as nothing is known about their cost.
+        """
+        decisive = self.op is operator.or_
+
+        def cost(permission: Permission) -> float:
+            stats = self.stats[permission]
+            probability = stats.pass_rate if decisive else 1.0 - stats.pass_rate
+            return stats.mean_latency / probability
+
+        permissions = list(self.permissions)
+        positions = list(filter(lambda i: self.stats[permissions[i]].evaluations > 0, range(len(permissions))))
+        # sorting is stable, so permissions of equal cost keep their relative order
+        measured = sorted(map(lambda i: permissions[i], positions), key=cost)
+        for position, permission in zip(positions, measured):
+            permissions[position] = permission
+        self.permissions = permissions
+
+    def statistics(self) -> list:
+        """
+        :return: (permission, PermissionStats) of all merged permissions in their current evaluation order
         """
-        evaluations = [await x.evaluate(message) for x in self.permissions]
-        return reduce(lambda x, y: self.op(x, y), evaluations)
+        return list(map(lambda x: (x, self.stats.get(x, None)), self.permissions))
 
     def __str__(self):
         permission_class_names = list(map(lambda x: x.__str__(), self.permissions))
@@ -115,6 +310,55 @@ class MergedPermission(Permission):
         return "<{}>".format(repr)
 
 
+def adaptive(permission: Permission, reorder_interval: int = 100) -> Permission:
+    """
+    Creates a copy of the given permission with adaptive ordering enabled for all merged permissions within it.
+    Each merged permission records the latency and pass rate of its children
+    and reorders them every reorder_interval evaluations to minimize the expected evaluation cost.
+    Only merged and inverted permissions are copied, so the given permission
+    (f.ex. GROUP_ADMIN, which is shared by all commands using it) is left unchanged.
+    :param permission: the permission
+    :param reorder_interval: the number of evaluations between reorderings
+    :return: the adaptive permission
+    """
+    if reorder_interval < 1:
+        raise ValueError("reorder_interval must be at least 1")
+
+    if isinstance(permission, MergedPermission):
+        merged = copy.copy(permission)
+        merged.permissions = list(map(lambda x: adaptive(x, reorder_interval), permission.permissions))
+        merged.stats = {child: PermissionStats() for child in merged.permissions}
+        merged.reorder_interval = reorder_interval
+        merged._evaluations_since_reorder = 0
+        return merged
+    if isinstance(permission, InvertedPermission):
+        inverted = copy.copy(permission)
+        inverted.original_permission = adaptive(permission.original_permission, reorder_interval)
+        return inverted
+    return permission
+
+
+def get_permission_statistics(permission: Permission) -> dict:
+    """
+    Collects the statistics of all adaptive merged permissions within the given permission
+    :param permission: the permission
+    :return: nested dictionary, children are listed in their current evaluation order
+    """
+    node = {"permission": str(permission)}
+    if isinstance(permission, MergedPermission):
+        node["op"] = permission.op.__name__
+        children = []
+        for child, stats in permission.statistics():
+            child_node = get_permission_statistics(child)
+            if stats is not None:
+                child_node["stats"] = stats.to_dict()
+            children.append(child_node)
+        node["children"] = children
+    elif isinstance(permission, InvertedPermission):
+        node["children"] = [get_permission_statistics(permission.original_permission)]
+    return node
+
+
 async def get_evaluation_tree(message: Message, permission: Permission) -> any:
     async def add_child(tree_node: Dict, permission: Permission):
         evaluation = await permission.evaluate(message)
@@ -0,0 +1,88 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from aiogram.types import Message
+
+from telegram_click_aio import Scope
+from telegram_click_aio.cache import CacheBackend, LruCache
+from .base import Permission, evaluate_checked_permission
+
+# cache_scope -> seconds to reuse a result, results depending on less information are stable for longer
+DEFAULT_SCOPE_TTLS = {
+    Scope.GLOBAL: 3600.0,
+    Scope.CHAT: 3600.0,
+    Scope.USER: 300.0,
+    Scope.CHAT | Scope.USER: 60.0,
+}
+
+
+class CachedPermission(Permission):
+    """
+    Reuses the result of a permission for all messages with the same cache_key(),
+    for a time depending on the cache_scope of the permission.
+    Results decided by a fallback (see report_fallback()) are not reused.
+    """
+
+    def __init__(self, permission: Permission, ttls: dict = None, max_keys: int = 100000,
+                 cache: CacheBackend = None, name: str = None):
+        """
+        Creates an instance
+        :param permission: the permission to cache the results of, it has to declare a cache_scope
+        :param ttls: map of (cache_scope -> seconds to reuse a result), defaults to DEFAULT_SCOPE_TTLS,
+                     the shortest ttl is used for scopes that are not listed
+        :param max_keys: the maximum number of results to remember, if no cache backend is given
+        :param cache: a cache backend to store results in instead, f.ex. to share them between processes
+        :param name: a name identifying this permission in the cache backend, required if cache is set
+        """
+        if permission.cache_scope is None:
+            raise ValueError("Results of {} can not be reused, it does not declare a cache_scope".format(permission))
+        if cache is not None and name is None:
+            raise ValueError("name is required when using a cache backend")
+
+        self.permission = permission
+        if ttls is None:
+            ttls = DEFAULT_SCOPE_TTLS
+        self.ttl = ttls.get(permission.cache_scope, min(ttls.values()))
+        self.cache = cache if cache is not None else LruCache(max_keys)
+        self.name = name if name is not None else str(id(self))
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_scope(self) -> int or None:
+        return self.permission.cache_scope
+
+    async def evaluate(self, message: Message) -> bool:
+        key = "permission:{}:{!r}".format(self.name, self.permission.cache_key(message))
+        result = await self.cache.get_async(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result, checked = await evaluate_checked_permission(self.permission, message)
+        if checked:
+            await self.cache.set_async(key, result, self.ttl)
+        return result
+
+    def __str__(self):
+        return "cached{}".format(self.permission.__str__())
+
+    def __repr__(self):
+        return "<cached {}>".format(self.permission.__repr__())
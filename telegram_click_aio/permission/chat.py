@@ -19,6 +19,7 @@
 #  SOFTWARE.
 from aiogram.types import Message
 
+from telegram_click_aio import Scope
 from .base import Permission
 
 
@@ -26,6 +27,7 @@ class _PrivateChat(Permission):
     """
     Requires the interaction inside a private chat.
     """
+    cache_scope = Scope.CHAT
 
     async def evaluate(self, message: Message) -> bool:
         chat_type = message.chat.type
@@ -36,6 +38,7 @@ class _GroupChat(Permission):
     """
     Requires the interaction inside a group chat.
     """
+    cache_scope = Scope.CHAT
 
     async def evaluate(self, message: Message) -> bool:
         chat_type = message.chat.type
@@ -46,6 +49,7 @@ class _SuperGroupChat(Permission):
     """
     Requires the interaction inside a supergroup chat.
     """
+    cache_scope = Scope.CHAT
 
     async def evaluate(self, message: Message) -> bool:
         chat_type = message.chat.type
@@ -17,15 +17,32 @@
 #  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
+import asyncio
+import itertools
+import logging
+import operator
+import os
+import sys
+import time
+from abc import abstractmethod
+from array import array
+from bisect import bisect_left
+
 from aiogram.types import Message
 
-from .base import Permission
+from telegram_click_aio import Scope
+from telegram_click_aio.cache import get_chat_member_status, get_last_known_chat_member_status
+from telegram_click_aio.circuit_breaker import CircuitBreaker, CircuitOpenError
+from .base import Permission, report_fallback
+
+LOGGER = logging.getLogger(__name__)
 
 
 class _Anybody(Permission):
     """
     Permission that is always True.
     """
+    cache_scope = Scope.GLOBAL
 
     async def evaluate(self, message: Message) -> bool:
         return True
@@ -35,6 +52,7 @@ class _Nobody(Permission):
     """
     Permission that is never True.
     """
+    cache_scope = Scope.GLOBAL
 
     async def evaluate(self, message: Message) -> bool:
         return False
@@ -44,6 +62,7 @@ class _UserId(Permission):
     """
     Requires that the command user has a specific user id.
     """
+    cache_scope = Scope.USER
 
     def __init__(self, *id: int):
         self.ids = set(list(id))
@@ -59,10 +78,105 @@ class _UserId(Permission):
         return from_user.id in self.ids
 
 
+class _UserIdAllowlist(Permission):
+    """
+    Requires that the command user is listed in an allowlist file (one user id per line, # starts a comment).
+    Ids are kept in a sorted array and looked up using binary search, which needs a fraction
+    of the memory of a set. The file is reloaded in the background on a worker thread when it changes,
+    evaluations running meanwhile (including the one noticing the change) still use the previous version.
+    Note that a CachedPermission keeps using cached results after a reload until they expire
+    (300 seconds for Scope.USER by default).
+    """
+    cache_scope = Scope.USER
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        """
+        :param path: path of the allowlist file
+        :param reload_interval: the minimum number of seconds between checks for changes of the file
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self._mtime = None
+        self._checked = time.monotonic()
+        self._reloading = False
+        self._ids = array("q")
+        self._load()
+
+    def __str__(self):
+        return "{}({})".format(self.__class__.__name__, self.path)
+
+    def __repr__(self):
+        return "<{}>".format(self.__str__())
+
+    def __len__(self):
+        return len(self._ids)
+
+    def footprint(self) -> int:
+        """
+        :return: the number of bytes used to store the ids
+        """
+        return sys.getsizeof(self._ids)
+
+    async def evaluate(self, message: Message) -> bool:
+        now = time.monotonic()
+        if now - self._checked >= self.reload_interval and not self._reloading:
+            self._checked = now
+            self._reloading = True
+            # reload in the background, evaluations keep using the current ids until it is done
+            future = asyncio.get_running_loop().run_in_executor(None, self._load)
+            future.add_done_callback(self._on_reloaded)
+
+        ids = self._ids
+        idx = bisect_left(ids, message.from_user.id)
+        return idx < len(ids) and ids[idx] == message.from_user.id
+
+    def _on_reloaded(self, future: asyncio.Future):
+        self._reloading = False
+        if not future.cancelled() and future.exception() is not None:
+            LOGGER.error("Error reloading allowlist {}: {!r}".format(self.path, future.exception()))
+
+    def _load(self):
+        """
+        Loads the allowlist file if it has changed since it was last loaded
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                ids = array("q")
+                for line in f:
+                    line = line.split("#", 1)[0].strip()
+                    if len(line) > 0:
+                        ids.append(int(line))
+        except (OSError, ValueError):
+            if self._mtime is None:
+                raise
+            LOGGER.exception("Error reloading allowlist {}, keeping the previous version".format(self.path))
+            return
+
+        # replace all ids at once, so concurrent evaluations never see a partially loaded list
+        self._ids = _sorted_unique(ids)
+        self._mtime = mtime
+        self.reloads += 1
+        LOGGER.debug("Loaded {} ids ({} bytes) from allowlist {}".format(len(self._ids), self.footprint(), self.path))
+
+
+def _sorted_unique(ids: array) -> array:
+    """
+    :param ids: array of ids
+    :return: array of the given ids in ascending order, without duplicates
+    """
+    # sorting takes linear time for files that are already sorted, duplicates are adjacent afterwards
+    return array("q", map(operator.itemgetter(0), itertools.groupby(sorted(ids))))
+
+
 class _UserName(Permission):
     """
     Requires that the command user has a specific username.
     """
+    cache_scope = Scope.USER
 
     def __init__(self, *username: str):
         fixed_usernames = map(self._remove_at_if_present, set(username))
@@ -90,29 +204,88 @@ class _UserName(Permission):
         return from_user.username in self.usernames
 
 
-class _GroupCreator(Permission):
+class PermissionFallback:
     """
-    Requires that the command user is the group creator.
+    Decisions of a permission whose Bot API lookup failed or timed out
     """
+    # deny the permission
+    DENY = "deny"
+    # grant the permission
+    ALLOW = "allow"
+    # use the most recently looked up result, deny if there is none
+    CACHED = "cached"
+
+
+class _ChatMemberPermission(Permission):
+    """
+    Base class of permissions based on the status of the command user in the chat.
+    """
+    cache_scope = Scope.CHAT | Scope.USER
+
+    def __init__(self, timeout: float = None, fallback: str = PermissionFallback.DENY,
+                 circuit_breaker: CircuitBreaker = None, cache_ttl: float = None):
+        """
+        :param timeout: the maximum number of seconds to wait for the member lookup, None to wait indefinitely
+        :param fallback: the decision if the lookup fails or times out, one of PermissionFallback
+        :param circuit_breaker: a circuit breaker to stop issuing lookups after repeated failures
+        :param cache_ttl: the number of seconds a looked up member status may be reused, None to look it up
+                          for every evaluation (a changed status takes effect after up to this time,
+                          unless chat_member updates are handled, see cache.on_chat_member_updated())
+        """
+        if fallback not in [PermissionFallback.DENY, PermissionFallback.ALLOW, PermissionFallback.CACHED]:
+            raise ValueError("Unsupported fallback: {}".format(fallback))
+        self.timeout = timeout
+        self.fallback = fallback
+        self.circuit_breaker = circuit_breaker
+        self.cache_ttl = cache_ttl
 
     async def evaluate(self, message: Message) -> bool:
         bot = message.bot
         chat_id = message.chat.id
         from_user = message.from_user
-        member = await bot.get_chat_member(chat_id, from_user.id)
+        if self.timeout is None and self.circuit_breaker is None:
+            status = await get_chat_member_status(bot, chat_id, from_user.id, ttl=self.cache_ttl)
+            return self.is_granted(status)
 
-        return member.status == "creator"
+        try:
+            status = await get_chat_member_status(bot, chat_id, from_user.id, self.timeout, self.circuit_breaker,
+                                                  self.cache_ttl)
+        except Exception as ex:
+            # an open circuit is reported by the circuit breaker once, not for every message
+            log = LOGGER.debug if isinstance(ex, CircuitOpenError) else LOGGER.warning
+            log("Chat member lookup failed in chat {} for user {}, using fallback '{}': {!r}".format(
+                chat_id, from_user.id, self.fallback, ex))
+            report_fallback()
+            if self.fallback == PermissionFallback.ALLOW:
+                return True
+            if self.fallback == PermissionFallback.CACHED:
+                status = await get_last_known_chat_member_status(bot, chat_id, from_user.id)
+                return status is not None and self.is_granted(status)
+            return False
+        return self.is_granted(status)
 
+    @abstractmethod
+    def is_granted(self, status: str) -> bool:
+        """
+        :param status: the status of the command user in the chat
+        :return: True if the permission is granted, False otherwise
+        """
+        raise NotImplementedError()
 
-class _GroupAdmin(Permission):
+
+class _GroupCreator(_ChatMemberPermission):
     """
-    Requires that the command user is a group admin.
+    Requires that the command user is the group creator.
     """
 
-    async def evaluate(self, message: Message) -> bool:
-        bot = message.bot
-        chat_id = message.chat.id
-        from_user = message.from_user
-        member = await bot.get_chat_member(chat_id, from_user.id)
+    def is_granted(self, status: str) -> bool:
+        return status == "creator"
+
+
+class _GroupAdmin(_ChatMemberPermission):
+    """
+    Requires that the command user is a group admin.
+    """
 
-        return member.status == "administrator"
+    def is_granted(self, status: str) -> bool:
+        return status == "administrator"
@@ -0,0 +1,168 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import cProfile
+import itertools
+import json
+import logging
+import os
+import random
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# file extensions of profiles and their metadata
+PROFILE_EXTENSION = ".pstats"
+METADATA_EXTENSION = ".json"
+
+
+class ProfileSample:
+    """
+    A command invocation that is being profiled
+    """
+    __slots__ = ["profile", "start", "arguments"]
+
+    def __init__(self, profile: cProfile.Profile):
+        self.profile = profile
+        self.start = time.perf_counter()
+        # parsed arguments, once known
+        self.arguments = None
+
+
+class CommandProfiler:
+    """
+    Profiles a random fraction of command invocations using cProfile, and keeps
+    the profiles of invocations slower than a threshold in a directory of bounded size.
+    Note: cProfile profiles the whole thread, so a profile also contains other tasks
+    running on the event loop at the same time. Only one invocation is profiled at a time.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.01, threshold: float = 1.0, max_files: int = 100):
+        """
+        Creates an instance
+        :param directory: the directory to write profiles to
+        :param sample_rate: the fraction of invocations to profile (0..1)
+        :param threshold: the minimum duration (in seconds) of an invocation to keep its profile
+        :param max_files: the maximum number of profiles to keep, the oldest ones are deleted first
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if max_files < 1:
+            raise ValueError("max_files must be at least 1")
+
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.max_files = max_files
+        self._active = False
+        self._counter = itertools.count()
+        self.sampled = 0
+        self.written = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def begin(self) -> ProfileSample or None:
+        """
+        Decides whether to profile an invocation and starts profiling if so
+        :return: the sample, None if the invocation is not profiled
+        """
+        if self._active or random.random() >= self.sample_rate:
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active
+            return None
+        self._active = True
+        self.sampled += 1
+        return ProfileSample(profile)
+
+    def end(self, sample: ProfileSample, command_name: str) -> str or None:
+        """
+        Stops profiling an invocation and keeps the profile if it was slow
+        :param sample: the sample returned by begin()
+        :param command_name: the name of the command
+        :return: the path of the written profile, None if the invocation was fast enough
+        """
+        sample.profile.disable()
+        self._active = False
+
+        duration = time.perf_counter() - sample.start
+        if duration < self.threshold:
+            return None
+
+        base_name = "{}-{}-{}-{:06d}".format(time.strftime("%Y%m%d%H%M%S"), command_name, os.getpid(),
+                                         next(self._counter))
+        path = os.path.join(self.directory, base_name + PROFILE_EXTENSION)
+        try:
+            sample.profile.dump_stats(path)
+            metadata = {
+                "command": command_name,
+                "arguments": sample.arguments,
+                "duration": duration,
+                "time": time.time(),
+            }
+            with open(os.path.join(self.directory, base_name + METADATA_EXTENSION), "w") as f:
+                json.dump(metadata, f, default=repr)
+            self._rotate()
+        except OSError:
+            LOGGER.exception("Error writing profile of command /{}".format(command_name))
+            return None
+
+        self.written += 1
+        return path
+
+    def profiles(self) -> [str]:
+        """
+        :return: paths of all kept profiles, oldest first
+        """
+        names = filter(lambda x: x.endswith(PROFILE_EXTENSION), os.listdir(self.directory))
+        paths = map(lambda x: os.path.join(self.directory, x), names)
+        return sorted(paths, key=lambda x: (os.path.getmtime(x), x))
+
+    def _rotate(self):
+        profiles = self.profiles()
+        for path in profiles[:max(0, len(profiles) - self.max_files)]:
+            for file in [path, path[:-len(PROFILE_EXTENSION)] + METADATA_EXTENSION]:
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+
+
+# profiler used by commands that don't specify one, None to disable profiling
+_PROFILER = None
+
+
+def set_profiler(profiler: CommandProfiler or None):
+    """
+    Sets the profiler used by all commands that don't specify one
+    :param profiler: the profiler, None to disable profiling
+    """
+    global _PROFILER
+    _PROFILER = profiler
+
+
+def get_profiler() -> CommandProfiler or None:
+    """
+    :return: the profiler used by all commands that don't specify one
+    """
+    return _PROFILER
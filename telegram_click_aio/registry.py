@@ -0,0 +1,217 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import logging
+from collections import OrderedDict
+from typing import List
+
+from telegram_click_aio import COMMAND_LIST
+from telegram_click_aio.argument import Argument
+from telegram_click_aio.const import *
+from telegram_click_aio.help import RenderedHelp, HELP_RENDERERS, render_help_message
+from telegram_click_aio.parser import ArgumentSpec
+from telegram_click_aio.suggestion import CommandNameIndex, COMMAND_NAME_INDEX
+from telegram_click_aio.util import find_duplicates
+
+LOGGER = logging.getLogger(__name__)
+
+# definition fingerprint -> (help message, argument spec), shared by all registries
+_COMPILED_COMMANDS = {}
+
+_PAGE_INDEX_CACHE_SIZE = 256
+
+
+class CommandRegistry:
+    """
+    A set of commands with unique names, f.ex. the commands of a single bot or router.
+    Commands registered without specifying a registry are added to DEFAULT_REGISTRY.
+    """
+
+    def __init__(self, commands: list = None, name_index: CommandNameIndex = None):
+        """
+        Creates an instance
+        :param commands: list to store command entries in
+        :param name_index: index to add command names to
+        """
+        self.commands = [] if commands is None else commands
+        self.name_index = CommandNameIndex() if name_index is None else name_index
+        self._names = set()
+        # lowercase names, the name index (and thus get()) ignores case
+        self._lower_names = set()
+        for x in self.commands:
+            self._names.update(x[KEY_NAMES])
+            self._lower_names.update(map(str.lower, x[KEY_NAMES]))
+        # (registry size, sorted commands)
+        self._sorted_commands = (0, [])
+        # (registry size, visibility signature, parse mode, max length) -> page boundaries
+        self._page_index_cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __iter__(self):
+        return iter(self.commands)
+
+    def __contains__(self, name: str):
+        return name in self._names
+
+    def get(self, name: str) -> dict or None:
+        """
+        :param name: a command name (or alias)
+        :return: the command entry of the given name, or None
+        """
+        return self.name_index.get(name)
+
+    def check_name_clashes(self, names: List[str]):
+        """
+        Checks if a command name has been used multiple times (ignoring case) and raises an exception if so
+        :param names: command names of a new command
+        """
+        clashing = list(filter(lambda x: x.lower() in self._lower_names, names))
+        clashing.extend(find_duplicates(list(map(str.lower, names))))
+        if len(clashing) > 0:
+            clashing = ", ".join(OrderedDict.fromkeys(clashing).keys())
+            raise ValueError("Command names must be unique! Clashing names: {}".format(clashing))
+
+    def add(self, command: dict):
+        """
+        Adds a command entry
+        :param command: the command entry
+        """
+        self.check_name_clashes(command[KEY_NAMES])
+        self.commands.append(command)
+        self._names.update(command[KEY_NAMES])
+        self._lower_names.update(map(str.lower, command[KEY_NAMES]))
+        for name in command[KEY_NAMES]:
+            self.name_index.add(name, command)
+
+    def timeout_counts(self) -> dict:
+        """
+        :return: map of (command name -> number of timeouts) of all commands with a timeout
+        """
+        return dict(map(lambda x: (x[KEY_NAMES][0], x[KEY_TIMEOUT_COUNT]),
+                        filter(lambda x: x.get(KEY_TIMEOUT, None) is not None, self.commands)))
+
+    def sorted_commands(self) -> list:
+        """
+        :return: all commands, sorted by name
+        """
+        version = len(self.commands)
+        if self._sorted_commands[0] != version:
+            self._sorted_commands = (version, sorted(
+                self.commands, key=lambda x: (x[KEY_NAMES][0].lower(), len(x[KEY_ARGUMENTS]))))
+        return self._sorted_commands[1]
+
+    def page_index(self, signature: int, parse_mode: str or None, max_length: int) -> tuple:
+        """
+        Splits the commands visible to a user into pages, based on the length of their rendered help messages
+        :param signature: bitmask of visible commands, indexes refer to sorted_commands()
+        :param parse_mode: the telegram parse mode
+        :param max_length: the maximum length of a page
+        :return: tuple of pages, each being a tuple of indexes into sorted_commands()
+        """
+        cache_key = (len(self.commands), signature, parse_mode, max_length)
+        pages = self._page_index_cache.get(cache_key, None)
+        if pages is not None:
+            self._page_index_cache.move_to_end(cache_key)
+            return pages
+
+        pages = self._build_page_index(signature, parse_mode, max_length)
+        self._page_index_cache[cache_key] = pages
+        if len(self._page_index_cache) > _PAGE_INDEX_CACHE_SIZE:
+            self._page_index_cache.popitem(last=False)
+        return pages
+
+    def _build_page_index(self, signature: int, parse_mode: str or None, max_length: int) -> tuple:
+        separator_length = len("\n\n")
+
+        pages = []
+        current = []
+        current_length = 0
+        for idx, x in enumerate(self.sorted_commands()):
+            if not signature & (1 << idx):
+                continue
+
+            length = len(x[KEY_HELP_MESSAGE].for_parse_mode(parse_mode))
+            if len(current) > 0 and current_length + separator_length + length > max_length:
+                pages.append(tuple(current))
+                current = []
+                current_length = 0
+
+            if len(current) > 0:
+                current_length += separator_length
+            current.append(idx)
+            current_length += length
+
+        if len(current) > 0:
+            pages.append(tuple(current))
+
+        return tuple(pages)
+
+
+# registry used when no registry is specified
+DEFAULT_REGISTRY = CommandRegistry(COMMAND_LIST, COMMAND_NAME_INDEX)
+
+
+def get_registry(registry: CommandRegistry or None) -> CommandRegistry:
+    """
+    :param registry: a registry or None
+    :return: the given registry, or DEFAULT_REGISTRY if None
+    """
+    return DEFAULT_REGISTRY if registry is None else registry
+
+
+def compile_command(names: List[str], description: str, arguments: List[Argument]) -> (RenderedHelp, ArgumentSpec):
+    """
+    Renders the help message and compiles the argument spec of a command definition.
+    Identical definitions (f.ex. the same command registered for multiple bots)
+    share the same objects, so memory grows with the number of distinct commands only.
+    :param names: names of the command
+    :param description: command description
+    :param arguments: command arguments
+    :return: (help message, argument spec)
+    """
+    key = (tuple(names), description, tuple(map(_argument_fingerprint, arguments)),
+           tuple(HELP_RENDERERS.values()))
+    compiled = _COMPILED_COMMANDS.get(key, None)
+    if compiled is None:
+        compiled = (render_help_message(names, description, arguments), ArgumentSpec(arguments))
+        _COMPILED_COMMANDS[key] = compiled
+    return compiled
+
+
+def get_compiled_command_count() -> int:
+    """
+    :return: the number of distinct command definitions compiled so far
+    """
+    return len(_COMPILED_COMMANDS)
+
+
+def _argument_fingerprint(arg: Argument) -> any:
+    """
+    :param arg: an argument
+    :return: a hashable value that is equal for arguments behaving the same way
+    """
+    key = arg._fingerprint()
+    try:
+        hash(key)
+    except TypeError:
+        # f.ex. a list as default value
+        return arg
+    return key
@@ -0,0 +1,298 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+
+from aiogram.types import Update
+
+LOGGER = logging.getLogger(__name__)
+
+# update fields containing a chat, in order of precedence
+_CHAT_FIELDS = ["message", "edited_message", "channel_post", "edited_channel_post", "business_message",
+                "edited_business_message", "my_chat_member", "chat_member", "chat_join_request", "message_reaction",
+                "message_reaction_count", "chat_boost", "removed_chat_boost"]
+# update fields only containing a user, in order of precedence
+_USER_FIELDS = ["callback_query", "inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query",
+                "poll_answer"]
+
+# sent to a worker to make it exit after processing all queued updates
+_STOP = None
+
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+
+
+def get_update_chat_id(update: dict) -> int:
+    """
+    Finds the id of the chat an update belongs to
+    :param update: raw update
+    :return: the chat id, the user id for updates without a chat, or 0 if neither is present
+    """
+    for field in _CHAT_FIELDS:
+        value = update.get(field, None)
+        if value is not None:
+            return value["chat"]["id"]
+
+    for field in _USER_FIELDS:
+        value = update.get(field, None)
+        if value is None:
+            continue
+        message = value.get("message", None)
+        if message is not None:
+            return message["chat"]["id"]
+        user = value.get("from", value.get("user", None))
+        if user is not None:
+            return user["id"]
+
+    return 0
+
+
+def get_shard(chat_id: int, shard_count: int) -> int:
+    """
+    :param chat_id: chat id
+    :param shard_count: the number of shards
+    :return: the shard responsible for the given chat
+    """
+    # fibonacci hashing spreads consecutive (and negative) chat ids evenly
+    return ((chat_id * _HASH_MULTIPLIER) & _HASH_MASK) * shard_count >> 64
+
+
+class ShardedDispatcher:
+    """
+    Distributes updates over a fixed number of worker processes, based on their chat.
+    All updates of a chat are handled by the same worker, in the order they were received,
+    while updates of different chats are handled concurrently.
+
+    Each worker calls worker_factory (which has to be picklable, f.ex. a module level function)
+    to create its update handler, an async function taking a raw update dict.
+    Importing the module of worker_factory should register the same commands in every worker.
+    """
+
+    def __init__(self, worker_factory: callable, workers: int = None, worker_args: tuple = (),
+                 start_method: str = "spawn"):
+        """
+        Creates an instance
+        :param worker_factory: function creating the update handler of a worker
+        :param workers: the number of worker processes, defaults to the number of CPUs
+        :param worker_args: arguments passed to worker_factory
+        :param start_method: the multiprocessing start method
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.worker_factory = worker_factory
+        self.worker_args = worker_args
+        self.worker_count = workers
+        self._context = multiprocessing.get_context(start_method)
+        self._workers = []
+        self._pending = [0] * workers
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.processed = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: the number of forwarded updates that have not been handled yet
+        """
+        return sum(self._pending)
+
+    def start(self):
+        """
+        Starts all worker processes
+        """
+        if len(self._workers) > 0:
+            raise RuntimeError("Workers are already running")
+
+        for shard in range(self.worker_count):
+            connection, worker_connection = self._context.Pipe(duplex=True)
+            process = self._context.Process(
+                target=_worker_main, args=(self.worker_factory, self.worker_args, worker_connection),
+                name="telegram-click-worker-{}".format(shard), daemon=True)
+            process.start()
+            worker_connection.close()
+
+            reader = threading.Thread(target=self._read_acknowledgements, args=(shard, connection),
+                                      name="telegram-click-worker-{}-reader".format(shard), daemon=True)
+            reader.start()
+            self._workers.append((process, connection, reader))
+
+    def feed_raw_update(self, update: dict or Update):
+        """
+        Forwards an update to the worker responsible for its chat
+        :param update: raw update, or an aiogram Update
+        """
+        if isinstance(update, Update):
+            update = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        if len(self._workers) <= 0:
+            raise RuntimeError("Workers are not running")
+
+        shard = get_shard(get_update_chat_id(update), self.worker_count)
+        with self._lock:
+            self._pending[shard] += 1
+        self._workers[shard][1].send(update)
+
+    async def replay(self, updates: iter):
+        """
+        Forwards all given updates and waits until they have been handled
+        :param updates: raw updates, or aiogram Updates
+        """
+        for update in updates:
+            self.feed_raw_update(update)
+        await self.drain()
+
+    async def drain(self):
+        """
+        Waits until all forwarded updates have been handled
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self._wait_idle)
+
+    def stop(self, timeout: float = None):
+        """
+        Stops all workers after they have handled all forwarded updates
+        :param timeout: the maximum number of seconds to wait for each worker
+        """
+        workers, self._workers = self._workers, []
+        for shard, (process, connection, reader) in enumerate(workers):
+            try:
+                connection.send(_STOP)
+            except OSError as ex:
+                # f.ex. the worker has crashed, keep stopping the others
+                LOGGER.warning("Error stopping worker {} (pid {}): {!r}".format(shard, process.pid, ex))
+        for process, connection, reader in workers:
+            process.join(timeout)
+            reader.join(timeout)
+            connection.close()
+
+    def _wait_idle(self):
+        with self._idle:
+            self._idle.wait_for(lambda: self.pending <= 0)
+
+    def _read_acknowledgements(self, shard: int, connection):
+        while True:
+            try:
+                count = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._idle:
+                self._pending[shard] -= count
+                self.processed += count
+                self._idle.notify_all()
+
+        with self._idle:
+            # updates of a crashed worker will never be acknowledged
+            if self._pending[shard] > 0:
+                LOGGER.error("Worker {} exited with {} pending updates".format(shard, self._pending[shard]))
+                self._pending[shard] = 0
+            self._idle.notify_all()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class _ChatQueues:
+    """
+    Handles updates of each chat one after another, and different chats concurrently
+    """
+
+    def __init__(self, handler: callable, acknowledge: callable):
+        self.handler = handler
+        self.acknowledge = acknowledge
+        # chat id -> queued updates, only kept for chats with a running task
+        self._queues = {}
+        self._tasks = set()
+
+    def put(self, update: dict):
+        chat_id = get_update_chat_id(update)
+        queue = self._queues.get(chat_id, None)
+        if queue is not None:
+            queue.append(update)
+            return
+
+        queue = deque([update])
+        self._queues[chat_id] = queue
+        task = asyncio.get_running_loop().create_task(self._run(chat_id, queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def join(self):
+        while len(self._tasks) > 0:
+            await asyncio.gather(*self._tasks)
+
+    async def _run(self, chat_id: int, queue: deque):
+        try:
+            while len(queue) > 0:
+                update = queue[0]
+                try:
+                    await self.handler(update)
+                except Exception:
+                    LOGGER.exception("Error handling update {}".format(update.get("update_id", None)))
+                queue.popleft()
+                self.acknowledge()
+        finally:
+            del self._queues[chat_id]
+
+
+def _worker_main(worker_factory: callable, worker_args: tuple, connection):
+    """
+    Entry point of a worker process
+    """
+    asyncio.run(_worker_loop(worker_factory(*worker_args), connection))
+
+
+async def _worker_loop(handler: callable, connection):
+    loop = asyncio.get_running_loop()
+    received = asyncio.Queue()
+
+    def acknowledge():
+        connection.send(1)
+
+    def read():
+        while True:
+            try:
+                update = connection.recv()
+            except (EOFError, OSError):
+                update = _STOP
+            loop.call_soon_threadsafe(received.put_nowait, update)
+            if update is _STOP:
+                return
+
+    reader = threading.Thread(target=read, name="telegram-click-update-reader", daemon=True)
+    reader.start()
+
+    queues = _ChatQueues(handler, acknowledge)
+    while True:
+        update = await received.get()
+        if update is _STOP:
+            break
+        queues.put(update)
+
+    await queues.join()
+    connection.close()
@@ -0,0 +1,242 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import logging
+
+from aiogram.enums.parse_mode import ParseMode
+from aiogram.types import Message
+
+from telegram_click_aio.const import KEY_HIDDEN
+from telegram_click_aio.parser import split_command_from_args, split_command_from_target
+from telegram_click_aio.util import get_message_text
+
+LOGGER = logging.getLogger(__name__)
+
+# marks a trie node that completes a command name
+_TERMINAL = ""
+# the maximum number of suggestions and completions checked for an unknown command
+_MAX_CANDIDATES = 3
+
+
+def levenshtein_distance(a: str, b: str) -> int:
+    """
+    Calculates the edit distance between two strings
+    :param a: first string
+    :param b: second string
+    :return: the minimum number of single character insertions, deletions or substitutions
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+class _BkNode:
+    __slots__ = ["name", "children"]
+
+    def __init__(self, name: str):
+        self.name = name
+        # edit distance -> node
+        self.children = {}
+
+
+class CommandNameIndex:
+    """
+    Index over command names (and aliases) that answers prefix completion
+    using a trie, and typo suggestions using a BK-tree.
+    Both only visit a small part of all names for each query.
+    Names are matched case insensitive.
+    """
+
+    def __init__(self):
+        self._trie = {}
+        self._bk_root = None
+        # lowercase name -> command
+        self._commands = {}
+
+    def add(self, name: str, command: dict):
+        """
+        Adds a command name to the index
+        :param name: the command name (or alias)
+        :param command: the command entry of the name
+        """
+        key = name.lower()
+        if key in self._commands:
+            return
+        self._commands[key] = (name, command)
+
+        node = self._trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[_TERMINAL] = key
+
+        if self._bk_root is None:
+            self._bk_root = _BkNode(key)
+            return
+        node = self._bk_root
+        while True:
+            distance = levenshtein_distance(key, node.name)
+            child = node.children.get(distance, None)
+            if child is None:
+                node.children[distance] = _BkNode(key)
+                return
+            node = child
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __contains__(self, name: str):
+        return name.lower() in self._commands
+
+    def get(self, name: str) -> dict or None:
+        """
+        :param name: a command name (or alias)
+        :return: the command entry of the given name, or None
+        """
+        item = self._commands.get(name.lower(), None)
+        return None if item is None else item[1]
+
+    def complete(self, prefix: str, limit: int = None) -> [str]:
+        """
+        Finds command names starting with the given prefix
+        :param prefix: the prefix
+        :param limit: the maximum number of results
+        :return: matching command names, in alphabetical order
+        """
+        node = self._trie
+        for char in prefix.lower():
+            node = node.get(char, None)
+            if node is None:
+                return []
+
+        result = []
+        stack = [node]
+        while len(stack) > 0 and (limit is None or len(result) < limit):
+            node = stack.pop()
+            key = node.get(_TERMINAL, None)
+            if key is not None and self._is_suggestable(key):
+                result.append(self._commands[key][0])
+            # push in reverse order to visit children alphabetically
+            stack.extend(map(lambda x: x[1], sorted(filter(lambda x: x[0] != _TERMINAL, node.items()), reverse=True)))
+        return result
+
+    def suggest(self, name: str, max_distance: int = 2, limit: int = 3) -> [str]:
+        """
+        Finds command names similar to the given (possibly misspelled) name
+        :param name: the name to find similar command names for
+        :param max_distance: the maximum edit distance of a suggestion
+        :param limit: the maximum number of results
+        :return: similar command names, closest first
+        """
+        if self._bk_root is None:
+            return []
+
+        key = name.lower()
+        matches = []
+        stack = [self._bk_root]
+        while len(stack) > 0:
+            node = stack.pop()
+            distance = levenshtein_distance(key, node.name)
+            if distance <= max_distance and self._is_suggestable(node.name):
+                matches.append((distance, node.name))
+            # only subtrees within the triangle inequality bounds can contain matches
+            for child_distance, child in node.children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+        return list(map(lambda x: self._commands[x[1]][0], sorted(matches)[:limit]))
+
+    def _is_suggestable(self, key: str) -> bool:
+        # the index does not know the message, permissions and hidden callables are checked
+        # by generate_unknown_command_message()
+        return self._commands[key][1].get(KEY_HIDDEN, False) is not True
+
+
+# global index of all command names
+COMMAND_NAME_INDEX = CommandNameIndex()
+
+
+def complete_command(prefix: str, limit: int = None, registry=None) -> [str]:
+    """
+    Finds command names starting with the given prefix
+    :param prefix: the prefix (without "/")
+    :param limit: the maximum number of results
+    :param registry: the CommandRegistry to search, defaults to DEFAULT_REGISTRY
+    :return: matching command names, in alphabetical order
+    """
+    return _get_name_index(registry).complete(prefix, limit)
+
+
+def suggest_commands(name: str, max_distance: int = 2, limit: int = 3, registry=None) -> [str]:
+    """
+    Finds command names similar to the given (possibly misspelled) name
+    :param name: the name to find similar command names for (without "/")
+    :param max_distance: the maximum edit distance of a suggestion
+    :param limit: the maximum number of results
+    :param registry: the CommandRegistry to search, defaults to DEFAULT_REGISTRY
+    :return: similar command names, closest first
+    """
+    return _get_name_index(registry).suggest(name, max_distance, limit)
+
+
+async def generate_unknown_command_message(message: Message, parse_mode: str or None = ParseMode.MARKDOWN,
+                                           registry=None) -> str or None:
+    """
+    Generates a reply for an unknown command, suggesting the closest known command
+    the user of the message is allowed to see (like the help message does)
+    :param message: the message containing the unknown command
+    :param parse_mode: the telegram parse mode to format the message for, None for plain text
+    :param registry: the CommandRegistry to search, defaults to DEFAULT_REGISTRY
+    :return: the reply, or None if the text is not an unknown command
+    """
+    from telegram_click_aio import _is_visible
+    from telegram_click_aio.help import get_help_renderer
+
+    command, _ = split_command_from_args(get_message_text(message))
+    command, _ = split_command_from_target(None, command)
+    if command is None or not command.startswith("/") or len(command) <= 1:
+        return None
+
+    name = command[1:]
+    index = _get_name_index(registry)
+    if name in index:
+        return None
+
+    renderer = get_help_renderer(parse_mode)
+    # only the few closest candidates are checked, so permissions are evaluated for a handful of commands at most
+    candidates = suggest_commands(name, limit=_MAX_CANDIDATES, registry=registry)
+    candidates.extend(complete_command(name, limit=_MAX_CANDIDATES, registry=registry))
+    for candidate in candidates:
+        if await _is_visible(index.get(candidate), message):
+            return renderer.escape("Unknown command: /{}, did you mean /{}?".format(name, candidate))
+
+    return renderer.escape("Unknown command: /{}".format(name))
+
+
+def _get_name_index(registry) -> CommandNameIndex:
+    return COMMAND_NAME_INDEX if registry is None else registry.name_index
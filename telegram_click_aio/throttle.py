@@ -0,0 +1,151 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import logging
+import time
+from collections import OrderedDict
+
+from telegram_click_aio import Scope
+from telegram_click_aio.cache import CacheBackend
+
+LOGGER = logging.getLogger(__name__)
+
+# indexes into the bucket state list
+_TOKENS = 0
+_UPDATED = 1
+_NOTIFIED = 2
+
+
+class ThrottleResult:
+    """
+    Result of a throttle check
+    """
+    __slots__ = ["allowed", "retry_after", "first_in_window"]
+
+    def __init__(self, allowed: bool, retry_after: float = 0.0, first_in_window: bool = False):
+        """
+        :param allowed: whether the invocation may proceed
+        :param retry_after: seconds until the next invocation would be allowed
+        :param first_in_window: True for the first rejection since the bucket ran empty
+        """
+        self.allowed = allowed
+        self.retry_after = retry_after
+        self.first_in_window = first_in_window
+
+
+_ALLOWED = ThrottleResult(True)
+
+
+class Throttle:
+    """
+    Token bucket based rate limiting of command invocations.
+    Buckets are kept in a fixed size LRU, so memory usage is bounded
+    no matter how many users interact with the bot.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, scope: int or callable = Scope.USER, max_keys: int = 100000,
+                 cache: CacheBackend = None, name: str = None):
+        """
+        Creates an instance
+        :param rate: the number of invocations per second each scope key is refilled with
+        :param burst: the maximum number of invocations a scope key can perform at once
+        :param scope: a combination of Scope values, or a function that returns a key for a message
+        :param max_keys: the maximum number of buckets to keep, least recently used buckets are dropped first
+        :param cache: a cache backend to store buckets in instead, f.ex. to share them between processes
+        :param name: a name identifying this throttle in the cache backend, required if cache is set
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        if max_keys < 1:
+            raise ValueError("max_keys must be at least 1")
+        if cache is not None and name is None:
+            raise ValueError("name is required when using a cache backend")
+
+        self.rate = rate
+        self.burst = burst
+        self.scope = scope
+        self.max_keys = max_keys
+        self.cache = cache
+        self.name = name
+        self._buckets = OrderedDict()
+        self.throttled = 0
+
+    async def consume(self, key: any, now: float = None) -> ThrottleResult:
+        """
+        Takes a token from the bucket of the given key
+        :param key: scope key
+        :param now: the current time in seconds (monotonic, or wall clock time when using a cache backend),
+                    only useful for testing
+        :return: the result of the check
+        """
+        if self.cache is not None:
+            return await self._consume_shared(key, time.time() if now is None else now)
+
+        if now is None:
+            now = time.monotonic()
+
+        bucket = self._buckets.get(key, None)
+        if bucket is None:
+            bucket = [float(self.burst), now, False]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        return self._take(bucket, now)
+
+    async def _consume_shared(self, key: any, now: float) -> ThrottleResult:
+        result = None
+
+        def take(bucket: list or None) -> list:
+            nonlocal result
+            if bucket is None:
+                bucket = [float(self.burst), now, False]
+            result = self._take(bucket, now)
+            return bucket
+
+        # a bucket that is not touched until it is full again is equal to a missing one
+        await self.cache.update_async("throttle:{}:{!r}".format(self.name, key), take, ttl=self.burst / self.rate)
+        return result
+
+    def _take(self, bucket: list, now: float) -> ThrottleResult:
+        """
+        Refills the given bucket and takes a token from it
+        :param bucket: bucket state
+        :param now: the current time in seconds
+        :return: the result of the check
+        """
+        bucket[_TOKENS] = min(float(self.burst), bucket[_TOKENS] + max(0.0, now - bucket[_UPDATED]) * self.rate)
+        bucket[_UPDATED] = now
+
+        if bucket[_TOKENS] >= 1.0:
+            bucket[_TOKENS] -= 1.0
+            bucket[_NOTIFIED] = False
+            return _ALLOWED
+
+        self.throttled += 1
+        first_in_window = not bucket[_NOTIFIED]
+        bucket[_NOTIFIED] = True
+        return ThrottleResult(False, (1.0 - bucket[_TOKENS]) / self.rate, first_in_window)
+
+    def __len__(self):
+        return len(self._buckets)
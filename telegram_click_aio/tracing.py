@@ -0,0 +1,246 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from abc import abstractmethod
+from collections import deque
+
+LOGGER = logging.getLogger(__name__)
+
+# the innermost open span of the current context
+_CURRENT_SPAN = contextvars.ContextVar("telegram_click_aio_span", default=None)
+
+
+class Span:
+    """
+    A timed operation, f.ex. a single stage of a command invocation.
+    Use it as a context manager to make it the parent of all spans opened within.
+    """
+    __slots__ = ["tracer", "name", "trace_id", "span_id", "parent_id", "attributes", "start_time", "duration",
+                 "error", "_start", "_token"]
+
+    def __init__(self, tracer, name: str, attributes: dict):
+        """
+        :param tracer: the tracer to export the span with
+        :param name: the name of the span
+        :param attributes: additional information about the operation
+        """
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = "{:016x}".format(random.getrandbits(64))
+        self.trace_id = None
+        self.parent_id = None
+        self.start_time = None
+        self.duration = None
+        self.error = None
+        self._start = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: any):
+        """
+        Adds information about the operation
+        :param key: key
+        :param value: value
+        """
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        """
+        :return: a json serializable representation of this span
+        """
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def __enter__(self):
+        parent = _CURRENT_SPAN.get()
+        if parent is None:
+            self.trace_id = "{:016x}".format(random.getrandbits(64))
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self._token = _CURRENT_SPAN.set(self)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self._start
+        _CURRENT_SPAN.reset(self._token)
+        if exc_type is not None:
+            self.error = "{}: {}".format(exc_type.__name__, exc_val)
+        self.tracer.export(self)
+        return False
+
+
+class _NoopSpan:
+    """
+    Span used when tracing is disabled
+    """
+    __slots__ = []
+
+    def set_attribute(self, key: str, value: any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """
+    Receives all finished spans of a tracer
+    """
+
+    @abstractmethod
+    def export(self, span: Span):
+        """
+        Called when a span has finished
+        :param span: the span
+        """
+        raise NotImplementedError()
+
+
+class RingBufferExporter(SpanExporter):
+    """
+    Keeps the most recent spans in memory
+    """
+
+    def __init__(self, size: int = 10000):
+        """
+        Creates an instance
+        :param size: the maximum number of spans to keep
+        """
+        self.spans = deque(maxlen=size)
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class JsonLinesExporter(SpanExporter):
+    """
+    Appends spans to a file, one json object per line
+    """
+
+    def __init__(self, path: str):
+        """
+        Creates an instance
+        :param path: the file to append spans to
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    """
+    Creates spans and passes finished ones to its exporters
+    """
+
+    def __init__(self, exporters: [SpanExporter]):
+        """
+        Creates an instance
+        :param exporters: exporters to pass finished spans to
+        """
+        self.exporters = list(exporters)
+
+    def span(self, name: str, **attributes) -> Span:
+        """
+        :param name: the name of the span
+        :param attributes: additional information about the operation
+        :return: a new span, which has to be used as a context manager
+        """
+        return Span(self, name, attributes)
+
+    def export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                LOGGER.exception("Error exporting span {}".format(span.name))
+
+
+# the configured tracer, None if tracing is disabled
+_TRACER = None
+
+
+def set_tracer(tracer: Tracer or None):
+    """
+    Enables tracing of command invocations
+    :param tracer: the tracer to use, None to disable tracing
+    """
+    global _TRACER
+    _TRACER = tracer
+
+
+def get_tracer() -> Tracer or None:
+    """
+    :return: the configured tracer, None if tracing is disabled
+    """
+    return _TRACER
+
+
+def span(name: str, **attributes) -> Span or _NoopSpan:
+    """
+    Opens a span using the configured tracer, does nothing if tracing is disabled
+    :param name: the name of the span
+    :param attributes: additional information about the operation
+    :return: a span, which has to be used as a context manager
+    """
+    if _TRACER is None:
+        return _NOOP_SPAN
+    return Span(_TRACER, name, attributes)
+
+
+def get_current_span() -> Span or None:
+    """
+    :return: the innermost open span of the current context, None if there is none
+    """
+    return _CURRENT_SPAN.get()
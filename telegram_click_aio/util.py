@@ -21,6 +21,7 @@
 import logging
 
 from aiogram import Bot
+from aiogram.types import Message
 
 LOGGER = logging.getLogger(__name__)
 
@@ -62,6 +63,40 @@ def find_first(args: [], type: type):
             return arg
 
 
+def get_scope_key(scope: int or callable, message: Message, command_name: str = None) -> any:
+    """
+    Determines the key of the group a command invocation belongs to
+    :param scope: a combination of Scope values, or a function that returns a key for a message
+    :param message: the message that triggered the command
+    :param command_name: the name of the command
+    :return: hashable key
+    """
+    from telegram_click_aio import Scope
+
+    if callable(scope):
+        return scope(message)
+
+    key = ()
+    if scope & Scope.CHAT:
+        key += (message.chat.id,)
+    if scope & Scope.USER:
+        from_user = message.from_user
+        key += (from_user.id if from_user is not None else None,)
+    if scope & Scope.COMMAND:
+        key += (command_name,)
+    return key
+
+
+def get_message_text(message: Message) -> str or None:
+    """
+    :param message: a message
+    :return: the text of the message, or the caption of a message with an attachment
+    """
+    if message.text is not None:
+        return message.text
+    return message.caption
+
+
 def escape_for_markdown(text: str or None) -> str:
     """
     Escapes text to use as plain text in a markdown document
@@ -18,8 +18,98 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import os
 import unittest
+from types import SimpleNamespace
+
+from aiogram.client.telegram import TelegramAPIServer
 
 
 class TestBase(unittest.IsolatedAsyncioTestCase):
     pass
+
+
+class BotMock:
+    """
+    Minimal stand-in for an aiogram Bot, recording all sent messages
+    """
+
+    def __init__(self, username: str = "mybot"):
+        from aiogram.types import User
+
+        self.id = 1
+        self.me = User(id=self.id, is_bot=True, first_name="Bot", username=username)
+        self.sent_messages = []
+        self.menu_updates = []
+        # (chat id, user id) -> chat member status
+        self.chat_members = {}
+        self.api_calls = []
+        # file id -> path of the file on disk, like a local Bot API server
+        self.files = {}
+        self.session = SimpleNamespace(api=TelegramAPIServer.from_base("http://localhost:8081", is_local=True))
+
+    async def __call__(self, method, **kwargs):
+        # api methods without a dedicated stand-in, f.ex. CallbackQuery.answer()
+        self.api_calls.append(type(method).__name__)
+
+    async def get_me(self):
+        self.api_calls.append("get_me")
+        return self.me
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        from aiogram.types import ChatMemberMember, ChatMemberOwner, User
+
+        self.api_calls.append("get_chat_member")
+        user = User(id=user_id, is_bot=False, first_name="Max")
+        if self.chat_members.get((chat_id, user_id), None) == "creator":
+            return ChatMemberOwner(user=user, is_anonymous=False)
+        return ChatMemberMember(user=user)
+
+    async def get_file(self, file_id: str):
+        from aiogram.types import File
+
+        self.api_calls.append("get_file")
+        path = self.files[file_id]
+        return File(file_id=file_id, file_unique_id=file_id, file_size=os.path.getsize(path), file_path=path)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.sent_messages.append({"chat_id": chat_id, "text": text, **kwargs})
+
+    async def set_my_commands(self, commands: list, **kwargs):
+        self.menu_updates.append({"commands": commands, **kwargs})
+
+    async def delete_my_commands(self, **kwargs):
+        self.menu_updates.append({"commands": [], **kwargs})
+
+
+def create_message_mock(text: str, bot: BotMock = None, chat_id: int = -12345678, chat_type: str = "private",
+                        message_id: int = 12345678, user_id: int = 12345678, username: str = "myusername",
+                        document=None):
+    """
+    Helper method to create a "Message" object with mocked content, bound to a mocked bot
+    """
+    import datetime
+    import aiogram
+
+    user = aiogram.types.User(
+        id=user_id,
+        username=username,
+        first_name="Max",
+        is_bot=False
+    )
+
+    chat = aiogram.types.Chat(id=chat_id, type=chat_type)
+    date = datetime.datetime.now().timestamp()
+
+    message = aiogram.types.Message(
+        message_id=message_id,
+        date=date,
+        chat=chat,
+        from_user=user,
+        # the command of a message with a document is its caption
+        text=text if document is None else None,
+        caption=text if document is not None else None,
+        document=document,
+    )
+
+    return message.as_(bot if bot is not None else BotMock())
@@ -0,0 +1,160 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import datetime
+import multiprocessing
+import os
+import tempfile
+
+from aiogram.types import ChatMemberUpdated, ChatMemberMember, ChatMemberOwner
+
+from telegram_click_aio.cache import LruCache, SqliteCache, get_cache, set_cache, get_bot_username, \
+    get_chat_member_status, get_last_known_chat_member_status, on_chat_member_updated
+from telegram_click_aio.permission import GROUP_CREATOR, group_creator
+from telegram_click_aio.throttle import Throttle
+from tests import TestBase, BotMock, create_message_mock
+
+
+def _increment(value: int or None) -> int:
+    return (value or 0) + 1
+
+
+def _use_shared_cache(cache: SqliteCache) -> int:
+    """
+    Runs inside of a worker process
+    :return: the number of allowed throttle invocations
+    """
+    for _ in range(100):
+        cache.update("counter", _increment)
+
+    throttle = Throttle(rate=0.001, burst=10, cache=cache, name="shared")
+
+    async def consume() -> int:
+        return sum([(await throttle.consume(("user",))).allowed for _ in range(10)])
+
+    return asyncio.run(consume())
+
+
+class CacheTest(TestBase):
+
+    def setUp(self):
+        self._original_cache = get_cache()
+        set_cache(LruCache())
+
+    def tearDown(self):
+        set_cache(self._original_cache)
+
+    async def test_lru_cache(self):
+        cache = LruCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=-1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("b", "default"), "default")
+
+        cache.set("c", 3)
+        cache.set("d", 4)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("a"))
+
+        self.assertEqual(cache.update("c", _increment), 4)
+        self.assertEqual(cache.update("e", _increment), 1)
+        cache.delete("e")
+        self.assertIsNone(cache.get("e"))
+
+    async def test_sqlite_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SqliteCache(os.path.join(directory, "cache.db"))
+            cache.set("a", {"value": [1, 2]})
+            cache.set("b", 2, ttl=-1)
+            self.assertEqual(cache.get("a"), {"value": [1, 2]})
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(len(cache), 1)
+
+            self.assertEqual(cache.update("a", lambda x: x["value"]), [1, 2])
+            cache.clear()
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+
+    async def test_sqlite_cache_async(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SqliteCache(os.path.join(directory, "cache.db"))
+            await cache.set_async("a", 1)
+            self.assertEqual(await cache.get_async("a"), 1)
+            self.assertEqual(await cache.update_async("a", _increment), 2)
+            self.assertEqual(await cache.get_async("b", "default"), "default")
+            cache.close()
+
+    async def test_sqlite_cache_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SqliteCache(os.path.join(directory, "cache.db"))
+            with multiprocessing.get_context("spawn").Pool(3) as pool:
+                allowed = pool.map(_use_shared_cache, [cache] * 3)
+
+            self.assertEqual(cache.get("counter"), 300)
+            # all processes share the same token bucket
+            self.assertEqual(sum(allowed), 10)
+            cache.close()
+
+    async def test_bot_identity(self):
+        bot = BotMock()
+        for _ in range(3):
+            self.assertEqual(await get_bot_username(bot), "mybot")
+        self.assertEqual(bot.api_calls, ["get_me"])
+
+    async def test_chat_member_permission(self):
+        bot = BotMock()
+        bot.chat_members[(-100, 1)] = "creator"
+
+        creator_message = create_message_mock("/test", bot=bot, chat_id=-100, chat_type="group", user_id=1)
+        member_message = create_message_mock("/test", bot=bot, chat_id=-100, chat_type="group", user_id=2)
+        permission = group_creator(cache_ttl=60)
+        for _ in range(3):
+            self.assertTrue(await permission.evaluate(creator_message))
+            self.assertFalse(await permission.evaluate(member_message))
+
+        self.assertEqual(bot.api_calls, ["get_chat_member", "get_chat_member"])
+        self.assertEqual(await get_chat_member_status(bot, -100, 1, ttl=60), "creator")
+
+        # the predefined permission looks up the status every time
+        self.assertTrue(await GROUP_CREATOR.evaluate(creator_message))
+        self.assertEqual(len(bot.api_calls), 3)
+
+    async def test_chat_member_updated(self):
+        bot = BotMock()
+        bot.chat_members[(-101, 1)] = "creator"
+        message = create_message_mock("/test", bot=bot, chat_id=-101, chat_type="group", user_id=1)
+        permission = group_creator(cache_ttl=60)
+        self.assertTrue(await permission.evaluate(message))
+
+        # demoted
+        user = message.from_user
+        update = ChatMemberUpdated(
+            chat=message.chat,
+            from_user=user,
+            date=datetime.datetime.now(),
+            old_chat_member=ChatMemberOwner(user=user, is_anonymous=False),
+            new_chat_member=ChatMemberMember(user=user),
+        ).as_(bot)
+        del bot.chat_members[(-101, 1)]
+        await on_chat_member_updated(update)
+
+        self.assertFalse(await permission.evaluate(message))
+        self.assertEqual(await get_last_known_chat_member_status(bot, -101, 1), "member")
@@ -0,0 +1,115 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from array import array
+
+from aiogram.types import CallbackQuery, Message
+
+from telegram_click_aio.argument import Argument, Flag
+from telegram_click_aio.callback import CallbackDataCodec, encode_callback_data, decode_callback_data
+from telegram_click_aio.decorator import command
+from telegram_click_aio.parser import ArgumentSpec
+from tests import TestBase, BotMock, create_message_mock
+
+ARGUMENTS = [
+    Argument(name="user-id", description="some id", type=int, example="1"),
+    Argument(name="ratio", description="some ratio", type=float, example="0.5"),
+    Argument(name="text", description="some text", example="text", optional=True, default="default"),
+    Flag(name="force", description="some flag"),
+]
+
+
+@command(name="callback_ban", description="Callback command", arguments=ARGUMENTS)
+async def callback_command(message: Message, user_id: int, ratio: float, text: str, force: bool):
+    assert isinstance(message, Message)
+    return message.from_user.id, user_id, ratio, text, force
+
+
+class CallbackTest(TestBase):
+
+    async def test_roundtrip(self):
+        spec = ArgumentSpec(ARGUMENTS)
+        codec = CallbackDataCodec(spec)
+
+        payload = codec.encode({"user_id": -1234567890, "ratio": 0.25, "text": "äöü ✓", "force": True})
+        self.assertEqual(codec.decode(payload), {"user-id": -1234567890, "ratio": 0.25, "text": "äöü ✓", "force": True})
+
+        payload = codec.encode({"user_id": 5, "ratio": 1.0})
+        self.assertEqual(codec.decode(payload), {"user-id": 5, "ratio": 1.0, "text": "default", "force": False})
+
+        self.assertRaises(ValueError, codec.encode, {"ratio": 1.0})
+        self.assertRaises(ValueError, codec.decode, payload[:-2])
+
+    async def test_list_roundtrip(self):
+        arguments = [
+            Argument(name="ids", description="some ids", type=int, example="1 2", nargs="+"),
+            Argument(name="tags", description="some tags", example="a b", nargs="*"),
+        ]
+        codec = CallbackDataCodec(ArgumentSpec(arguments))
+
+        decoded = codec.decode(codec.encode({"ids": [-1, 2, 300], "tags": ["a", "b"]}))
+        self.assertEqual(decoded["ids"], array("q", [-1, 2, 300]))
+        self.assertEqual(decoded["tags"], ["a", "b"])
+
+    async def test_compact(self):
+        data = encode_callback_data("callback_ban", user_id=123456789, ratio=0.5, force=True)
+
+        self.assertTrue(data.startswith("callback_ban:"))
+        self.assertLessEqual(len(data), 64)
+        self.assertRaises(ValueError, encode_callback_data, "callback_ban", user_id=1, ratio=1.0, text="x" * 64)
+
+    async def test_outdated_schema(self):
+        data = encode_callback_data("callback_ban", user_id=1, ratio=1.0)
+        changed_spec = ArgumentSpec(ARGUMENTS[:2] + [
+            Argument(name="text", description="some text", type=int, example="1", optional=True)
+        ])
+
+        self.assertRaises(ValueError, decode_callback_data, changed_spec, data)
+
+    async def test_decorator(self):
+        bot = BotMock()
+        message = create_message_mock("keyboard", bot=bot, user_id=1)
+        query = CallbackQuery(
+            id="1",
+            chat_instance="1",
+            from_user=message.from_user.model_copy(update={"id": 42}),
+            message=message,
+            data=encode_callback_data("callback_ban", user_id=7, ratio=0.1),
+        ).as_(bot)
+
+        self.assertEqual(await callback_command(query), (42, 7, 0.1, "default", False))
+        self.assertEqual(bot.api_calls.count("AnswerCallbackQuery"), 1)
+
+    async def test_other_command_ignored(self):
+        bot = BotMock()
+        message = create_message_mock("keyboard", bot=bot, user_id=1)
+
+        def create_query(data: str) -> CallbackQuery:
+            return CallbackQuery(id="1", chat_instance="1", from_user=message.from_user, message=message,
+                                 data=data).as_(bot)
+
+        # a button of another command is neither decoded nor answered
+        self.assertIsNone(await callback_command(create_query("other:AQ")))
+        self.assertEqual(bot.sent_messages, [])
+        self.assertEqual(bot.api_calls, [])
+
+        # invalid data of this command is a validation error, and the query is answered anyway
+        self.assertIsNone(await callback_command(create_query("callback_ban:AQ")))
+        self.assertEqual(len(bot.sent_messages), 1)
+        self.assertEqual(bot.api_calls.count("AnswerCallbackQuery"), 1)
@@ -0,0 +1,155 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import time
+
+from telegram_click_aio.cache import LruCache, get_cache, set_cache
+from telegram_click_aio.circuit_breaker import CircuitBreaker, CircuitState
+from telegram_click_aio.permission import group_admin, PermissionFallback
+from telegram_click_aio.permission.user import _GroupAdmin, _GroupCreator
+from telegram_click_aio.permission.cached import CachedPermission
+from tests import TestBase, BotMock, create_message_mock
+
+
+class FlakyBotMock(BotMock):
+    """
+    Bot whose chat member lookups hang until healthy is set
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.healthy = True
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        if not self.healthy:
+            self.api_calls.append("get_chat_member")
+            await asyncio.sleep(3600)
+        return await super().get_chat_member(chat_id, user_id)
+
+
+class CircuitBreakerTest(TestBase):
+
+    def setUp(self):
+        self._original_cache = get_cache()
+        set_cache(LruCache())
+
+    def tearDown(self):
+        set_cache(self._original_cache)
+
+    async def test_state_transitions(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        # only a single probe is let through
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    async def test_deadline_fallbacks(self):
+        bot = FlakyBotMock()
+        bot.healthy = False
+        message = create_message_mock("/cmd", bot=bot, chat_type="group")
+
+        start = time.monotonic()
+        self.assertFalse(await group_admin(timeout=0.05).evaluate(message))
+        self.assertTrue(await group_admin(timeout=0.05, fallback=PermissionFallback.ALLOW).evaluate(message))
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    async def test_cached_fallback(self):
+        bot = FlakyBotMock()
+        message = create_message_mock("/cmd", bot=bot, chat_type="group")
+        bot.chat_members[(message.chat.id, message.from_user.id)] = "creator"
+        permission = _GroupCreator(timeout=0.05, fallback=PermissionFallback.CACHED)
+
+        # nothing is known yet
+        bot.healthy = False
+        self.assertFalse(await permission.evaluate(message))
+
+        bot.healthy = True
+        self.assertTrue(await permission.evaluate(message))
+
+        # the last known status is still available
+        bot.healthy = False
+        self.assertTrue(await permission.evaluate(message))
+        self.assertFalse(await _GroupCreator(timeout=0.05).evaluate(message))
+
+    async def test_circuit_breaker_stops_lookups(self):
+        bot = FlakyBotMock()
+        bot.healthy = False
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        permission = _GroupAdmin(timeout=0.01, circuit_breaker=breaker)
+
+        for user_id in range(5):
+            message = create_message_mock("/cmd", bot=bot, chat_type="group", user_id=user_id)
+            self.assertFalse(await permission.evaluate(message))
+
+        self.assertEqual(bot.api_calls.count("get_chat_member"), 2)
+        self.assertEqual(breaker.rejected, 3)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+    async def test_cancelled_probe(self):
+        bot = FlakyBotMock()
+        bot.healthy = False
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        message = create_message_mock("/cmd", bot=bot, chat_type="group")
+        permission = _GroupAdmin(timeout=0.01, circuit_breaker=breaker)
+
+        self.assertFalse(await permission.evaluate(message))
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+        # the probe is cancelled, f.ex. by a command timeout
+        await asyncio.sleep(0.02)
+        task = asyncio.ensure_future(permission.evaluate(message))
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+
+        # lookups resume
+        bot.healthy = True
+        self.assertFalse(await permission.evaluate(message))
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    async def test_fallback_not_cached(self):
+        bot = FlakyBotMock()
+        bot.healthy = False
+        message = create_message_mock("/cmd", bot=bot, chat_type="group")
+        permission = CachedPermission(group_admin(timeout=0.01, fallback=PermissionFallback.ALLOW))
+
+        self.assertTrue(await permission.evaluate(message))
+        bot.healthy = True
+        self.assertFalse(await permission.evaluate(message))
+        self.assertFalse(await permission.evaluate(message))
+        self.assertEqual(permission.hits, 1)
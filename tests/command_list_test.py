@@ -0,0 +1,79 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from telegram_click_aio import generate_command_list, generate_command_list_page, COMMAND_LIST
+from telegram_click_aio.const import KEY_NAMES
+from telegram_click_aio.decorator import command
+from telegram_click_aio.permission import NOBODY
+from tests import TestBase, create_message_mock
+
+
+def _create_commands():
+    for idx in range(30):
+        @command(name="paged_{:02d}".format(idx), description="Paged command number {} ".format(idx) + "x" * 200)
+        async def paged_command(message):
+            pass
+
+    @command(name="paged_hidden", description="Hidden command", hidden=True)
+    async def paged_hidden_command(message):
+        pass
+
+    @command(name="paged_nobody", description="Nobody may use this", permissions=NOBODY)
+    async def paged_nobody_command(message):
+        pass
+
+
+_create_commands()
+
+
+class CommandListTest(TestBase):
+
+    async def test_pages_respect_max_length(self):
+        message = create_message_mock("/help")
+        max_length = 1000
+
+        first = await generate_command_list_page(message, page=0, max_length=max_length)
+        self.assertGreater(first.page_count, 1)
+        self.assertFalse(first.has_previous)
+        self.assertTrue(first.has_next)
+
+        texts = []
+        for page in range(first.page_count):
+            result = await generate_command_list_page(message, page=page, max_length=max_length)
+            self.assertLessEqual(len(result.text), max_length)
+            texts.append(result.text)
+
+        # all pages together equal the full list
+        self.assertEqual("\n\n".join(texts), await generate_command_list(message))
+        self.assertNotIn("paged_hidden", "".join(texts))
+        self.assertNotIn("paged_nobody", "".join(texts))
+
+    async def test_page_clamped(self):
+        message = create_message_mock("/help")
+
+        result = await generate_command_list_page(message, page=1000, max_length=1000)
+        self.assertEqual(result.page, result.page_count - 1)
+        self.assertFalse(result.has_next)
+
+    async def test_single_page(self):
+        message = create_message_mock("/help")
+        result = await generate_command_list_page(message, max_length=1000000)
+
+        self.assertEqual(result.page_count, 1)
+        self.assertEqual(len(list(filter(lambda x: x[KEY_NAMES][0].startswith("paged_"), COMMAND_LIST))), 32)
@@ -0,0 +1,168 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+
+from telegram_click_aio import Scope
+from telegram_click_aio.argument import Argument
+from telegram_click_aio.concurrency import ConcurrencyLimiter, LaneScheduler
+from telegram_click_aio.decorator import command
+from telegram_click_aio.error_handler import ErrorHandler
+from tests import TestBase, BotMock, create_message_mock
+
+RELEASE_EVENT = asyncio.Event()
+
+
+class OverloadErrorHandler(ErrorHandler):
+    def __init__(self):
+        self.overloaded = 0
+
+    async def on_overload(self, message, limiter) -> bool:
+        self.overloaded += 1
+        return True
+
+
+OVERLOAD_ERROR_HANDLER = OverloadErrorHandler()
+
+
+@command(name="concurrency_limited",
+         description="Limited concurrency",
+         max_concurrency=1,
+         max_queue=1,
+         concurrency_scope=Scope.CHAT,
+         error_handler=OVERLOAD_ERROR_HANDLER)
+async def concurrency_limited_command(message):
+    await RELEASE_EVENT.wait()
+
+
+LANE_EVENTS = []
+
+
+@command(name="lane_ordered",
+         description="Runs one after another per chat",
+         arguments=[Argument(name="delay", description="seconds to sleep", type=float, example="0.1")],
+         lane=Scope.CHAT)
+async def lane_ordered_command(message, delay: float):
+    LANE_EVENTS.append(("start", message.chat.id, message.message_id))
+    await asyncio.sleep(delay)
+    LANE_EVENTS.append(("end", message.chat.id, message.message_id))
+
+
+class ConcurrencyTest(TestBase):
+
+    async def test_limiter_queue(self):
+        limiter = ConcurrencyLimiter(max_concurrency=2, max_queue=1)
+        key = ()
+
+        self.assertTrue(await limiter.acquire(key))
+        self.assertTrue(await limiter.acquire(key))
+
+        waiting = asyncio.create_task(limiter.acquire(key))
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.in_flight_for(key), 2)
+        self.assertEqual(limiter.queued_for(key), 1)
+
+        # queue is full
+        self.assertFalse(await limiter.acquire(key))
+        self.assertEqual(limiter.rejected, 1)
+
+        limiter.release(key)
+        self.assertTrue(await waiting)
+        self.assertEqual(limiter.in_flight, 2)
+        self.assertEqual(limiter.queued, 0)
+
+        limiter.release(key)
+        limiter.release(key)
+        self.assertEqual(limiter.in_flight, 0)
+        # idle keys are not kept
+        self.assertEqual(len(limiter._slots), 0)
+
+    async def test_limiter_cancel_waiting(self):
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=5)
+        key = ()
+
+        self.assertTrue(await limiter.acquire(key))
+        waiting = asyncio.create_task(limiter.acquire(key))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+
+        self.assertEqual(limiter.queued, 0)
+        limiter.release(key)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(len(limiter._slots), 0)
+
+    async def test_decorator_scope(self):
+        RELEASE_EVENT.clear()
+        bot = BotMock()
+        limiter = concurrency_limited_command.concurrency_limiter
+
+        tasks = [asyncio.create_task(concurrency_limited_command(
+            create_message_mock("/concurrency_limited", bot=bot, chat_id=1))) for _ in range(2)]
+        other_chat = asyncio.create_task(concurrency_limited_command(
+            create_message_mock("/concurrency_limited", bot=bot, chat_id=2)))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(limiter.in_flight, 2)
+        self.assertEqual(limiter.queued, 1)
+
+        await concurrency_limited_command(create_message_mock("/concurrency_limited", bot=bot, chat_id=1))
+        self.assertEqual(OVERLOAD_ERROR_HANDLER.overloaded, 1)
+
+        RELEASE_EVENT.set()
+        await asyncio.gather(*tasks, other_chat)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_lanes(self):
+        LANE_EVENTS.clear()
+        bot = BotMock()
+        lanes = lane_ordered_command.lane_scheduler
+
+        tasks = [
+            # the first message takes longest, but has to finish first in its chat
+            asyncio.create_task(lane_ordered_command(
+                create_message_mock("/lane_ordered 0.05", bot=bot, chat_id=1, message_id=1))),
+            asyncio.create_task(lane_ordered_command(
+                create_message_mock("/lane_ordered 0", bot=bot, chat_id=1, message_id=2))),
+            asyncio.create_task(lane_ordered_command(
+                create_message_mock("/lane_ordered 0", bot=bot, chat_id=2, message_id=3))),
+        ]
+        await asyncio.sleep(0.01)
+        self.assertEqual(lanes.lanes, 1)
+        await asyncio.gather(*tasks)
+
+        chat_events = list(filter(lambda x: x[1] == 1, LANE_EVENTS))
+        self.assertEqual(chat_events, [("start", 1, 1), ("end", 1, 1), ("start", 1, 2), ("end", 1, 2)])
+        # the other chat did not wait
+        self.assertLess(LANE_EVENTS.index(("end", 2, 3)), LANE_EVENTS.index(("end", 1, 1)))
+        # idle lanes are evicted
+        self.assertEqual(lanes.lanes, 0)
+
+    async def test_lane_queue_limit(self):
+        lanes = LaneScheduler(max_queue=1)
+        self.assertTrue(await lanes.acquire((1,)))
+        waiting = asyncio.create_task(lanes.acquire((1,)))
+        await asyncio.sleep(0)
+        self.assertFalse(await lanes.acquire((1,)))
+
+        lanes.release((1,))
+        self.assertTrue(await waiting)
+        lanes.release((1,))
+        self.assertEqual(lanes.lanes, 0)
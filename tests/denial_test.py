@@ -0,0 +1,128 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import datetime
+
+from aiogram.types import ChatMemberUpdated, ChatMemberMember, ChatMemberOwner, Message
+
+from telegram_click_aio.cache import get_last_known_chat_member_status
+from telegram_click_aio.decorator import command
+from telegram_click_aio.denial import DenialCache
+from telegram_click_aio.permission import group_creator
+from telegram_click_aio.permission.base import Permission
+from telegram_click_aio.registry import CommandRegistry
+from tests import TestBase, BotMock, create_message_mock
+
+DENIAL_REGISTRY = CommandRegistry()
+DENIAL_CACHE = DenialCache(ttl=60)
+
+
+class AllowListPermission(Permission):
+    def __init__(self):
+        self.user_ids = set()
+        self.evaluations = 0
+
+    async def evaluate(self, message: Message) -> bool:
+        self.evaluations += 1
+        return message.from_user.id in self.user_ids
+
+
+PERMISSION = AllowListPermission()
+
+
+@command(name="protected", description="Protected command", permissions=PERMISSION,
+         denial_cache=DENIAL_CACHE, registry=DENIAL_REGISTRY)
+async def protected_command(message):
+    return message.from_user.id
+
+
+@command(name="creator_only", description="Creator only command", permissions=group_creator(timeout=1),
+         denial_cache=DENIAL_CACHE, registry=DENIAL_REGISTRY)
+async def creator_only_command(message):
+    return message.from_user.id
+
+
+class BrokenBotMock(BotMock):
+    """
+    Bot whose chat member lookups fail until broken is unset
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.broken = True
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        if self.broken:
+            self.api_calls.append("get_chat_member")
+            raise ConnectionError("Bot API unavailable")
+        return await super().get_chat_member(chat_id, user_id)
+
+
+class DenialCacheTest(TestBase):
+
+    async def test_repeated_denials(self):
+        bot = BotMock()
+        message = create_message_mock("/protected", bot=bot, chat_id=-1, user_id=1)
+        evaluations = PERMISSION.evaluations
+        hits = DENIAL_CACHE.hits
+
+        for _ in range(5):
+            self.assertIsNone(await protected_command(message))
+
+        self.assertEqual(PERMISSION.evaluations - evaluations, 1)
+        self.assertEqual(DENIAL_CACHE.hits - hits, 4)
+
+        # other users and chats are evaluated separately
+        other = create_message_mock("/protected", bot=bot, chat_id=-2, user_id=1)
+        self.assertIsNone(await protected_command(other))
+        self.assertEqual(PERMISSION.evaluations - evaluations, 2)
+
+    async def test_invalidated_by_membership_change(self):
+        bot = BotMock()
+        message = create_message_mock("/protected", bot=bot, chat_id=-3, user_id=3)
+        self.assertIsNone(await protected_command(message))
+
+        PERMISSION.user_ids.add(3)
+        self.assertIsNone(await protected_command(message))
+
+        user = message.from_user
+        update = ChatMemberUpdated(
+            chat=message.chat,
+            from_user=user,
+            date=datetime.datetime.now(),
+            old_chat_member=ChatMemberMember(user=user),
+            new_chat_member=ChatMemberOwner(user=user, is_anonymous=False),
+        ).as_(bot)
+        await DENIAL_CACHE.on_chat_member_updated(update)
+
+        self.assertEqual(await protected_command(message), 3)
+        # the cached member status is updated as well
+        self.assertEqual(await get_last_known_chat_member_status(bot, -3, 3), "creator")
+
+    async def test_fallback_denials_not_remembered(self):
+        bot = BrokenBotMock()
+        bot.chat_members[(-4, 4)] = "creator"
+        message = create_message_mock("/creator_only", bot=bot, chat_id=-4, chat_type="group", user_id=4)
+
+        # denied by the fallback during the outage
+        self.assertIsNone(await creator_only_command(message))
+
+        bot.broken = False
+        self.assertEqual(await creator_only_command(message), 4)
+        self.assertEqual(bot.api_calls.count("get_chat_member"), 2)
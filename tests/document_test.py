@@ -0,0 +1,113 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import os
+import tempfile
+
+from aiogram.types import Document
+
+from telegram_click_aio.argument import Argument, DocumentArgument
+from telegram_click_aio.decorator import command
+from telegram_click_aio.document import DocumentStream, DocumentTooLargeError
+from telegram_click_aio.error_handler import ErrorHandler
+from telegram_click_aio.registry import CommandRegistry
+from tests import TestBase, BotMock, create_message_mock
+
+DOCUMENT_REGISTRY = CommandRegistry()
+
+
+class DocumentErrorHandler(ErrorHandler):
+    def __init__(self):
+        self.validation_errors = []
+
+    async def on_validation_error(self, message, exception: Exception, help_message: str) -> bool:
+        self.validation_errors.append(exception)
+        return True
+
+
+DOCUMENT_ERROR_HANDLER = DocumentErrorHandler()
+
+
+@command(name="import", description="Import a file", registry=DOCUMENT_REGISTRY,
+         error_handler=DOCUMENT_ERROR_HANDLER,
+         arguments=[
+             Argument(name="name", description="some name", example="data"),
+             DocumentArgument(name="file", description="the file to import", max_size=1024, chunk_size=16),
+         ])
+async def import_command(message, name: str, file: DocumentStream):
+    chunks = [chunk async for chunk in file]
+    return name, file.file_name, chunks
+
+
+class DocumentTest(TestBase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.bot = BotMock()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _document(self, content: bytes, file_id: str = "doc") -> Document:
+        path = os.path.join(self.directory.name, file_id)
+        with open(path, "wb") as f:
+            f.write(content)
+        self.bot.files[file_id] = path
+        return Document(file_id=file_id, file_unique_id=file_id, file_name="data.csv", file_size=len(content))
+
+    async def test_streamed_in_chunks(self):
+        content = bytes(range(40))
+        message = create_message_mock("/import data", bot=self.bot, document=self._document(content))
+
+        name, file_name, chunks = await import_command(message)
+
+        self.assertEqual(name, "data")
+        self.assertEqual(file_name, "data.csv")
+        self.assertEqual(list(map(len, chunks)), [16, 16, 8])
+        self.assertEqual(b"".join(chunks), content)
+
+    async def test_mmap(self):
+        content = b"a,b\n1,2\n"
+        stream = DocumentStream(self.bot, self._document(content))
+
+        mapped = await stream.to_mmap()
+        try:
+            self.assertEqual(mapped[:], content)
+        finally:
+            mapped.close()
+
+    async def test_size_limit(self):
+        message = create_message_mock("/import data", bot=self.bot, document=self._document(b"x" * 2048))
+
+        self.assertIsNone(await import_command(message))
+        self.assertIn("size limit", str(DOCUMENT_ERROR_HANDLER.validation_errors[-1]))
+        self.assertNotIn("get_file", self.bot.api_calls)
+
+        # the reported size can not be trusted
+        document = self._document(b"x" * 2048, file_id="wrong_size").model_copy(update={"file_size": 10})
+        stream = DocumentStream(self.bot, document, max_size=1024)
+        with self.assertRaises(DocumentTooLargeError):
+            await stream.read()
+
+    async def test_missing_document(self):
+        message = create_message_mock("/import data", bot=self.bot)
+
+        self.assertIsNone(await import_command(message))
+        error = DOCUMENT_ERROR_HANDLER.validation_errors[-1]
+        self.assertEqual(error.errors[0].argument, "file")
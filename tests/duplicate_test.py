@@ -0,0 +1,68 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from telegram_click_aio.decorator import command
+from telegram_click_aio.duplicate import DuplicateFilter
+from tests import TestBase, create_message_mock
+
+
+@command(name="deduplicated", description="Deduplicated command", deduplicate=True)
+async def deduplicated_command(message):
+    return True
+
+
+class DuplicateTest(TestBase):
+
+    async def test_window(self):
+        duplicate_filter = DuplicateFilter(window=10)
+        message = create_message_mock("/test", message_id=1)
+
+        self.assertFalse(duplicate_filter.is_duplicate(message, now=0))
+        self.assertTrue(duplicate_filter.is_duplicate(message, now=5))
+        self.assertEqual(duplicate_filter.suppressed, 1)
+
+        # other messages are not affected
+        self.assertFalse(duplicate_filter.is_duplicate(create_message_mock("/test", message_id=2), now=5))
+
+        # forgotten after the window has passed
+        self.assertFalse(duplicate_filter.is_duplicate(message, now=11))
+        self.assertEqual(len(duplicate_filter), 2)
+
+    async def test_edited_message(self):
+        duplicate_filter = DuplicateFilter()
+        message = create_message_mock("/test", message_id=1)
+        edited = message.model_copy(update={"edit_date": 12345})
+
+        self.assertFalse(duplicate_filter.is_duplicate(message))
+        self.assertFalse(duplicate_filter.is_duplicate(edited))
+        self.assertTrue(duplicate_filter.is_duplicate(edited))
+
+    async def test_bounded_size(self):
+        duplicate_filter = DuplicateFilter(max_size=10)
+        for message_id in range(100):
+            duplicate_filter.is_duplicate(create_message_mock("/test", message_id=message_id), now=0)
+
+        self.assertEqual(len(duplicate_filter), 10)
+
+    async def test_decorator(self):
+        message = create_message_mock("/deduplicated", message_id=1)
+
+        self.assertTrue(await deduplicated_command(message))
+        self.assertIsNone(await deduplicated_command(message))
+        self.assertEqual(deduplicated_command.duplicate_filter.suppressed, 1)
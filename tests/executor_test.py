@@ -0,0 +1,144 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from telegram_click_aio.argument import Argument
+from telegram_click_aio.decorator import command
+from telegram_click_aio.executor import CommandExecutor
+from tests import TestBase, BotMock, create_message_mock
+
+THREAD_EXECUTOR = CommandExecutor(ThreadPoolExecutor(max_workers=1))
+PROCESS_EXECUTOR = CommandExecutor(ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")))
+
+RELEASE_EVENT = threading.Event()
+
+
+@command(name="executor_thread",
+         description="Runs in a thread",
+         arguments=[Argument(name="value", description="some value", type=int, example="1")],
+         executor=THREAD_EXECUTOR)
+def executor_thread_command(message, value: int, reply):
+    reply.send("value: {}".format(value))
+    return threading.current_thread().name
+
+
+@command(name="executor_blocking", description="Blocks a thread", executor=THREAD_EXECUTOR)
+def executor_blocking_command(message):
+    RELEASE_EVENT.wait(timeout=5)
+
+
+@command(name="executor_process",
+         description="Runs in a process",
+         arguments=[Argument(name="value", description="some value", type=int, example="1")],
+         executor=PROCESS_EXECUTOR)
+def executor_process_command(message, value: int, reply):
+    import os
+    reply.send("first")
+    reply.send("second")
+    return os.getpid(), value * 2
+
+
+class ExecutorTest(TestBase):
+
+    async def test_thread_executor(self):
+        bot = BotMock()
+        message = create_message_mock("/executor_thread 5", bot=bot)
+
+        thread_name = await executor_thread_command(message)
+
+        self.assertNotEqual(thread_name, threading.current_thread().name)
+        self.assertEqual(len(bot.sent_messages), 1)
+        self.assertEqual(bot.sent_messages[0]["text"], "value: 5")
+        self.assertEqual(THREAD_EXECUTOR.pending, 0)
+
+    async def test_queue_depth(self):
+        RELEASE_EVENT.clear()
+        tasks = [asyncio.create_task(executor_blocking_command(create_message_mock("/executor_blocking")))
+                 for _ in range(3)]
+        while THREAD_EXECUTOR.pending < 3:
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(THREAD_EXECUTOR.active, 1)
+        self.assertEqual(THREAD_EXECUTOR.queue_depth, 2)
+
+        RELEASE_EVENT.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(THREAD_EXECUTOR.queue_depth, 0)
+
+    async def test_cancelled_handler_stays_pending(self):
+        RELEASE_EVENT.clear()
+        task = asyncio.create_task(executor_blocking_command(create_message_mock("/executor_blocking")))
+        while THREAD_EXECUTOR.pending < 1:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # the handler still occupies the worker
+        self.assertEqual(THREAD_EXECUTOR.pending, 1)
+
+        RELEASE_EVENT.set()
+        while THREAD_EXECUTOR.pending > 0:
+            await asyncio.sleep(0.01)
+
+    async def test_process_executor(self):
+        import os
+        bot = BotMock()
+        message = create_message_mock("/executor_process 21", bot=bot)
+
+        pid, value = await executor_process_command(message)
+
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(value, 42)
+        self.assertEqual(list(map(lambda x: x["text"], bot.sent_messages)), ["first", "second"])
+
+    async def test_process_executor_bound_message(self):
+        from aiogram.types import Update
+
+        class UnpicklableBotMock(BotMock):
+            def __init__(self):
+                super().__init__()
+                self.lock = threading.Lock()
+
+        bot = UnpicklableBotMock()
+        update = Update.model_validate({
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 2, "is_bot": False, "first_name": "Max"},
+                "text": "/executor_process 2",
+            }
+        }, context={"bot": bot})
+
+        pid, value = await executor_process_command(update.message)
+
+        self.assertEqual(value, 4)
+        self.assertEqual(len(bot.sent_messages), 2)
+
+    def test_async_handler_rejected(self):
+        async def handler(message):
+            pass
+
+        decorator = command(name="executor_async", description="Async handler", executor=THREAD_EXECUTOR)
+        self.assertRaises(ValueError, decorator, handler)
@@ -0,0 +1,90 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from aiogram.enums.parse_mode import ParseMode
+
+from telegram_click_aio.argument import Argument, Flag
+from telegram_click_aio.error_handler import DefaultErrorHandler
+from telegram_click_aio.help import render_help_message, generate_help_message, HelpRenderer, RenderedHelp
+from tests import TestBase, BotMock, create_message_mock
+
+NAMES = ["my_command", "m"]
+DESCRIPTION = "Does things."
+ARGUMENTS = [
+    Argument(name=["some_name", "n"], description="The (new) name", optional=True, default="a_b", example="Max"),
+    Flag(name="flag", description="Some flag"),
+]
+
+
+class HelpTest(TestBase):
+
+    async def test_markdown_unchanged(self):
+        help_message = render_help_message(NAMES, DESCRIPTION, ARGUMENTS)
+
+        self.assertIsInstance(help_message, str)
+        self.assertEqual(help_message, await generate_help_message(NAMES, DESCRIPTION, ARGUMENTS))
+        self.assertEqual(help_message.for_parse_mode(ParseMode.MARKDOWN), help_message)
+        self.assertTrue(help_message.startswith("/my\\_command (/m) [[FLAGS]] [[ARGS]]"))
+
+    async def test_markdown_v2(self):
+        text = render_help_message(NAMES, DESCRIPTION, ARGUMENTS).for_parse_mode(ParseMode.MARKDOWN_V2)
+
+        self.assertIn("/my\\_command \\(/m\\) \\[FLAGS\\] \\[ARGS\\]", text)
+        self.assertIn("Does things\\.", text)
+        self.assertIn("The \\(new\\) name\t\\(`a_b`\\)", text)
+        self.assertIn("`/my_command —flag Max`", text)
+
+    async def test_html(self):
+        text = render_help_message(["cmd"], "a < b", ARGUMENTS).for_parse_mode(ParseMode.HTML)
+
+        self.assertIn("a &lt; b", text)
+        self.assertIn("<code>—some_name</code>, <code>—n</code>", text)
+
+    async def test_plain_text(self):
+        text = render_help_message(NAMES, DESCRIPTION, ARGUMENTS).for_parse_mode(None)
+
+        self.assertTrue(text.startswith("/my_command (/m) [FLAGS] [ARGS]"))
+        self.assertNotIn("`", text)
+
+    async def test_custom_renderer(self):
+        class UpperCaseRenderer(HelpRenderer):
+            parse_mode = "upper"
+
+            def escape(self, text: str or None) -> str:
+                return str(text).upper()
+
+        help_message = RenderedHelp({
+            ParseMode.MARKDOWN: "",
+            UpperCaseRenderer.parse_mode: UpperCaseRenderer().render_help(NAMES, DESCRIPTION, [])
+        })
+        self.assertEqual(help_message.for_parse_mode("upper"), "/MY_COMMAND (/M)\n  DOES THINGS.")
+        self.assertRaises(ValueError, help_message.for_parse_mode, ParseMode.HTML)
+
+    async def test_error_handler_parse_mode(self):
+        bot = BotMock()
+        error_handler = DefaultErrorHandler(parse_mode=ParseMode.MARKDOWN_V2)
+        help_message = render_help_message(NAMES, DESCRIPTION, ARGUMENTS)
+
+        await error_handler.on_validation_error(create_message_mock("/my_command", bot=bot),
+                                                ValueError("Invalid value 'x'"), help_message)
+
+        sent = bot.sent_messages[0]
+        self.assertEqual(sent["parse_mode"], ParseMode.MARKDOWN_V2)
+        self.assertIn("`Invalid value 'x'`", sent["text"])
+        self.assertIn(help_message.for_parse_mode(ParseMode.MARKDOWN_V2), sent["text"])
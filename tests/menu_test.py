@@ -0,0 +1,101 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import os
+import tempfile
+
+from aiogram.types import BotCommandScopeDefault, BotCommandScopeAllPrivateChats
+
+from telegram_click_aio.decorator import command
+from telegram_click_aio.menu import sync_command_menu, commands_with_permissions
+from telegram_click_aio.permission import PRIVATE_CHAT, NOBODY
+from tests import TestBase, BotMock
+
+
+@command(name="menu_public", description="Public command")
+async def menu_public_command(message):
+    pass
+
+
+@command(name="menu_private", description="Private command", permissions=PRIVATE_CHAT)
+async def menu_private_command(message):
+    pass
+
+
+@command(name="menu_hidden", description="Hidden command", hidden=True)
+async def menu_hidden_command(message):
+    pass
+
+
+@command(name="menu_nobody", description="Nobody may use this", permissions=NOBODY)
+async def menu_nobody_command(message):
+    pass
+
+
+SCOPES = {
+    BotCommandScopeDefault(): commands_with_permissions(),
+    BotCommandScopeAllPrivateChats(): commands_with_permissions(PRIVATE_CHAT),
+}
+
+
+class MenuTest(TestBase):
+
+    async def test_scope_commands(self):
+        bot = BotMock()
+        await sync_command_menu(bot, scopes=SCOPES, language_code="test_scope_commands")
+
+        default_commands = list(map(lambda x: x.command, bot.menu_updates[0]["commands"]))
+        private_commands = list(map(lambda x: x.command, bot.menu_updates[1]["commands"]))
+
+        self.assertIn("menu_public", default_commands)
+        self.assertNotIn("menu_private", default_commands)
+        self.assertIn("menu_public", private_commands)
+        self.assertIn("menu_private", private_commands)
+        for commands in [default_commands, private_commands]:
+            self.assertNotIn("menu_hidden", commands)
+            self.assertNotIn("menu_nobody", commands)
+
+    async def test_unchanged_scopes_are_skipped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state_file = os.path.join(directory, "menu.json")
+
+            bot = BotMock()
+            updated = await sync_command_menu(bot, scopes=SCOPES, state_file=state_file)
+            self.assertEqual(len(updated), 2)
+            self.assertEqual(len(bot.menu_updates), 2)
+
+            # simulate a restart
+            bot = BotMock()
+            updated = await sync_command_menu(bot, scopes=SCOPES, state_file=state_file)
+            self.assertEqual(len(updated), 0)
+            self.assertEqual(len(bot.menu_updates), 0)
+
+            # a changed scope is uploaded again
+            bot = BotMock()
+            scopes = dict(SCOPES)
+            scopes[BotCommandScopeDefault()] = commands_with_permissions(PRIVATE_CHAT)
+            updated = await sync_command_menu(bot, scopes=scopes, state_file=state_file)
+            self.assertEqual(updated, [BotCommandScopeDefault()])
+
+    async def test_empty_scope_is_deleted(self):
+        bot = BotMock()
+        await sync_command_menu(bot, scopes={BotCommandScopeDefault(): lambda x: False},
+                                language_code="test_empty_scope_is_deleted")
+
+        self.assertEqual(bot.menu_updates[0]["commands"], [])
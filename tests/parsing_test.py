@@ -18,8 +18,11 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+from array import array
+
 from telegram_click_aio.argument import Argument, Flag
-from telegram_click_aio.parser import parse_telegram_command, split_into_tokens
+from telegram_click_aio.parser import parse_telegram_command, split_into_tokens, ArgumentSpec, \
+    parse_telegram_command_result, ParseErrorCode
 from tests import TestBase
 
 
@@ -245,3 +248,165 @@ class ParserTest(TestBase):
 
         single_test = "'\\'single quoted with \\'escaped single quote\\''"
         self.assertIn("''single quoted with 'escaped single quote''", split_into_tokens(single_test))
+
+    async def test_unique_prefix(self):
+        arg1 = Argument(
+            name="description",
+            description="str description",
+            example="text"
+        )
+        flag1 = Flag(
+            name=["verbose", "v"],
+            description="some flag description",
+        )
+        flag2 = Flag(
+            name="version",
+            description="some flag description",
+        )
+
+        bot_username = "mybot"
+        expected_args = [
+            arg1,
+            flag1,
+            flag2,
+        ]
+
+        command, parsed_args = parse_telegram_command(bot_username, '/command --desc text --verb', expected_args)
+        self.assertEqual(parsed_args["description"], "text")
+        self.assertTrue(parsed_args["verbose"])
+        self.assertFalse(parsed_args["version"])
+
+        command, parsed_args = parse_telegram_command(bot_username, '/command --d=text --versi', expected_args)
+        self.assertEqual(parsed_args["description"], "text")
+        self.assertFalse(parsed_args["verbose"])
+        self.assertTrue(parsed_args["version"])
+
+    async def test_ambiguous_prefix(self):
+        flag1 = Flag(
+            name="verbose",
+            description="some flag description",
+        )
+        flag2 = Flag(
+            name="version",
+            description="some flag description",
+        )
+
+        bot_username = "mybot"
+        expected_args = ArgumentSpec([
+            flag1,
+            flag2,
+        ])
+
+        with self.assertRaises(ValueError) as context:
+            parse_telegram_command(bot_username, '/command --ver', expected_args)
+        self.assertIn("--verbose, --version", str(context.exception))
+
+        # an exact name is never treated as a prefix
+        self.assertRaises(ValueError, parse_telegram_command, bot_username, '/command --verbose --verbose',
+                          expected_args)
+
+        self.assertEqual(expected_args.resolve_prefix("--verb", "verb"), (flag1, None))
+        self.assertEqual(expected_args.resolve_prefix("--x", "x"), (None, None))
+        arg, ambiguity = expected_args.resolve_prefix("—ver", "ver")
+        self.assertIsNone(arg)
+        self.assertIn("—verbose, —version", ambiguity)
+
+    async def test_parse_result_errors(self):
+        int_arg = Argument(
+            name="count",
+            description="int description",
+            type=int,
+            example="5"
+        )
+        str_arg = Argument(
+            name="text",
+            description="str description",
+            example="v"
+        )
+
+        bot_username = "mybot"
+        command_line = '/command abc --unknown'
+        command, result = parse_telegram_command_result(bot_username, command_line, [int_arg, str_arg])
+
+        self.assertEqual(command, "command")
+        self.assertFalse(result.ok)
+        self.assertEqual(list(map(lambda x: x.code, result.errors)), [
+            ParseErrorCode.UNKNOWN_ARGUMENT,
+            ParseErrorCode.INVALID_VALUE,
+            ParseErrorCode.MISSING_ARGUMENT,
+        ])
+
+        unknown, invalid, missing = result.errors
+        self.assertEqual(command_line[unknown.span[0]:unknown.span[1]], "--unknown")
+        self.assertEqual(invalid.argument, int_arg.name)
+        self.assertEqual(command_line[invalid.span[0]:invalid.span[1]], "abc")
+        self.assertEqual(missing.argument, str_arg.name)
+        self.assertIsNone(missing.span)
+
+        # the raising api reports the first error
+        with self.assertRaises(ValueError) as context:
+            parse_telegram_command(bot_username, command_line, [int_arg, str_arg])
+        self.assertEqual(str(context.exception), unknown.message)
+
+    async def test_parse_result_unclosed_quote(self):
+        arg1 = Argument(
+            name="a",
+            description="str description",
+            example="v"
+        )
+
+        command_line = '/command  "two words'
+        _, result = parse_telegram_command_result("mybot", command_line, [arg1])
+
+        self.assertEqual(len(result.errors), 1)
+        error = result.errors[0]
+        self.assertEqual(error.code, ParseErrorCode.UNCLOSED_QUOTE)
+        self.assertEqual(command_line[error.span[0]:error.span[1]], '"two words')
+
+    async def test_list_arguments(self):
+        ids = Argument(
+            name="ids",
+            description="int list description",
+            type=int,
+            example="1 2",
+            nargs="+"
+        )
+        reason = Argument(
+            name="reason",
+            description="str description",
+            example="spam"
+        )
+        expected_args = [ids, reason]
+
+        command, parsed_args = parse_telegram_command("mybot", "/ban 1 2 3 spam", expected_args)
+        self.assertEqual(parsed_args[ids.name], array("q", [1, 2, 3]))
+        self.assertEqual(parsed_args[reason.name], "spam")
+
+        command, parsed_args = parse_telegram_command("mybot", "/ban --reason spam --ids 4 5", expected_args)
+        self.assertEqual(parsed_args[ids.name], array("q", [4, 5]))
+
+        command_line = "/ban 1 x 3 spam"
+        _, result = parse_telegram_command_result("mybot", command_line, expected_args)
+        error = result.errors[0]
+        self.assertEqual(error.code, ParseErrorCode.INVALID_VALUE)
+        self.assertEqual(command_line[error.span[0]:error.span[1]], "x")
+
+        _, result = parse_telegram_command_result("mybot", "/ban spam", expected_args)
+        self.assertEqual(result.errors[0].code, ParseErrorCode.MISSING_ARGUMENT)
+
+    async def test_fixed_list_argument(self):
+        point = Argument(
+            name="point",
+            description="float list description",
+            type=float,
+            example="1 2",
+            nargs=2,
+            validator=lambda x: all(map(lambda y: 0 <= y <= 1, x))
+        )
+
+        command, parsed_args = parse_telegram_command("mybot", "/move 0.5 50%", [point])
+        self.assertEqual(parsed_args[point.name], array("d", [0.5, 0.5]))
+
+        self.assertRaises(ValueError, parse_telegram_command, "mybot", "/move 0.5", [point])
+        # the validator checks all values at once
+        self.assertRaises(ValueError, parse_telegram_command, "mybot", "/move 0.5 2", [point])
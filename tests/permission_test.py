@@ -18,11 +18,13 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import asyncio
 import datetime
+import operator
 
 from aiogram.types import Message
 
-from telegram_click_aio.permission.base import Permission
+from telegram_click_aio.permission.base import Permission, MergedPermission, adaptive, get_permission_statistics
 from tests import TestBase
 
 
@@ -36,6 +38,19 @@ class FalsePermission(Permission):
         return False
 
 
+class CountingPermission(Permission):
+    def __init__(self, result: bool, delay: float = 0):
+        self.result = result
+        self.delay = delay
+        self.evaluations = 0
+
+    async def evaluate(self, message: Message):
+        self.evaluations += 1
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        return self.result
+
+
 def _create_message_mock(chat_id: int = -12345678, chat_type: str = "private", message_id: int = 12345678,
                          user_id: int = 12345678, username: str = "myusername") -> Message:
     """
@@ -124,3 +139,124 @@ class PermissionTest(TestBase):
         self.assertFalse(await not_permission.evaluate(None))
         not_permission = ~ FalsePermission()
         self.assertTrue(await not_permission.evaluate(None))
+
+    async def test_permission_short_circuit(self):
+        second = CountingPermission(True)
+        self.assertTrue(await (TruePermission() | second).evaluate(None))
+        self.assertFalse(await (FalsePermission() & second).evaluate(None))
+        self.assertEqual(second.evaluations, 0)
+
+    async def test_permission_adaptive(self):
+        slow = CountingPermission(False, delay=0.01)
+        rarely = CountingPermission(False)
+        fast = CountingPermission(True)
+        permission = adaptive(MergedPermission([slow, rarely, fast], operator.or_), reorder_interval=5)
+
+        for _ in range(10):
+            self.assertTrue(await permission.evaluate(None))
+
+        # the cheap permission that is always granted is evaluated first
+        self.assertIs(permission.permissions[0], fast)
+        self.assertLess(slow.evaluations, 10)
+
+        statistics = get_permission_statistics(permission)
+        self.assertEqual(statistics["op"], "or_")
+        self.assertEqual(len(statistics["children"]), 3)
+        self.assertGreater(statistics["children"][0]["stats"]["evaluations"], 0)
+
+    async def test_permission_adaptive_unmeasured(self):
+        cheap = CountingPermission(True)
+        slow = CountingPermission(True, delay=0.01)
+        permission = adaptive(MergedPermission([cheap, slow], operator.or_), reorder_interval=2)
+
+        for _ in range(6):
+            self.assertTrue(await permission.evaluate(None))
+
+        # nothing is known about a permission that has never been evaluated, so it is not moved ahead
+        self.assertEqual(permission.permissions, [cheap, slow])
+        self.assertEqual(slow.evaluations, 0)
+
+    async def test_permission_adaptive_copies(self):
+        from telegram_click_aio.permission import GROUP_ADMIN
+
+        original = MergedPermission([CountingPermission(False), CountingPermission(True)], operator.or_)
+        permission = adaptive(~original & GROUP_ADMIN, reorder_interval=1)
+        await permission.evaluate(None)
+
+        self.assertIsNone(original.reorder_interval)
+        self.assertEqual(original.stats, {})
+        self.assertIsNone(GROUP_ADMIN.reorder_interval)
+        self.assertEqual(permission.reorder_interval, 1)
+
+    async def test_permission_cache_scope(self):
+        from telegram_click_aio import Scope
+        from telegram_click_aio.permission import PRIVATE_CHAT, USER_ID, GROUP_ADMIN
+
+        self.assertEqual(PRIVATE_CHAT.cache_scope, Scope.CHAT)
+        self.assertEqual(USER_ID(1).cache_scope, Scope.USER)
+        self.assertEqual(GROUP_ADMIN.cache_scope, Scope.CHAT | Scope.USER)
+        self.assertEqual((PRIVATE_CHAT | ~USER_ID(1)).cache_scope, Scope.CHAT | Scope.USER)
+        # custom permissions are not reusable unless they declare a scope
+        self.assertIsNone((PRIVATE_CHAT & TruePermission()).cache_scope)
+
+        message = _create_message_mock(chat_id=5, user_id=7)
+        self.assertEqual(USER_ID(1).cache_key(message), (7,))
+        self.assertEqual(GROUP_ADMIN.cache_key(message), (5, 7))
+
+    async def test_permission_cached(self):
+        from telegram_click_aio import Scope
+        from telegram_click_aio.permission.cached import CachedPermission
+
+        class UserPermission(CountingPermission):
+            cache_scope = Scope.USER
+
+        inner = UserPermission(True)
+        permission = CachedPermission(inner)
+
+        for chat_id in range(3):
+            self.assertTrue(await permission.evaluate(_create_message_mock(chat_id=chat_id, user_id=1)))
+        self.assertTrue(await permission.evaluate(_create_message_mock(user_id=2)))
+
+        self.assertEqual(inner.evaluations, 2)
+        self.assertEqual(permission.hits, 2)
+        self.assertRaises(ValueError, CachedPermission, TruePermission())
+
+    async def test_permission_user_id_allowlist(self):
+        import os
+        import tempfile
+        from telegram_click_aio.permission import USER_ID_ALLOWLIST
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "allowlist.txt")
+            with open(path, "w") as f:
+                f.write("# admins\n300\n100\n\n200  # bob\n100\n")
+
+            permission = USER_ID_ALLOWLIST(path, reload_interval=0)
+            self.assertEqual(len(permission), 3)
+            self.assertGreater(permission.footprint(), 0)
+            self.assertTrue(await permission.evaluate(_create_message_mock(user_id=200)))
+            self.assertFalse(await permission.evaluate(_create_message_mock(user_id=150)))
+            self.assertFalse(await permission.evaluate(_create_message_mock(user_id=400)))
+
+            # replace the file atomically
+            with open(path + ".tmp", "w") as f:
+                f.write("150\n")
+            os.replace(path + ".tmp", path)
+            os.utime(path, ns=(0, 1))
+
+            # the evaluation noticing the change does not wait for the reload
+            self.assertFalse(await permission.evaluate(_create_message_mock(user_id=150)))
+            while permission.reloads < 2:
+                await asyncio.sleep(0.01)
+            self.assertTrue(await permission.evaluate(_create_message_mock(user_id=150)))
+            self.assertFalse(await permission.evaluate(_create_message_mock(user_id=200)))
+
+            # invalid files are ignored
+            with open(path, "w") as f:
+                f.write("not an id\n")
+            os.utime(path, ns=(0, 2))
+            self.assertTrue(await permission.evaluate(_create_message_mock(user_id=150)))
+            while permission._reloading:
+                await asyncio.sleep(0.01)
+            self.assertTrue(await permission.evaluate(_create_message_mock(user_id=150)))
+            self.assertEqual(permission.reloads, 2)
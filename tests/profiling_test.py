@@ -0,0 +1,98 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import json
+import os
+import pstats
+import tempfile
+
+from telegram_click_aio.argument import Argument
+from telegram_click_aio.decorator import command
+from telegram_click_aio.profiling import CommandProfiler, set_profiler, get_profiler
+from telegram_click_aio.registry import CommandRegistry
+from tests import TestBase, create_message_mock
+
+PROFILING_REGISTRY = CommandRegistry()
+
+
+def _slow_function(seconds: float):
+    import time
+    time.sleep(seconds)
+
+
+@command(name="profiled",
+         description="Profiled command",
+         arguments=[Argument(name="seconds", description="seconds to take", type=float, example="0.1")],
+         registry=PROFILING_REGISTRY)
+async def profiled_command(message, seconds: float):
+    _slow_function(seconds)
+    await asyncio.sleep(0)
+
+
+class ProfilingTest(TestBase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+
+    def tearDown(self):
+        set_profiler(None)
+        self._directory.cleanup()
+
+    async def test_slow_invocations(self):
+        profiler = CommandProfiler(self.directory, sample_rate=1.0, threshold=0.05)
+        set_profiler(profiler)
+
+        await profiled_command(create_message_mock("/profiled 0"))
+        self.assertEqual(profiler.sampled, 1)
+        self.assertEqual(profiler.profiles(), [])
+
+        await profiled_command(create_message_mock("/profiled 0.1"))
+        profiles = profiler.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertIn("profiled", os.path.basename(profiles[0]))
+
+        stats = pstats.Stats(profiles[0])
+        self.assertTrue(any(map(lambda x: x[2] == "_slow_function", stats.stats.keys())))
+
+        with open(profiles[0][:-len(".pstats")] + ".json") as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata["command"], "profiled")
+        self.assertEqual(metadata["arguments"], {"seconds": 0.1})
+        self.assertGreaterEqual(metadata["duration"], 0.1)
+
+    async def test_rotation(self):
+        profiler = CommandProfiler(self.directory, sample_rate=1.0, threshold=0, max_files=3)
+        set_profiler(profiler)
+
+        for _ in range(5):
+            await profiled_command(create_message_mock("/profiled 0"))
+
+        self.assertEqual(profiler.written, 5)
+        self.assertEqual(len(profiler.profiles()), 3)
+        self.assertEqual(len(os.listdir(self.directory)), 6)
+
+    async def test_sample_rate(self):
+        profiler = CommandProfiler(self.directory, sample_rate=0, threshold=0)
+        set_profiler(profiler)
+
+        await profiled_command(create_message_mock("/profiled 0"))
+        self.assertEqual(profiler.sampled, 0)
+        self.assertIsNone(get_profiler().begin())
@@ -0,0 +1,115 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from telegram_click_aio import generate_command_list
+from telegram_click_aio.argument import Argument, Flag, DocumentArgument
+from telegram_click_aio.const import KEY_ARGUMENT_SPEC, KEY_HELP_MESSAGE, KEY_NAMES
+from telegram_click_aio.decorator import command
+from telegram_click_aio.registry import CommandRegistry, DEFAULT_REGISTRY, get_compiled_command_count
+from telegram_click_aio.suggestion import suggest_commands
+from tests import TestBase, create_message_mock
+
+
+def _create_bot_commands(registry: CommandRegistry, extra: bool = False):
+    @command(name="registry_echo",
+             description="Echo the given text",
+             arguments=[
+                 Argument(name="text", description="the text", example="hello"),
+                 Flag(name="loud", description="shout"),
+             ],
+             registry=registry)
+    async def echo_command(message, text: str, loud: bool):
+        return text.upper() if loud else text
+
+    if extra:
+        @command(name="registry_extra", description="Only available on some bots", registry=registry)
+        async def extra_command(message):
+            pass
+
+    return echo_command
+
+
+FIRST_BOT_REGISTRY = CommandRegistry()
+SECOND_BOT_REGISTRY = CommandRegistry()
+ECHO_COMMAND = _create_bot_commands(FIRST_BOT_REGISTRY, extra=True)
+_create_bot_commands(SECOND_BOT_REGISTRY)
+
+
+class RegistryTest(TestBase):
+
+    def test_isolated_registries(self):
+        self.assertEqual(len(FIRST_BOT_REGISTRY), 2)
+        self.assertEqual(len(SECOND_BOT_REGISTRY), 1)
+        self.assertNotIn("registry_echo", DEFAULT_REGISTRY)
+        self.assertIsNone(SECOND_BOT_REGISTRY.get("registry_extra"))
+        self.assertEqual(suggest_commands("registry_extr", registry=FIRST_BOT_REGISTRY), ["registry_extra"])
+        self.assertEqual(suggest_commands("registry_extr", registry=SECOND_BOT_REGISTRY), [])
+
+    def test_name_clash(self):
+        self.assertRaises(ValueError, _create_bot_commands, SECOND_BOT_REGISTRY)
+
+        # names are looked up ignoring case, so they must be unique ignoring case as well
+        registry = CommandRegistry()
+        registry.check_name_clashes(["stat"])
+        registry.add({KEY_NAMES: ["Stat"]})
+        self.assertRaises(ValueError, registry.check_name_clashes, ["stat"])
+        self.assertRaises(ValueError, CommandRegistry().check_name_clashes, ["stat", "STAT"])
+
+    def test_shared_compilation(self):
+        count = get_compiled_command_count()
+        registries = []
+        for _ in range(10):
+            registry = CommandRegistry()
+            _create_bot_commands(registry)
+            registries.append(registry)
+
+        self.assertEqual(get_compiled_command_count(), count)
+        first = FIRST_BOT_REGISTRY.get("registry_echo")
+        for registry in registries:
+            entry = registry.get("registry_echo")
+            self.assertIsNot(entry, first)
+            self.assertIs(entry[KEY_ARGUMENT_SPEC], first[KEY_ARGUMENT_SPEC])
+            self.assertIs(entry[KEY_HELP_MESSAGE], first[KEY_HELP_MESSAGE])
+
+    def test_compilation_respects_document_limits(self):
+        specs = []
+        for max_size in [1024, 10 * 1024 * 1024]:
+            registry = CommandRegistry()
+
+            @command(name="registry_import", description="Import a file", registry=registry,
+                     arguments=[DocumentArgument(name="file", description="the file", max_size=max_size)])
+            async def import_command(message, file):
+                pass
+
+            specs.append(registry.get("registry_import")[KEY_ARGUMENT_SPEC])
+
+        self.assertEqual(list(map(lambda x: x.attachments[0].max_size, specs)), [1024, 10 * 1024 * 1024])
+
+    async def test_command_list(self):
+        message = create_message_mock("/help")
+        text = await generate_command_list(message, registry=FIRST_BOT_REGISTRY)
+        self.assertIn("registry\\_echo", text)
+        self.assertIn("registry\\_extra", text)
+        self.assertNotIn("registry\\_extra", await generate_command_list(message, registry=SECOND_BOT_REGISTRY))
+        self.assertEqual(await generate_command_list(message, registry=CommandRegistry()),
+                         "This bot does not have any commands.")
+
+    async def test_invoke(self):
+        message = create_message_mock("/registry_echo --loud hello")
+        self.assertEqual(await ECHO_COMMAND(message), "HELLO")
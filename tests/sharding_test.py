@@ -0,0 +1,126 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+import os
+import random
+import tempfile
+
+from aiogram.types import Update
+
+from telegram_click_aio.argument import Argument
+from telegram_click_aio.decorator import command
+from telegram_click_aio.registry import CommandRegistry
+from telegram_click_aio.sharding import ShardedDispatcher, get_shard, get_update_chat_id
+from tests import TestBase, BotMock
+
+SHARDING_REGISTRY = CommandRegistry()
+
+
+@command(name="record",
+         description="Records the sequence number of a message",
+         arguments=[Argument(name="seq", description="sequence number", type=int, example="1")],
+         registry=SHARDING_REGISTRY)
+async def record_command(message, seq: int, output_dir: str):
+    # give other chats the chance to overtake
+    await asyncio.sleep(random.random() * 0.005)
+    with open(os.path.join(output_dir, str(os.getpid())), "a") as f:
+        f.write("{} {}\n".format(message.chat.id, seq))
+
+
+def create_worker(output_dir: str):
+    bot = BotMock()
+
+    async def handle(update: dict):
+        update = Update.model_validate(update, context={"bot": bot})
+        await record_command(update.message, output_dir=output_dir)
+
+    return handle
+
+
+def create_update(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Max"},
+            "text": text,
+        }
+    }
+
+
+class ShardingTest(TestBase):
+
+    async def test_chat_id(self):
+        self.assertEqual(get_update_chat_id(create_update(1, -100123, "/record 1")), -100123)
+        self.assertEqual(get_update_chat_id({"update_id": 1, "inline_query": {"id": "1", "from": {"id": 5}}}), 5)
+        self.assertEqual(get_update_chat_id({"update_id": 1}), 0)
+
+    async def test_shard_distribution(self):
+        counts = [0] * 4
+        for chat_id in range(-1000, 1000):
+            shard = get_shard(chat_id, 4)
+            self.assertEqual(shard, get_shard(chat_id, 4))
+            counts[shard] += 1
+        for count in counts:
+            self.assertGreater(count, 400)
+
+    async def test_stop_after_worker_crash(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            dispatcher = ShardedDispatcher(create_worker, workers=2, worker_args=(output_dir,))
+            dispatcher.start()
+            crashed, _, _ = dispatcher._workers[0]
+            other, _, _ = dispatcher._workers[1]
+            crashed.kill()
+            crashed.join()
+
+            dispatcher.stop(timeout=10)
+            self.assertFalse(other.is_alive())
+
+    async def test_per_chat_order(self):
+        chats = list(range(1, 17))
+        messages_per_chat = 25
+        updates = []
+        for seq in range(messages_per_chat):
+            for chat_id in chats:
+                updates.append(create_update(len(updates) + 1, chat_id, "/record {}".format(seq)))
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            with ShardedDispatcher(create_worker, workers=2, worker_args=(output_dir,)) as dispatcher:
+                await dispatcher.replay(updates)
+                self.assertEqual(dispatcher.pending, 0)
+                self.assertEqual(dispatcher.processed, len(updates))
+
+            worker_files = os.listdir(output_dir)
+            self.assertEqual(len(worker_files), 2)
+
+            received = {}
+            for name in worker_files:
+                with open(os.path.join(output_dir, name)) as f:
+                    for line in f:
+                        chat_id, seq = map(int, line.split())
+                        received.setdefault(chat_id, []).append((name, seq))
+
+        self.assertEqual(sorted(received.keys()), chats)
+        for chat_id, entries in received.items():
+            # each chat is handled by a single worker, in order
+            self.assertEqual(len(set(map(lambda x: x[0], entries))), 1)
+            self.assertEqual(list(map(lambda x: x[1], entries)), list(range(messages_per_chat)))
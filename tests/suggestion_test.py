@@ -0,0 +1,87 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from telegram_click_aio.suggestion import CommandNameIndex, levenshtein_distance, generate_unknown_command_message
+from telegram_click_aio.decorator import command
+from telegram_click_aio.permission import USER_ID
+from tests import TestBase, create_message_mock
+
+SECRET_USER_ID = 4242
+
+
+@command(name=["suggestion_status", "suggestion_st"], description="Suggested command")
+async def suggestion_status_command(message):
+    pass
+
+
+@command(name="suggestion_admin", description="Admin command", permissions=USER_ID(SECRET_USER_ID))
+async def suggestion_admin_command(message):
+    pass
+
+
+class SuggestionTest(TestBase):
+
+    def _create_index(self) -> CommandNameIndex:
+        index = CommandNameIndex()
+        for name in ["start", "status", "stats", "stop", "help", "Settings"]:
+            index.add(name, {})
+        index.add("secret", {"hidden": True})
+        return index
+
+    async def test_levenshtein_distance(self):
+        self.assertEqual(levenshtein_distance("status", "status"), 0)
+        self.assertEqual(levenshtein_distance("status", "statsu"), 2)
+        self.assertEqual(levenshtein_distance("stop", "stp"), 1)
+        self.assertEqual(levenshtein_distance("", "help"), 4)
+
+    async def test_complete(self):
+        index = self._create_index()
+
+        self.assertEqual(index.complete("sta"), ["start", "stats", "status"])
+        self.assertEqual(index.complete("sta", limit=1), ["start"])
+        self.assertEqual(index.complete("se"), ["Settings"])
+        self.assertEqual(index.complete("x"), [])
+
+    async def test_suggest(self):
+        index = self._create_index()
+
+        self.assertEqual(index.suggest("stauts"), ["stats", "start", "status"])
+        self.assertEqual(index.suggest("stauts", limit=1), ["stats"])
+        self.assertEqual(index.suggest("hlep"), ["help"])
+        self.assertEqual(index.suggest("settigns"), ["Settings"])
+        self.assertEqual(index.suggest("secert"), [])
+        self.assertEqual(index.suggest("completely_different"), [])
+
+    async def test_unknown_command_message(self):
+        self.assertIsNone(await generate_unknown_command_message(create_message_mock("/suggestion_status")))
+        self.assertIsNone(await generate_unknown_command_message(create_message_mock("no command")))
+        self.assertEqual(
+            await generate_unknown_command_message(create_message_mock("/suggestion_stauts@mybot arg"),
+                                                   parse_mode=None),
+            "Unknown command: /suggestion_stauts, did you mean /suggestion_status?")
+
+    async def test_unknown_command_permissions(self):
+        # commands the user is not allowed to use are not revealed
+        self.assertEqual(
+            await generate_unknown_command_message(create_message_mock("/suggestion_admi"), parse_mode=None),
+            "Unknown command: /suggestion_admi")
+        self.assertEqual(
+            await generate_unknown_command_message(create_message_mock("/suggestion_admi", user_id=SECRET_USER_ID),
+                                                   parse_mode=None),
+            "Unknown command: /suggestion_admi, did you mean /suggestion_admin?")
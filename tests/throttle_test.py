@@ -0,0 +1,78 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+from telegram_click_aio import Scope
+from telegram_click_aio.decorator import command
+from telegram_click_aio.throttle import Throttle
+from tests import TestBase, BotMock, create_message_mock
+
+THROTTLE = Throttle(rate=0.001, burst=2, scope=Scope.USER)
+
+
+@command(name="throttled", description="Throttled command", throttle=THROTTLE)
+async def throttled_command(message):
+    return True
+
+
+class ThrottleTest(TestBase):
+
+    async def test_token_bucket(self):
+        throttle = Throttle(rate=1, burst=2)
+
+        self.assertTrue((await throttle.consume("a", now=0)).allowed)
+        self.assertTrue((await throttle.consume("a", now=0)).allowed)
+
+        result = await throttle.consume("a", now=0.5)
+        self.assertFalse(result.allowed)
+        self.assertTrue(result.first_in_window)
+        self.assertAlmostEqual(result.retry_after, 0.5)
+
+        result = await throttle.consume("a", now=0.6)
+        self.assertFalse(result.allowed)
+        self.assertFalse(result.first_in_window)
+
+        # other keys are not affected
+        self.assertTrue((await throttle.consume("b", now=0.6)).allowed)
+
+        # refilled
+        self.assertTrue((await throttle.consume("a", now=1.5)).allowed)
+        result = await throttle.consume("a", now=1.5)
+        self.assertFalse(result.allowed)
+        self.assertTrue(result.first_in_window)
+
+    async def test_bounded_buckets(self):
+        throttle = Throttle(rate=1, burst=1, max_keys=100)
+        for user_id in range(1000):
+            await throttle.consume(user_id, now=0)
+
+        self.assertEqual(len(throttle), 100)
+        # the most recently used buckets are kept
+        self.assertFalse((await throttle.consume(999, now=0)).allowed)
+
+    async def test_decorator(self):
+        bot = BotMock()
+
+        for _ in range(2):
+            self.assertTrue(await throttled_command(create_message_mock("/throttled", bot=bot, user_id=1)))
+        for _ in range(3):
+            self.assertIsNone(await throttled_command(create_message_mock("/throttled", bot=bot, user_id=1)))
+        self.assertTrue(await throttled_command(create_message_mock("/throttled", bot=bot, user_id=2)))
+
+        # the default error handler answers only once per window
+        self.assertEqual(len(bot.sent_messages), 1)
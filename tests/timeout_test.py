@@ -0,0 +1,107 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import asyncio
+
+from telegram_click_aio.const import KEY_TIMEOUT_COUNT
+from telegram_click_aio.decorator import command
+from telegram_click_aio.error_handler import ErrorHandler
+from telegram_click_aio.registry import CommandRegistry
+from tests import TestBase, BotMock, create_message_mock
+
+TIMEOUT_REGISTRY = CommandRegistry()
+CANCELLED = []
+
+
+class TimeoutErrorHandler(ErrorHandler):
+    def __init__(self):
+        self.timeouts = []
+        self.execution_errors = []
+
+    async def on_timeout(self, message, timeout: float) -> bool:
+        self.timeouts.append(timeout)
+        return True
+
+    async def on_execution_error(self, message, exception: Exception) -> bool:
+        self.execution_errors.append(exception)
+        return True
+
+
+TIMEOUT_ERROR_HANDLER = TimeoutErrorHandler()
+
+
+@command(name="hang", description="Never finishes", timeout=0.05,
+         error_handler=TIMEOUT_ERROR_HANDLER, registry=TIMEOUT_REGISTRY)
+async def hang_command(message):
+    try:
+        await asyncio.sleep(3600)
+    except asyncio.CancelledError:
+        CANCELLED.append(message.message_id)
+        raise
+
+
+@command(name="quick", description="Finishes in time", timeout=1.0,
+         error_handler=TIMEOUT_ERROR_HANDLER, registry=TIMEOUT_REGISTRY)
+async def quick_command(message):
+    return "done"
+
+
+@command(name="own_timeout", description="Raises a TimeoutError itself", timeout=1.0,
+         error_handler=TIMEOUT_ERROR_HANDLER, registry=TIMEOUT_REGISTRY)
+async def own_timeout_command(message):
+    raise asyncio.TimeoutError()
+
+
+@command(name="default_timeout", description="Uses the default error handler", timeout=0.01,
+         registry=TIMEOUT_REGISTRY)
+async def default_timeout_command(message):
+    await asyncio.sleep(3600)
+
+
+class TimeoutTest(TestBase):
+
+    async def test_timeout(self):
+        bot = BotMock()
+        self.assertIsNone(await hang_command(create_message_mock("/hang", bot=bot, message_id=1)))
+        self.assertIsNone(await hang_command(create_message_mock("/hang", bot=bot, message_id=2)))
+
+        self.assertEqual(CANCELLED, [1, 2])
+        self.assertEqual(TIMEOUT_ERROR_HANDLER.timeouts, [0.05, 0.05])
+        self.assertEqual(TIMEOUT_REGISTRY.get("hang")[KEY_TIMEOUT_COUNT], 2)
+
+        self.assertEqual(await quick_command(create_message_mock("/quick", bot=bot)), "done")
+        counts = TIMEOUT_REGISTRY.timeout_counts()
+        self.assertEqual(counts["hang"], 2)
+        self.assertEqual(counts["quick"], 0)
+
+    async def test_handler_timeout_error(self):
+        # a TimeoutError raised by the handler itself is an execution error
+        await own_timeout_command(create_message_mock("/own_timeout"))
+        self.assertEqual(len(TIMEOUT_ERROR_HANDLER.execution_errors), 1)
+        self.assertEqual(TIMEOUT_REGISTRY.get("own_timeout")[KEY_TIMEOUT_COUNT], 0)
+
+    async def test_default_error_handler(self):
+        bot = BotMock()
+        await default_timeout_command(create_message_mock("/default_timeout", bot=bot))
+        self.assertEqual(len(bot.sent_messages), 1)
+        self.assertIn("took too long", bot.sent_messages[0]["text"])
+
+    def test_invalid_timeout(self):
+        self.assertRaises(ValueError, command, name="invalid_timeout", description="Invalid", timeout=0,
+                          registry=TIMEOUT_REGISTRY)
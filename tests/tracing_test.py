@@ -0,0 +1,112 @@
+#  Copyright (c) 2020 Markus Ressel
+#  .
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#  .
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#  .
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+import json
+import os
+import tempfile
+
+from telegram_click_aio import tracing
+from telegram_click_aio.argument import Argument
+from telegram_click_aio.decorator import command
+from telegram_click_aio.error_handler import ErrorHandler
+from telegram_click_aio.permission import PRIVATE_CHAT, USER_ID
+from telegram_click_aio.parser import ParseErrorCode
+from telegram_click_aio.registry import CommandRegistry
+from telegram_click_aio.tracing import Tracer, RingBufferExporter, JsonLinesExporter, set_tracer
+from tests import TestBase, create_message_mock
+
+TRACING_REGISTRY = CommandRegistry()
+
+
+class SilentErrorHandler(ErrorHandler):
+    async def on_validation_error(self, message, exception, help_message) -> bool:
+        return True
+
+
+@command(name="traced",
+         description="Traced command",
+         arguments=[Argument(name="count", description="some number", type=int, example="1")],
+         permissions=PRIVATE_CHAT & USER_ID(12345678),
+         error_handler=SilentErrorHandler(),
+         registry=TRACING_REGISTRY)
+async def traced_command(message, count: int):
+    with tracing.span("custom", count=count):
+        return count
+
+
+class TracingTest(TestBase):
+
+    def setUp(self):
+        self.exporter = RingBufferExporter(size=100)
+        set_tracer(Tracer([self.exporter]))
+
+    def tearDown(self):
+        set_tracer(None)
+
+    async def test_dispatch_spans(self):
+        self.assertEqual(await traced_command(create_message_mock("/traced 3")), 3)
+
+        spans = dict(map(lambda x: (x.name, x), self.exporter.spans))
+        root = spans["command"]
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(root.attributes["command"], "traced")
+        for name in ["permissions", "parse", "handler"]:
+            self.assertEqual(spans[name].parent_id, root.span_id)
+            self.assertEqual(spans[name].trace_id, root.trace_id)
+        self.assertEqual(spans["convert"].parent_id, spans["parse"].span_id)
+        self.assertEqual(spans["custom"].parent_id, spans["handler"].span_id)
+
+        # one span for the merged permission and one for each of its nodes
+        permission_spans = list(filter(lambda x: x.name == "permission", self.exporter.spans))
+        self.assertEqual(len(permission_spans), 3)
+        merged = permission_spans[-1]
+        self.assertEqual(merged.parent_id, spans["permissions"].span_id)
+        for node in permission_spans[:-1]:
+            self.assertEqual(node.parent_id, merged.span_id)
+            self.assertTrue(node.attributes["granted"])
+        self.assertLessEqual(spans["handler"].duration, root.duration)
+
+    async def test_error_spans(self):
+        await traced_command(create_message_mock("/traced abc"))
+
+        spans = dict(map(lambda x: (x.name, x), self.exporter.spans))
+        self.assertIsNone(spans["parse"].error)
+        self.assertEqual(spans["parse"].attributes["errors"], [ParseErrorCode.INVALID_VALUE])
+        self.assertEqual(spans["error_handler"].attributes["event"], "validation_error")
+        self.assertNotIn("handler", spans)
+
+    async def test_jsonl_exporter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "spans.jsonl")
+            exporter = JsonLinesExporter(path)
+            set_tracer(Tracer([exporter]))
+            await traced_command(create_message_mock("/traced 1"))
+            exporter.close()
+
+            with open(path) as f:
+                spans = list(map(json.loads, f))
+        self.assertEqual(spans[-1]["name"], "command")
+        self.assertTrue(all(map(lambda x: x["trace_id"] == spans[-1]["trace_id"], spans)))
+
+    async def test_disabled(self):
+        set_tracer(None)
+        self.assertIs(tracing.span("a"), tracing.span("b"))
+        self.assertEqual(await traced_command(create_message_mock("/traced 1")), 1)
+        self.assertEqual(len(self.exporter.spans), 0)
+        self.assertIsNone(tracing.get_current_span())